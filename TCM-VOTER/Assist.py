@@ -1,6 +1,9 @@
+import os
 import pandas as pd
 import analysis
+import get
 import report
+from context import RunContext
 
 
 def create_dataframes(sd, sd_formula_links, formula, formula_tcm_links,
@@ -56,89 +59,98 @@ def save_results_to_excel(path,
         protein_df.to_excel(writer, sheet_name="靶点信息", index=False)
 
 
-def analyze_proteins(DiseaseName, target_max_number, report_number, interaction_number, protein_df):
+def analyze_proteins(DiseaseName, target_max_number, report_number, interaction_number, protein_df, path='results',
+                     save_protein_list=False, literature_engine='es', chart_mode='pages'):
     """
     分析蛋白质数据并生成研究报告
 
     参数:
-    analysis: 分析工具对象
-    DiseaseName (str): 疾病名称
+    DiseaseName (str | list): 疾病名称；为列表时对多种疾病一次完成研究现状测试（见 analysis.research_status_multi）
     target_max_number (int): 最大靶点数量
     report_number (int): 报告数量
     interaction_number (int): 交互数量
     protein_df (DataFrame): 包含蛋白质/基因数据的DataFrame
+    path (str): 结果目录，研究现状结果写入 {path}/{DiseaseName}（多种疾病时每种疾病一个目录）
+    save_protein_list (bool): 是否将规范化后的基因列表另存为 Protein_List.xlsx
+    literature_engine (str): 文献检索方式，'es' 或 'scan'（见 literature.py），仅用于单一疾病
+    chart_mode (str): 靶标图表输出方式，'pages' 每个靶标一个页面，'single' 一个页面按需加载（见 output.render_target_charts）
 
     返回:
-    无 (结果会保存到文件并通过analysis对象处理)
+    本次分析的 RunContext (结果保存到 ctx.output_dir)；多种疾病时为各疾病的 RunContext 列表
     """
-    # 更新分析配置
-    analysis.update_config(DiseaseName, target_max_number, report_number, interaction_number)
+    # 本次分析的运行参数，随调用链传递，不再写入共享的 config.json
+    diseases = None if isinstance(DiseaseName, str) else list(DiseaseName)
+    ctx = RunContext(disease_name=DiseaseName if diseases is None else diseases[0], target_max_number=int(target_max_number),
+                     reported_number=int(report_number), interaction_num=int(interaction_number), results_dir=path,
+                     literature_engine=literature_engine, chart_mode=chart_mode)
 
     try:
-        # 提取基因名称并处理
-        protein_research_test = protein_df['gene_name'].copy()
-        protein_research_test = pd.DataFrame(protein_research_test)
+        # 拆分以空格或斜杠分隔的基因名并去重
+        symbols = get.normalize_symbols(protein_df['gene_name'])
 
-        # 分割可能包含多个基因的字段(处理用空格或斜杠分隔的基因名)
-        df_expanded = protein_research_test.copy()
-        df_expanded["split_values"] = df_expanded["gene_name"].str.split(r"[\s/]+")
-        df_expanded = df_expanded.explode("split_values")
+        if save_protein_list:
+            pd.DataFrame({'gene_name': symbols}).to_excel(ctx.path("Protein_List.xlsx"), index=False)
 
-        # 清理并保存基因列表
-        df_expanded = pd.DataFrame(df_expanded['split_values'])
-        df_expanded.rename(columns={"split_values": "gene_name"}, inplace=True)
-        df_expanded.drop_duplicates(inplace=True)  # 去除重复基因名
-        df_expanded.dropna(inplace=True)  # 去除空值
+        # 执行研究状态测试，基因列表直接在内存中传递
+        if diseases is not None:
+            contexts = analysis.research_status_multi(symbols, diseases, ctx)
+            print(f"蛋白质分析完成，结果已保存到 {', '.join(c.output_dir for c in contexts)}")
+            return contexts
+        analysis.research_status_test(symbols, ctx)
 
-        # 保存处理后的基因列表
-        df_expanded.to_excel("Protein_List.xlsx", index=False)
-
-        # 执行研究状态测试
-        analysis.research_status_test("Protein_List.xlsx")
-
-        print("蛋白质分析完成，结果已保存到 Protein_List.xlsx")
+        print(f"蛋白质分析完成，结果已保存到 {ctx.output_dir}")
+        return ctx
 
     except Exception as e:
         print(f"分析过程中发生错误: {str(e)}")
         raise
 
 
-def generate_toxicity_report(protein_df, chem_df, formula_df, tcm_df):
+def generate_toxicity_report(protein_df, chem_df, formula_df, tcm_df, path='results', fmt='txt', links=None):
     """
     生成毒性报告
 
     参数:
-    report: 报告生成工具对象
     protein_df (DataFrame): 包含蛋白质/基因数据的DataFrame
     chem_df (DataFrame): 包含化合物数据的DataFrame
     formula_df (DataFrame): 包含复方数据的DataFrame
     tcm_df (DataFrame): 包含中药数据的DataFrame
+    path (str): 输出目录，报告写入 {path}/toxicity_report.{fmt}
+    fmt (str): 报告格式，'txt'、'html' 或 'json'
+    links (tuple): 可选，(formula_tcm_links_df, tcm_chem_links_df, chem_protein_links_df)，
+                   提供时沿网络计算毒性暴露得分，并在报告中列出间接毒性暴露的方剂、中药与成分
 
     返回:
-    无 (结果会通过report对象处理并生成报告)
+    报告文件路径
     """
     try:
-        # 提取所需列并转换为DataFrame
-        protein_data = pd.DataFrame(protein_df['gene_name'])
-        chem_data = pd.DataFrame(chem_df['Name'])
-        formula_data = pd.DataFrame(formula_df['name'])
-        tcm_data = pd.DataFrame(tcm_df['cn_name'])
-
-        # 过滤毒性数据
-        toxic_data = report.filter_toxic_data(
-            protein_data, chem_data, formula_data, tcm_data
-        )
+        # 按ID与名称匹配毒性数据
+        toxic_data = report.filter_toxic_data(protein_df, chem_df, formula_df, tcm_df)
         toxic_formula, toxic_herb, toxic_chemical, toxic_protein = toxic_data
 
+        exposure = None
+        if links is not None:
+            formula_tcm_links_df, tcm_chem_links_df, chem_protein_links_df = links
+            formula_df, tcm_df, chem_df, protein_df = report.toxicity_exposure(
+                formula_df, formula_tcm_links_df, tcm_df, tcm_chem_links_df, chem_df, chem_protein_links_df,
+                protein_df)
+        if 'Toxicity Exposure' in tcm_df.columns:
+            exposure = {'formula': formula_df, 'tcm': tcm_df, 'chem': chem_df}
+
         # 生成毒性报告
+        output_file = os.path.join(path, f'toxicity_report.{fmt}')
         report.generate_toxicity_report(
             toxic_formula,
             toxic_herb,
             toxic_chemical,
-            toxic_protein
+            toxic_protein,
+            output_file=output_file,
+            fmt=fmt,
+            exposure=exposure
         )
 
         print("毒性报告生成完成")
+        return output_file
 
     except KeyError as e:
         print(f"数据框中缺少必要的列: {str(e)}")
@@ -3,6 +3,7 @@ import json
 import time
 from elasticsearch import Elasticsearch
 from elasticsearch import helpers
+from abstract_index import create_index
 
 # 获取所有摘要的路径
 def get_abstract_path():
@@ -57,7 +58,8 @@ if __name__ == '__main__':
     es = Elasticsearch(timeout=30, max_retries=10, retry_on_timeout=True)
     es.indices.delete(index='abstract22', ignore=[400, 404])
     #es.indices.create(index='abstract', ignore=400) #创建索引
-    es.indices.create(index='abstract22', ignore=400)
+    # 使用专门的映射创建索引（见 abstract_index.py）
+    create_index(es)
     data_to_elasticsearch()
 
     abstractPath = get_abstract_path()# 获取摘要的路径
@@ -83,7 +85,7 @@ import concurrent.futures
 
 es = Elasticsearch(timeout=30, max_retries=10, retry_on_timeout=True)
 es.indices.delete(index='abstract22', ignore=[400, 404])
-es.indices.create(index='abstract22', ignore=400)
+create_index(es)
 
 abstractPath = get_abstract_path()
 
@@ -0,0 +1,198 @@
+"""
+使用专门的映射创建 abstract22 索引并导入摘要，以及比较不同映射下计数查询耗时的基准测试。
+
+程序只对 abstract22 做 terms（pubMedId）、match 与 match_phrase（abstract）查询并统计命中数，不需要打分：
+    pubMedId  keyword，不分词，terms 查询直接查词典
+    abstract  text，不保存 norms（不参与打分），只索引词位置（短语查询需要），
+              index_phrases 额外索引相邻两词（shingle），加快多词短语查询
+导入期间关闭刷新、不设副本，导入完成后恢复并合并为一个段。
+
+用法（在本目录中运行）:
+    python abstract_index.py build --src G:/ABS/json --index abstract22
+    python abstract_index.py reindex --source abstract22_old --index abstract22
+    python abstract_index.py bench --indices abstract22_old abstract22 --disease cough --n 200
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import random
+import statistics
+import time
+
+from elasticsearch import Elasticsearch
+from elasticsearch import helpers
+
+INDEX = 'abstract22'
+
+
+def index_mappings(index_phrases=True):
+    """abstract22 的映射。"""
+    return {
+        'dynamic': 'strict',
+        'properties': {
+            'pubMedId': {'type': 'keyword'},
+            'abstract': {'type': 'text', 'norms': False, 'index_options': 'positions',
+                         'index_phrases': index_phrases},
+        },
+    }
+
+
+def index_settings(shards=1, replicas=0, refresh_interval='30s', best_compression=False):
+    """abstract22 的设置。摘要只在离线导入时更新，查询不需要近实时刷新。"""
+    settings = {'number_of_shards': shards, 'number_of_replicas': replicas, 'refresh_interval': refresh_interval}
+    if best_compression:
+        settings['codec'] = 'best_compression'
+    return settings
+
+
+def create_index(es, index=INDEX, shards=1, replicas=0, index_phrases=True, best_compression=False,
+                 recreate=False):
+    """创建索引（recreate 时先删除同名索引）。"""
+    if recreate:
+        es.indices.delete(index=index, ignore_unavailable=True)
+    es.indices.create(index=index, mappings=index_mappings(index_phrases),
+                      settings=index_settings(shards, replicas, best_compression=best_compression))
+
+
+def _bulk_mode(es, index, loading, replicas=0, refresh_interval='30s'):
+    # 导入期间关闭刷新与副本，结束后恢复
+    if loading:
+        es.indices.put_settings(index=index, settings={'refresh_interval': '-1', 'number_of_replicas': 0})
+    else:
+        es.indices.put_settings(index=index, settings={'refresh_interval': refresh_interval,
+                                                       'number_of_replicas': replicas})
+        es.indices.refresh(index=index)
+        es.indices.forcemerge(index=index, max_num_segments=1)
+
+
+def get_abstract_path(src):
+    """src 目录下的全部摘要 JSON 文件（{pubMedId: abstract}）。"""
+    abstract_path = []
+    for root, dirs, files in os.walk(src):
+        for file in files:
+            if file.endswith('.json'):
+                abstract_path.append(os.path.join(root, file))
+    return sorted(abstract_path)
+
+
+def _actions(path, index):
+    with open(path, 'r', encoding='utf-8') as f:
+        abstract_dict = json.load(f)
+    for key, value in abstract_dict.items():
+        yield {'_index': index, '_id': key, '_source': {'pubMedId': key, 'abstract': value}}
+
+
+def build(es, src, index=INDEX, threads=4, replicas=0, **create_args):
+    """创建索引并导入 src 目录下的摘要。"""
+    create_index(es, index, replicas=replicas, recreate=True, **create_args)
+    _bulk_mode(es, index, True)
+    try:
+        def load(path):
+            start = time.perf_counter()
+            helpers.bulk(es.options(request_timeout=120), _actions(path, index), chunk_size=2000)
+            print(f'{path} done in {time.perf_counter() - start:.1f}s')
+
+        with concurrent.futures.ThreadPoolExecutor(threads) as executor:
+            for future in concurrent.futures.as_completed([executor.submit(load, p) for p in get_abstract_path(src)]):
+                future.result()
+    finally:
+        _bulk_mode(es, index, False, replicas)
+
+
+def reindex(es, source, index=INDEX, replicas=0, **create_args):
+    """用新的映射创建索引，并从已有的索引（如默认动态映射的旧索引）复制全部摘要。"""
+    create_index(es, index, replicas=replicas, recreate=True, **create_args)
+    _bulk_mode(es, index, True)
+    try:
+        es.options(request_timeout=24 * 3600).reindex(source={'index': source}, dest={'index': index},
+                                                      wait_for_completion=True)
+    finally:
+        _bulk_mode(es, index, False, replicas)
+
+
+def count_queries(symbols, disease='cough', n=200, seed=0):
+    """按研究现状测试中的查询形式生成计数查询：基因符号与疾病的短语查询、基因符号的 match 查询。"""
+    rng = random.Random(seed)
+    symbols = rng.sample(list(symbols), min(n, len(symbols)))
+    queries = [{'match_phrase': {'abstract': disease}}]
+    for symbol in symbols:
+        queries.append({'bool': {'must': [{'match_phrase': {'abstract': disease}},
+                                          {'match_phrase': {'abstract': symbol}}]}})
+        queries.append({'match': {'abstract': symbol}})
+    return queries
+
+
+def bench(es, indices, queries, repeat=3):
+    """
+    在各索引上运行相同的计数查询（不使用请求缓存），比较耗时与索引大小。
+
+    Returns:
+        {索引: {'median_ms', 'p95_ms', 'total_s', 'docs', 'store_bytes'}}
+    """
+    results = {}
+    for index in indices:
+        es.indices.clear_cache(index=index)
+        walls = []
+        for _ in range(repeat):
+            for query in queries:
+                start = time.perf_counter()
+                es.search(index=index, query=query, size=0, track_total_hits=True, request_cache=False)
+                walls.append(time.perf_counter() - start)
+        stats = es.indices.stats(index=index, metric='store,docs')['_all']['primaries']
+        walls.sort()
+        results[index] = {
+            'median_ms': statistics.median(walls) * 1000,
+            'p95_ms': walls[int(len(walls) * 0.95)] * 1000,
+            'total_s': sum(walls),
+            'docs': stats['docs']['count'],
+            'store_bytes': stats['store']['size_in_bytes'],
+        }
+        r = results[index]
+        print(f"{index:<24} median {r['median_ms']:8.2f} ms  p95 {r['p95_ms']:8.2f} ms  "
+              f"docs {r['docs']}  size {r['store_bytes'] / 2 ** 30:.2f} GiB")
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build and benchmark the abstract22 index')
+    parser.add_argument('--url', default='http://localhost:9200/')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    for name in ('build', 'reindex'):
+        p = sub.add_parser(name)
+        p.add_argument('--index', default=INDEX)
+        p.add_argument('--shards', type=int, default=1)
+        p.add_argument('--replicas', type=int, default=0)
+        p.add_argument('--no-phrases', action='store_true', help='do not index two-word shingles')
+        p.add_argument('--best-compression', action='store_true')
+        if name == 'build':
+            p.add_argument('--src', default=os.getcwd(), help='directory of {pubMedId: abstract} JSON files')
+            p.add_argument('--threads', type=int, default=4)
+        else:
+            p.add_argument('--source', required=True, help='existing index to copy from')
+
+    p_bench = sub.add_parser('bench')
+    p_bench.add_argument('--indices', nargs='+', required=True)
+    p_bench.add_argument('--symbols', default='../ID_Transformed/Symbol.txt')
+    p_bench.add_argument('--disease', default='cough')
+    p_bench.add_argument('--n', type=int, default=200)
+    p_bench.add_argument('--repeat', type=int, default=3)
+    p_bench.add_argument('--out', default=None)
+
+    args = parser.parse_args()
+    es = Elasticsearch(args.url, request_timeout=30, max_retries=10, retry_on_timeout=True)
+    if args.command in ('build', 'reindex'):
+        create_args = {'shards': args.shards, 'index_phrases': not args.no_phrases,
+                       'best_compression': args.best_compression}
+        if args.command == 'build':
+            build(es, args.src, args.index, args.threads, args.replicas, **create_args)
+        else:
+            reindex(es, args.source, args.index, args.replicas, **create_args)
+    else:
+        with open(args.symbols, 'r', encoding='utf-8') as f:
+            symbols = [line.strip() for line in f if line.strip()]
+        results = bench(es, args.indices, count_queries(symbols, args.disease, args.n), args.repeat)
+        if args.out:
+            with open(args.out, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
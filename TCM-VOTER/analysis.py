@@ -1,12 +1,17 @@
 import output
+import numpy as np
+import pandas as pd
 import get
+import idmap
 import json
-from bs4 import BeautifulSoup
+import literature
 import os
 import time
-from elasticsearch import Elasticsearch
+import metrics
+from context import RunContext
 
 
+@metrics.timed
 def dfs_filter(formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins):
     """
     深度优先搜索筛选有效节点（优化版）
@@ -97,6 +102,7 @@ def dfs_filter(formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_prote
     return formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins
 
 
+@metrics.timed
 def classify_targets_wm(Symbol_To_Target, Symbol_list):
     """
     classify_targets: 根据给定的 Symbol_To_Target 字典和 Symbol_list 列表，对靶标（targets）进行西药分类。
@@ -110,32 +116,24 @@ def classify_targets_wm(Symbol_To_Target, Symbol_list):
         临床试验中的靶标（target_clinical_trial）：这些靶标有药物，且这些药物目前处于临床试验阶段。
         其他靶标（target_others）：这些靶标有药物，但药物既不是FDA批准的，也不在临床试验中。
     """
-    target_have_drug, target_no_drug = [], []
-    target_FDA_approved, target_clinical_trial, target_others = [], [], []
-
-    for symbol in Symbol_list:
-        if symbol in Symbol_To_Target.keys():
-            target_have_drug.append(symbol)
-        else:
-            target_no_drug.append(symbol)
-
-    for symbol in target_have_drug:
-        target_phage = [*Symbol_To_Target[symbol].values()][0]
-        target_name = [*Symbol_To_Target[symbol].keys()][0]
-        drug_phase, drug_ap_cl, drug_ap, drug_cl = output.drug_classify(target_name)
-        # 增加一个判断，如果symbol所在阶段确实存在对应的药物，则将其加入到对应的列表中
-        if target_phage == 'Successful target' and drug_ap != []:
-            target_FDA_approved.append(symbol)
-        elif target_phage == 'Clinical Trial target' and drug_cl != []:
-            target_clinical_trial.append(symbol)
-        else:
-            target_others.append(symbol)
+    # 对预编译的分类表做一次连接，代替逐个靶点调用 output.drug_classify
+    drug_class = get.get_drug_class_table()
+    drug_class = drug_class[drug_class.index.isin(Symbol_To_Target.keys())]
+    symbols = pd.Index(Symbol_list)
+    flags = drug_class[['has_drug', 'approved', 'clinical', 'other']].reindex(symbols, fill_value=False)
+
+    target_have_drug = symbols[flags['has_drug'].to_numpy(bool)].tolist()
+    target_no_drug = symbols[~flags['has_drug'].to_numpy(bool)].tolist()
+    target_FDA_approved = symbols[flags['approved'].to_numpy(bool)].tolist()
+    target_clinical_trial = symbols[flags['clinical'].to_numpy(bool)].tolist()
+    target_others = symbols[flags['other'].to_numpy(bool)].tolist()
 
     return target_have_drug, target_no_drug, target_FDA_approved, target_clinical_trial, target_others
 
 
+@metrics.timed
 def classify_targets_html(target_have_drug, target_no_drug, target_FDA_approved,
-                          target_clinical_trial, target_others):
+                          target_clinical_trial, target_others, ctx=None):
     """
     将html中的数据进行更改后输出
     :param target_have_drug:
@@ -143,12 +141,12 @@ def classify_targets_html(target_have_drug, target_no_drug, target_FDA_approved,
     :param target_FDA_approved:
     :param target_clinical_trial:
     :param target_others:
+    :param ctx: 运行参数 RunContext，为 None 时从 config.json 读取
     :return:
     """
-    with open('config.json', 'r') as f:
-        config = json.load(f)
+    from bs4 import BeautifulSoup
 
-    disease_name = config['disease_name']
+    ctx = ctx or RunContext.from_config()
 
     text_html = open(r'Template/target_pie_template.html',
                      'r', encoding='utf-8').read()
@@ -160,14 +158,67 @@ def classify_targets_html(target_have_drug, target_no_drug, target_FDA_approved,
         'Clinical data', str(len(target_clinical_trial)))
 
     soup = BeautifulSoup(text_html, 'html.parser')
-    with open('results/' + disease_name + '/Targets_pie_chart.html', 'w', encoding='utf-8') as fp:
+    with open(ctx.path('Targets_pie_chart.html'), 'w', encoding='utf-8') as fp:
         fp.write(str(soup))
 
 
-def query_target(symbol, Symbol_To_PubMedID, Symbol_To_UniprotID, Symbol_To_Fullname, es, keywords):
-    pubMedId = Symbol_To_PubMedID[symbol]
+@metrics.timed
+def disease_pubmed_ids(es, keywords, page_size=10000) -> np.ndarray:
+    """
+    一次性检索摘要中出现疾病关键词的全部文献，返回其 PubMed ID（排序后的 int32 数组）。
+    之后各靶点的文献只需与该集合做本地交集，不必再把靶点的全部 PubMed ID 发给 Elasticsearch。
+    """
+    body = {'query': {'match_phrase': {'abstract': keywords}}, '_source': ['pubMedId'], 'size': page_size}
+    res = es.search(index='abstract22', body=body, scroll='5m')
+    scroll_id, hits, ids = res['_scroll_id'], res['hits']['hits'], []
+    while hits:
+        ids.extend(hit['_source']['pubMedId'] for hit in hits)
+        res = es.scroll(scroll_id=scroll_id, scroll='5m')
+        scroll_id, hits = res['_scroll_id'], res['hits']['hits']
+    es.clear_scroll(scroll_id=scroll_id)
+    return np.unique(np.asarray(ids, dtype=np.int64)).astype(np.int32)
+
+
+def query_target(symbol, Symbol_To_PubMedID, Symbol_To_UniprotID, Symbol_To_Fullname, es, keywords,
+                 disease_pmids=None, exact=True):
+    """
+    单个靶点的报道数。
+
+    exact=True 时，靶点的文献与疾病文献的交集不为空即发送一次 terms 查询，核对摘要中是否出现基因符号；
+    批量统计多个靶点时应使用 report_counts，这些核对合并为每种疾病一次 msearch。
+    exact=False（需给定 disease_pmids）时以交集大小作为报道数，不再查询，但会计入摘要中未出现基因符号的文献。
+    """
+    pubMedId = np.asarray(Symbol_To_PubMedID[symbol], dtype=np.int64)
+    if disease_pmids is not None:
+        # 只保留摘要中出现疾病关键词的文献（disease_pubmed_ids 的结果），交集为空时第一阶段的报道数必为 0
+        pubMedId = np.intersect1d(pubMedId, disease_pmids)
+
+    if len(pubMedId) == 0:
+        reported_number_1 = 0
+    elif not exact and disease_pmids is not None:
+        # 近似计数：以交集大小作为报道数，不再核对摘要中是否出现基因符号
+        reported_number_1 = len(pubMedId)
+    else:
+        reported_number_1 = _count_symbol_reports(symbol, pubMedId.tolist(), es, keywords)
+
+    if reported_number_1 == 0:
+        if symbol in Symbol_To_Fullname.keys():
+            fullName = Symbol_To_Fullname[symbol]
+            sql2 = _target_fullname_query(symbol, fullName, keywords)
+            res = es.search(index='abstract22', body=sql2, scroll='5m')
+            reported_number_2 = res['hits']['total']['value']
+            es.clear_scroll(scroll_id=res['_scroll_id'])
+        else:
+            reported_number_2 = 0
+    else:
+        reported_number_2 = 0
+
+    return reported_number_1 + reported_number_2
+
 
-    sql1 = {
+def _target_query(symbol, pubMedId, keywords):
+    # 给定文献中摘要同时出现疾病关键词与基因符号
+    return {
         'query': {
             'bool': {
                 'must': [
@@ -190,95 +241,162 @@ def query_target(symbol, Symbol_To_PubMedID, Symbol_To_UniprotID, Symbol_To_Full
             }
         }
     }
-    res = es.search(index='abstract22', body=sql1, scroll='5m')
-    reported_number_1 = res['hits']['total']['value']
-    es.clear_scroll(scroll_id=res['_scroll_id'])
 
-    if reported_number_1 == 0:
-        if symbol in Symbol_To_Fullname.keys():
-            fullName = Symbol_To_Fullname[symbol]
-            sql2 = {
-                "query": {
-                    "bool": {
-                        'must': [
-                            {
-                                "match_phrase": {
-                                    "abstract": keywords
-                                }
-                            },
-                            {
-                                "bool": {
-                                    "should": [
-                                        {
-                                            "match_phrase": {
-                                                "abstract": fullName
-                                            }
-                                        },
-                                        {
-                                            "match_phrase": {
-                                                "abstract": symbol
-                                            }
-                                        }
-                                    ]
+
+def _target_fullname_query(symbol, fullName, keywords):
+    # 摘要中出现疾病关键词，且出现基因全名或基因符号
+    return {
+        "query": {
+            "bool": {
+                'must': [
+                    {
+                        "match_phrase": {
+                            "abstract": keywords
+                        }
+                    },
+                    {
+                        "bool": {
+                            "should": [
+                                {
+                                    "match_phrase": {
+                                        "abstract": fullName
+                                    }
+                                },
+                                {
+                                    "match_phrase": {
+                                        "abstract": symbol
+                                    }
                                 }
-                            }
-                        ]
+                            ]
+                        }
                     }
-                }
+                ]
             }
-            res = es.search(index='abstract22', body=sql2, scroll='5m')
-            reported_number_2 = res['hits']['total']['value']
-            es.clear_scroll(scroll_id=res['_scroll_id'])
-        else:
-            reported_number_2 = 0
-    else:
-        reported_number_2 = 0
+        }
+    }
 
-    return reported_number_1 + reported_number_2
+
+def _count_symbol_reports(symbol, pubMedId, es, keywords):
+    # 在给定文献中统计摘要同时出现疾病关键词与基因符号的数量
+    sql1 = _target_query(symbol, pubMedId, keywords)
+    res = es.search(index='abstract22', body=sql1, scroll='5m')
+    reported_number = res['hits']['total']['value']
+    es.clear_scroll(scroll_id=res['_scroll_id'])
+    return reported_number
 
 
 # 通过摘要中的关键词进行查询，将靶标分为对于该疾病报道过的靶标和没有报道过的靶标
-def report_info(fa, ct, es, keywords, input_num):
-    with open('Data/ID_Transformed/Symbol_To_PubMedID.json', 'r') as f:
-        Symbol_To_PubMedID = json.load(f)
-    with open('Data/ID_Transformed/Symbol_To_UniprotID.json', 'r') as f:
-        Symbol_To_UniprotID = json.load(f)
-    with open('Data/ID_Transformed/Symbol_To_Fullname.json', 'r') as f:
-        Symbol_To_Fullname = json.load(f)
+@metrics.timed
+def report_info(fa, ct, es, keywords, input_num, exact=True, lit=None):
+    # lit: literature.DiseaseLiterature，给定时在已检索的疾病文献中本地计数，不再逐个靶点查询
+    # 只从映射包中批量取出本次涉及的symbol，不再读入完整的ID转换JSON
+    bundle = idmap.open_bundle()
+    symbols = [*fa, *ct]
+    Symbol_To_PubMedID = bundle.lookup('pubmed', symbols).to_dict()
+    Symbol_To_UniprotID = bundle.lookup('uniprot', symbols).to_dict()
+    Symbol_To_Fullname = bundle.lookup('fullname', symbols).to_dict()
+    # 与疾病关键词匹配的文献只检索一次，各靶点在本地求交集
+    disease_pmids = disease_pubmed_ids(es, keywords) if Symbol_To_PubMedID and lit is None else None
+
+    def count(symbol):
+        if lit is not None:
+            return lit.target_count(symbol, Symbol_To_PubMedID[symbol], Symbol_To_Fullname.get(symbol))
+        return query_target(symbol, Symbol_To_PubMedID, Symbol_To_UniprotID, Symbol_To_Fullname, es, keywords,
+                            disease_pmids, exact)
+
+    if lit is None and exact:
+        # 精确计数：各靶点的核对查询合并为批量请求（见 report_counts），不再逐个靶点发送
+        counts = report_counts(symbols, [keywords], es, disease_pmids={keywords: disease_pmids})[keywords].to_dict()
+        return split_reported(fa, ct, counts, input_num)
+
+    # 存在有的symbol没有对应的uniprotID或者pubMedID 对于这样的symbol进行剔除
+    counts = {symbol: count(symbol) for symbol in dict.fromkeys(symbols)
+              if symbol in Symbol_To_PubMedID.keys() and symbol in Symbol_To_UniprotID.keys()}
+    return split_reported(fa, ct, counts, input_num)
+
+
+def split_reported(fa, ct, counts, input_num):
+    """按报道数（counts 中没有的靶标被剔除）将FDA批准靶标与临床靶标分为未报道与已报道。"""
     fda_no_review, fda_review, ct_no_review, ct_review = [], [], [], []
     for symbol in fa:
-        # 存在有的symbol没有对应的uniprotID或者pubMedID 对于这样的symbol进行剔除
-        if symbol in Symbol_To_PubMedID.keys() and symbol in Symbol_To_UniprotID.keys():
-            query_num = query_target(symbol, Symbol_To_PubMedID, Symbol_To_UniprotID, Symbol_To_Fullname, es, keywords)
-            if query_num > input_num:
-                fda_review.append(symbol)
-            else:
-                fda_no_review.append(symbol)
+        if symbol in counts:
+            (fda_review if counts[symbol] > input_num else fda_no_review).append(symbol)
     for symbol in ct:
-        if symbol in Symbol_To_PubMedID.keys() and symbol in Symbol_To_UniprotID.keys():
-            query_num = query_target(symbol, Symbol_To_PubMedID, Symbol_To_UniprotID, Symbol_To_Fullname, es, keywords)
-            if query_num > input_num:
-                ct_review.append(symbol)
-            else:
-                ct_no_review.append(symbol)
+        if symbol in counts:
+            (ct_review if counts[symbol] > input_num else ct_no_review).append(symbol)
     return fda_no_review, fda_review, ct_no_review, ct_review
 
 
-def set_config_auto():
-    with open('config.json', 'r') as f:
-        config = json.load(f)
+@metrics.timed
+def report_counts(symbols, diseases, es, batch_size=100, disease_pmids=None) -> pd.DataFrame:
+    """
+    各靶标在每种疾病下的报道数（与 query_target 的 exact=True 相同），全部疾病的查询合并为批量请求。
+    disease_pmids 为 {疾病: disease_pubmed_ids 的结果}，已检索的疾病不再重复检索。
+
+    Returns:
+        以靶标为行、疾病为列的 DataFrame；缺少 UniProt ID 或 PubMed ID 的靶标被剔除。
+    """
+    bundle = idmap.open_bundle()
+    symbols = list(dict.fromkeys(symbols))
+    Symbol_To_PubMedID = bundle.lookup('pubmed', symbols)
+    Symbol_To_UniprotID = bundle.lookup('uniprot', symbols)
+    Symbol_To_Fullname = bundle.lookup('fullname', symbols).to_dict()
+    symbols = [s for s in symbols if s in Symbol_To_PubMedID.index and s in Symbol_To_UniprotID.index]
+    counts = pd.DataFrame(0, index=pd.Index(symbols), columns=list(diseases), dtype='int64')
+
+    # 第一阶段：靶标的文献与疾病文献的交集中，摘要出现基因符号的文献数（交集为空时为 0，无需查询）
+    pending = []
+    known = disease_pmids or {}
+    for disease in diseases:
+        if not symbols:
+            continue
+        pmids = known.get(disease)
+        pmids = disease_pubmed_ids(es, disease) if pmids is None else pmids
+        for symbol in symbols:
+            pubMedId = np.intersect1d(Symbol_To_PubMedID[symbol], pmids)
+            if len(pubMedId):
+                pending.append((symbol, disease, _target_query(symbol, pubMedId.tolist(), disease)))
+    for (symbol, disease, _), n in zip(pending, get.msearch_counts(es, [q for *_, q in pending], batch_size)):
+        counts.at[symbol, disease] = n
+
+    # 第二阶段：第一阶段为 0 时，统计摘要中出现基因全名或基因符号的文献数
+    pending = [(symbol, disease, _target_fullname_query(symbol, Symbol_To_Fullname[symbol], disease))
+               for disease in diseases for symbol in symbols
+               if counts.at[symbol, disease] == 0 and symbol in Symbol_To_Fullname]
+    for (symbol, disease, _), n in zip(pending, get.msearch_counts(es, [q for *_, q in pending], batch_size)):
+        counts.at[symbol, disease] = n
+    return counts
+
+
+@metrics.timed
+def scan_literature(es, disease_name, symbols):
+    """
+    检索摘要中出现疾病关键词的文献，并一次扫描候选靶点的基因符号、基因全名及其药物名。
+
+    Returns:
+        literature.DiseaseLiterature，供 report_info 与 get_drug_report_info 本地计数。
+    """
+    lit = literature.DiseaseLiterature.fetch(es, disease_name)
+    bundle = idmap.open_bundle()
+    symbols = list(dict.fromkeys(symbols))
+    fullnames = bundle.lookup('fullname', symbols).tolist()
+    Target_To_Drug = get.read_json('Data/Drug/Target_To_Drug.json')
+    drugs = [name for target in bundle.lookup('target', symbols)
+             for drug in Target_To_Drug.get(next(iter(target)), []) for name in drug]
+    print('The number of disease abstracts is: ', len(lit))
+    return lit.scan(phrases=symbols + fullnames, terms=drugs)
+
 
-    disease_name = config['disease_name']
-    reported_number = config['reported_number']
-    interaction_num = config['interaction_num']
-    target_max_number = config['target_max_number']  # 靶标推荐最大值,根据文献数量进行排序
+def set_config_auto(ctx=None):
+    ctx = ctx or RunContext.from_config()
 
-    os.makedirs('results/' + disease_name, exist_ok=True)
+    os.makedirs(ctx.output_dir, exist_ok=True)
 
-    return disease_name, reported_number, interaction_num, target_max_number
+    return ctx.disease_name, ctx.reported_number, ctx.interaction_num, ctx.target_max_number
 
 
-def research_status_test(protein_list_path: str) -> None:
+@metrics.timed
+def research_status_test(protein_list, ctx: RunContext = None) -> None:
     """分析蛋白质靶标研究状态并生成可视化报告。
 
     该函数执行完整的靶标分析流程，包括：
@@ -288,7 +406,8 @@ def research_status_test(protein_list_path: str) -> None:
     4. 生成交互式可视化报告
 
     Args:
-        protein_list_path (str): 蛋白质列表文件路径，文件应为每行一个基因符号的文本文件
+        protein_list (str | list): 蛋白质列表文件路径（每行一个基因符号的Excel文件），或基因符号列表
+        ctx (RunContext): 运行参数（疾病名称、阈值、输出目录），为 None 时从 config.json 读取
 
     Returns:
         None: 无直接返回值，但会生成以下输出文件：
@@ -311,32 +430,39 @@ def research_status_test(protein_list_path: str) -> None:
            - ct: 临床试验阶段靶标
            - ot: 其他靶标
     """
-    disease_name, reported_number, interaction_num, target_max_number = set_config_auto()
+    ctx = ctx or RunContext.from_config()
+    disease_name, reported_number, interaction_num, target_max_number = set_config_auto(ctx)
 
     Symbol_PPI_list, Symbol_To_Target_wm, Symbol_To_Fullname, Symbol_list = (
-        get.get_data(protein_list_path, interaction_num))
+        get.get_data(protein_list, interaction_num))
 
     p_h_dr, p_no_dr, p_fa, p_ct, p_ot = classify_targets_wm(Symbol_To_Target_wm, Symbol_PPI_list)
     h_dr, no_dr, fa, ct, ot = classify_targets_wm(Symbol_To_Target_wm, Symbol_list)
 
-    classify_targets_html(h_dr, no_dr, fa, ct, ot)
-    classify_targets_html(p_h_dr, p_no_dr, p_fa, p_ct, p_ot)
+    classify_targets_html(h_dr, no_dr, fa, ct, ot, ctx)
+    classify_targets_html(p_h_dr, p_no_dr, p_fa, p_ct, p_ot, ctx)
+
+    from elasticsearch import Elasticsearch
 
     es = Elasticsearch(
-        ['http://localhost:9200/']
+        [ctx.es_url]
     )
 
     t0 = time.time()
     print('Program start time:', time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time())))
 
+    # 'scan' 方式：只检索一次疾病相关文献，在本地统计全部候选靶点与药物的共现
+    lit = scan_literature(es, disease_name, fa + ct + p_fa + p_ct) if ctx.literature_engine == 'scan' else None
+
     # symbol对应的靶标
-    fda_no_review, fda_review, ct_no_review, ct_review = report_info(fa, ct, es, disease_name, reported_number)
+    fda_no_review, fda_review, ct_no_review, ct_review = report_info(fa, ct, es, disease_name, reported_number,
+                                                                     lit=lit)
     p_fda_no_review, p_fda_review, p_ct_no_review, p_ct_review = report_info(p_fa, p_ct, es, disease_name,
-                                                                             reported_number)
+                                                                             reported_number, lit=lit)
 
     # 生成靶标信息的Tree图
-    output.all_targets_tree(fda_no_review, fda_review, ct_no_review, ct_review)
-    output.all_targets_tree(p_fda_no_review, p_fda_review, p_ct_no_review, p_ct_review)
+    output.all_targets_tree(fda_no_review, fda_review, ct_no_review, ct_review, ctx)
+    output.all_targets_tree(p_fda_no_review, p_fda_review, p_ct_no_review, p_ct_review, ctx)
 
     t1 = time.time()
     print('Program end time:', time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time())))
@@ -354,15 +480,102 @@ def research_status_test(protein_list_path: str) -> None:
     p_fda_no_review = output.new_targets_list(p_fda_no_review, output.sort_targets(p_no_review, target_max_number, es))
     p_ct_no_review = output.new_targets_list(p_ct_no_review, output.sort_targets(p_no_review, target_max_number, es))
 
+    # 全部推荐靶标的药物只统计一次文献数，结果保存为 drug_evidence.xlsx
+    evidence = output.drug_evidence_table(fda_no_review + ct_no_review + p_fda_no_review + p_ct_no_review,
+                                          Symbol_To_Target_wm, disease_name, es, lit)
+    evidence.to_excel(ctx.path('drug_evidence.xlsx'))
+
     # 获得全部靶标药物推荐的旭日图，以及每个靶标对应的药物信息和药物热度
-    output.get_sunburst_tree_bar(fda_no_review, ct_no_review, fa, disease_name, reported_number,
-                                 Symbol_To_Target_wm, es)
+    rendered = output.get_sunburst_tree_bar(fda_no_review, ct_no_review, fa, disease_name, reported_number,
+                                            Symbol_To_Target_wm, es, ctx, lit, evidence)
     output.get_sunburst_tree_bar(p_fda_no_review, p_ct_no_review, p_fa, disease_name,
-                                 reported_number, Symbol_To_Target_wm, es)
+                                 reported_number, Symbol_To_Target_wm, es, ctx, lit, evidence, rendered)
+
+
+@metrics.timed
+def research_status_multi(protein_list, diseases, ctx: RunContext = None) -> list:
+    """对多种疾病进行研究现状测试，每种疾病的结果写入各自的目录（results_dir/疾病名称）。
+
+    与疾病无关的步骤只执行一次：读取靶标与PPI靶标、西药分类、靶标热度（sort_targets）与药物文献总数；
+    与疾病有关的报道数（靶标与药物）对全部疾病合并为批量查询。
+    各疾病的输出与分别运行 research_status_test 相同。
+
+    Args:
+        protein_list (str | list): 蛋白质列表文件路径或基因符号列表
+        diseases (list): 疾病名称列表
+        ctx (RunContext): 运行参数（阈值、输出目录），disease_name 被 diseases 中的各疾病替换
+
+    Returns:
+        list: 各疾病的 RunContext
+    """
+    ctx = ctx or RunContext.from_config()
+    diseases = list(dict.fromkeys(diseases))
+    contexts = [ctx.replace(disease_name=disease) for disease in diseases]
+    for c in contexts:
+        set_config_auto(c)
+    reported_number, target_max_number = ctx.reported_number, ctx.target_max_number
+
+    Symbol_PPI_list, Symbol_To_Target_wm, Symbol_To_Fullname, Symbol_list = (
+        get.get_data(protein_list, ctx.interaction_num))
+
+    p_h_dr, p_no_dr, p_fa, p_ct, p_ot = classify_targets_wm(Symbol_To_Target_wm, Symbol_PPI_list)
+    h_dr, no_dr, fa, ct, ot = classify_targets_wm(Symbol_To_Target_wm, Symbol_list)
+
+    from elasticsearch import Elasticsearch
+
+    es = Elasticsearch(
+        [ctx.es_url]
+    )
+
+    # 各疾病的靶标报道数
+    counts = report_counts(fa + ct + p_fa + p_ct, diseases, es)
+
+    recommended = {}
+    for c in contexts:
+        classify_targets_html(h_dr, no_dr, fa, ct, ot, c)
+        classify_targets_html(p_h_dr, p_no_dr, p_fa, p_ct, p_ot, c)
+        column = counts[c.disease_name].to_dict()
+        recommended[c.disease_name] = (split_reported(fa, ct, column, reported_number),
+                                       split_reported(p_fa, p_ct, column, reported_number))
+
+    # 靶标热度与疾病无关，全部疾病的未报道靶标只统计一次
+    no_review = [s for lists, p_lists in recommended.values() for s in lists[0] + lists[2] + p_lists[0] + p_lists[2]]
+    hotness = output.target_hotness(no_review, es)
+
+    targets = {}
+    for c in contexts:
+        (fda_no_review, fda_review, ct_no_review, ct_review), \
+            (p_fda_no_review, p_fda_review, p_ct_no_review, p_ct_review) = recommended[c.disease_name]
+        output.all_targets_tree(fda_no_review, fda_review, ct_no_review, ct_review, c)
+        output.all_targets_tree(p_fda_no_review, p_fda_review, p_ct_no_review, p_ct_review, c)
+        print(c.disease_name, 'The number of recommend targets is: ', len(fda_no_review + ct_no_review))
+        print(c.disease_name, 'The number of recommend PPI targets is: ', len(p_fda_no_review + p_ct_no_review))
+
+        sort_list = output.sort_targets(fda_no_review + ct_no_review, target_max_number, es, hotness)
+        p_sort_list = output.sort_targets(p_fda_no_review + p_ct_no_review, target_max_number, es, hotness)
+        targets[c.disease_name] = (output.new_targets_list(fda_no_review, sort_list),
+                                   output.new_targets_list(ct_no_review, sort_list),
+                                   output.new_targets_list(p_fda_no_review, p_sort_list),
+                                   output.new_targets_list(p_ct_no_review, p_sort_list))
+
+    # 全部疾病的推荐靶标的药物只统计一次文献总数，与各疾病共同出现的文献数合并查询
+    evidence = output.drug_evidence_table([s for lists in targets.values() for t in lists for s in t],
+                                          Symbol_To_Target_wm, diseases, es)
+    for c in contexts:
+        fda_no_review, ct_no_review, p_fda_no_review, p_ct_no_review = targets[c.disease_name]
+        disease_evidence = evidence[[c.disease_name, 'total_count']].rename(
+            columns={c.disease_name: 'disease_count'})
+        disease_evidence.to_excel(c.path('drug_evidence.xlsx'))
+        rendered = output.get_sunburst_tree_bar(fda_no_review, ct_no_review, fa, c.disease_name, reported_number,
+                                                Symbol_To_Target_wm, es, c, evidence=disease_evidence)
+        output.get_sunburst_tree_bar(p_fda_no_review, p_ct_no_review, p_fa, c.disease_name,
+                                     reported_number, Symbol_To_Target_wm, es, c, evidence=disease_evidence,
+                                     rendered=rendered)
+    return contexts
 
 
 def update_config(disease_name, target_max_number, reported_number, interaction_num, config_path="config.json"):
-    """读取用户输入并更新配置文件"""
+    """读取用户输入并更新配置文件（仅作为下次运行的默认参数，分析过程通过 RunContext 传递参数）"""
 
     updates = {"disease_name": disease_name, "target_max_number": int(target_max_number),
                "interaction_num": int(interaction_num), "reported_number": int(reported_number)}
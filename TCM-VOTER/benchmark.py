@@ -0,0 +1,466 @@
+"""
+网络药理学流程的基准测试。
+
+在 synthetic.py 生成的不同规模合成数据上，对 get_*、compute.score、compute.component、
+analysis.dfs_filter、output.re_name、output.plot_circle 与 netvis.render_network 分别计时，结果保存为 JSON 以便比较回归。
+literature 子命令使用 mock_es.MockElasticsearch 测量研究现状相关阶段的耗时与 Elasticsearch 往返次数。
+startup 子命令测量 import main 的耗时，超出预算或提前导入了 pyecharts/elasticsearch/bs4 时以非零状态退出。
+
+用法:
+    python benchmark.py run --scales tiny small --repeat 3
+    python benchmark.py literature --targets 100 --latency 0.005
+    python benchmark.py literature --engine scan --corpus 20000
+    python benchmark.py startup --budget 1.0
+    python benchmark.py compare benchmark_results/old.json benchmark_results/new.json --threshold 0.2
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import metrics
+import mock_es
+import synthetic
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _measure(name, func, repeat, timings):
+    """运行 func repeat 次并记录各次的统计，返回最后一次的结果。"""
+    runs = []
+    result = None
+    for _ in range(repeat):
+        with metrics.stage(name) as record:
+            result = func()
+            record['rows'] = metrics.count_rows(result)
+        runs.append(record)
+
+    walls = [r['wall_s'] for r in runs]
+    rss = [r['peak_rss_delta_bytes'] for r in runs if r['peak_rss_delta_bytes'] is not None]
+    timings[name] = {
+        'wall_s_min': min(walls),
+        'wall_s_median': statistics.median(walls),
+        'cpu_s_median': statistics.median(r['cpu_s'] for r in runs),
+        'peak_rss_delta_bytes': max(rss) if rss else None,
+        'rows': runs[-1]['rows'],
+        'repeat': repeat,
+    }
+    print(f"  {name:<32} median {timings[name]['wall_s_median']:9.3f}s  rows {timings[name]['rows']}")
+    return result
+
+
+def run_scale(scale, seed=0, repeat=1, num=100, query_fraction=0.2, data_root='benchmark_data'):
+    """
+    在某一规模的合成数据上运行一次从辨证出发的完整流程，并对各阶段计时。
+
+    Args:
+        scale: synthetic.SCALES 中的规模名称。
+        seed: 随机种子，同时用于数据生成与 compute.component。
+        repeat: 每个阶段的重复次数。
+        num: compute.component 生成的组合数。
+        query_fraction: 作为查询输入的证候比例。
+        data_root: 合成数据的存放目录。
+
+    Returns:
+        以阶段名为键的计时字典。
+    """
+    import get
+    import compute
+    import analysis
+    import output
+    import netvis
+    import significance
+    import screening
+    import profile_store
+
+    print(f'[{scale}] preparing synthetic data ...')
+    get.DATA_DIR = synthetic.ensure(scale, seed, data_root)
+    metrics.reset()
+
+    all_sd = get.read_data('SD.xlsx')['DNSID']
+    sd_ids = all_sd.iloc[:max(1, int(len(all_sd) * query_fraction))]
+    t = {}
+
+    sd = _measure('get.get_SD', lambda: get.get_SD('DNSID', sd_ids), repeat, t)
+    sd_formula_links = _measure('get.get_SD_Formula_links',
+                                lambda: get.get_SD_Formula_links('DNSID', sd['DNSID']), repeat, t)
+    formula = _measure('get.get_formula', lambda: get.get_formula('DNFID', sd_formula_links['DNFID']), repeat, t)
+    formula_tcm_links = _measure('get.get_formula_tcm_links',
+                                 lambda: get.get_formula_tcm_links('DNFID', formula['DNFID']), repeat, t)
+    tcm = _measure('get.get_tcm', lambda: get.get_tcm('DNHID', formula_tcm_links['DNHID']), repeat, t)
+    tcm_chem_links = _measure('get.get_tcm_chem_links',
+                              lambda: get.get_tcm_chem_links('DNHID', tcm['DNHID']), repeat, t)
+    chem = _measure('get.get_chemicals', lambda: get.get_chemicals('DNCID', tcm_chem_links['DNCID']), repeat, t)
+    chem_protein_links = _measure('get.get_chem_protein_links',
+                                  lambda: get.get_chem_protein_links('DNCID', chem['DNCID'], score=900), repeat, t)
+    protein = _measure('get.get_proteins',
+                       lambda: get.get_proteins('Ensembl_ID', chem_protein_links['Ensembl_ID']), repeat, t)
+
+    tcm_s, chem_s, formula_s = _measure(
+        'compute.score',
+        lambda: compute.score(tcm, tcm_chem_links, chem, chem_protein_links, formula, formula_tcm_links),
+        repeat, t)
+    _measure('compute.score_sparse',
+             lambda: compute.score_sparse(tcm, tcm_chem_links, chem, chem_protein_links, formula, formula_tcm_links),
+             repeat, t)
+    _measure('significance.permutation_test',
+             lambda: significance.permutation_test(tcm, tcm_chem_links, chem, chem_protein_links,
+                                                   protein['Ensembl_ID'].iloc[::2], formula, formula_tcm_links,
+                                                   n_perm=1000, random_state=seed), repeat, t)
+    store_root = os.path.join(get.DATA_DIR, 'profiles')
+    _measure('profile_store.build', lambda: profile_store.build((900,), store_root), repeat, t)
+    _measure('profile_store.query_scores',
+             lambda: profile_store.query_scores(tcm, tcm_chem_links, chem, chem_protein_links, formula,
+                                                formula_tcm_links, 900, store_root), repeat, t)
+    profile = _measure('screening.build_profiles', lambda: screening.build_profiles(900), repeat, t)
+    _measure('screening.screen',
+             lambda: screening.screen(protein['Ensembl_ID'].iloc[::2], top_k=20, profile=profile), repeat, t)
+    _measure('compute.component',
+             lambda: compute.component(tcm_s.loc[tcm_s['Importance Score'] != 1.0], seed, num), repeat, t)
+    _measure('compute.component(topk)',
+             lambda: compute.component(tcm_s.loc[tcm_s['Importance Score'] != 1.0], seed, num, method='topk'),
+             repeat, t)
+    _measure('compute.component(beam)',
+             lambda: compute.component(tcm_s.loc[tcm_s['Importance Score'] != 1.0], num=num, method='beam'),
+             repeat, t)
+    _measure('compute.component(coverage)',
+             lambda: compute.component(tcm_s.loc[tcm_s['Importance Score'] != 1.0], num=num, method='coverage'),
+             repeat, t)
+
+    _measure('analysis.dfs_filter',
+             lambda: analysis.dfs_filter(formula, formula_tcm_links, tcm, tcm_chem_links, chem,
+                                         chem_protein_links, protein.iloc[::2]), repeat, t)
+
+    renamed = _measure('output.re_name',
+                       lambda: output.re_name(sd, sd_formula_links, formula, formula_tcm_links, tcm,
+                                              tcm_chem_links, chem, chem_protein_links, protein), repeat, t)
+    with tempfile.TemporaryDirectory() as path:
+        _measure('output.plot_circle', lambda: output.plot_circle(*renamed, path), repeat, t)
+        _measure('netvis.render_network', lambda: netvis.render_network(*renamed, path, cache_dir=None), repeat, t)
+
+    return t
+
+
+def _literature_fixture(data_root='benchmark_data', seed=0):
+    """
+    准备研究现状阶段所需的工作目录（Data/ID_Transformed 与 Data/Drug 下的映射文件）。
+    仓库未附带 Symbol_To_PubMedID.json 时，按对数正态分布生成合成的 PubMed ID 列表。
+    """
+    path = os.path.abspath(os.path.join(data_root, f'literature-{seed}'))
+    id_dir = os.path.join(path, 'Data', 'ID_Transformed')
+    drug_dir = os.path.join(path, 'Data', 'Drug')
+    os.makedirs(id_dir, exist_ok=True)
+    os.makedirs(drug_dir, exist_ok=True)
+
+    src = os.path.join(HERE, 'Data', 'ID_Transformed')
+    existing = {f.lower(): f for f in os.listdir(src)}
+    for name in ('Symbol_To_UniprotID.json', 'Symbol_To_Fullname.json', 'Symbol_To_PubMedID.json'):
+        target = os.path.join(id_dir, name)
+        if os.path.exists(target):
+            continue
+        if name.lower() in existing:
+            shutil.copyfile(os.path.join(src, existing[name.lower()]), target)
+        elif name == 'Symbol_To_PubMedID.json':
+            with open(os.path.join(id_dir, 'Symbol_To_UniprotID.json'), 'r') as f:
+                symbols = list(json.load(f))
+            rng = np.random.default_rng(seed)
+            sizes = np.clip(rng.lognormal(3.0, 1.5, len(symbols)).astype(int), 1, 50000)
+            pmids = {s: rng.integers(1, 36_000_000, n).tolist() for s, n in zip(symbols, sizes)}
+            with open(target, 'w') as f:
+                json.dump(pmids, f)
+    for name in ('Symbol_To_Target.json', 'Target_To_Drug.json'):
+        if not os.path.exists(os.path.join(drug_dir, name)):
+            shutil.copyfile(os.path.join(HERE, 'Data', 'Drug', name), os.path.join(drug_dir, name))
+    return path
+
+
+def _literature_corpus(symbols, n_docs, disease='cough', disease_rate=0.3, seed=0):
+    """
+    生成合成的摘要集合（mock_es.Corpus）：每篇摘要提到一个靶点（基因符号或基因全名）及其若干药物，
+    按 disease_rate 的比例提到疾病名称，PubMed ID 取自该靶点的文献列表。需在 _literature_fixture 目录中调用。
+    """
+    with open('Data/ID_Transformed/Symbol_To_PubMedID.json', 'r') as f:
+        symbol_to_pubmed = json.load(f)
+    with open('Data/ID_Transformed/Symbol_To_Fullname.json', 'r') as f:
+        symbol_to_fullname = json.load(f)
+    with open('Data/Drug/Symbol_To_Target.json', 'r') as f:
+        symbol_to_target = json.load(f)
+    with open('Data/Drug/Target_To_Drug.json', 'r') as f:
+        target_to_drug = json.load(f)
+
+    symbols = [s for s in symbols if s in symbol_to_pubmed]
+    rng = np.random.default_rng(seed)
+    filler = ['patients', 'expression', 'study', 'cells', 'clinical', 'response', 'levels', 'treatment']
+    docs, used = [], set()
+    for _ in range(n_docs):
+        symbol = symbols[rng.integers(len(symbols))]
+        pmid = int(rng.choice(symbol_to_pubmed[symbol]))
+        while pmid in used:
+            pmid = int(rng.integers(1, 36_000_000))
+        used.add(pmid)
+        words = list(rng.choice(filler, 12))
+        mention = symbol_to_fullname.get(symbol, symbol) if rng.random() < 0.3 else symbol
+        words.insert(int(rng.integers(len(words))), mention)
+        drugs = [name for drug in target_to_drug.get(next(iter(symbol_to_target.get(symbol, {'': ''}))), [])
+                 for name in drug]
+        for name in rng.permutation(drugs)[:2]:
+            words.insert(int(rng.integers(len(words))), str(name))
+        if rng.random() < disease_rate:
+            words.insert(int(rng.integers(len(words))), disease)
+        docs.append((pmid, ' '.join(words)))
+    return mock_es.Corpus(docs)
+
+
+def run_literature(n_targets=100, target_max_number=70, disease='cough', latency=0.005, counts=None,
+                   seed=0, data_root='benchmark_data', engine='es', corpus_docs=0, use_evidence=True):
+    """
+    使用本地文献检索替身测量 report_info、sort_targets、get_drug_report_info 与 get_drug_frequency。
+
+    Args:
+        n_targets: FDA 批准靶点与临床靶点各取的数量。
+        target_max_number: sort_targets 保留的靶点数。
+        disease: 疾病名称。
+        latency: 每次 Elasticsearch 往返的模拟延迟（秒）。
+        counts: 录制的命中数文件（mock_es.RecordingElasticsearch.save() 的输出）。
+        seed: 随机种子。
+        data_root: 工作目录的存放位置。
+        engine: 文献检索方式，'es' 逐个查询，'scan' 检索一次疾病相关文献后本地扫描（见 literature.py）。
+        corpus_docs: 大于 0 时生成该数量的合成摘要，替身按摘要内容求值查询（两种检索方式的结果可直接比较）。
+        use_evidence: 是否先用 output.drug_evidence_table 批量统计药物文献数（False 时逐个药物查询）。
+
+    Returns:
+        以阶段名为键的统计字典，包含耗时、往返次数、查询数与请求体字节数。
+    """
+    import get
+    import analysis
+    import output
+
+    path = _literature_fixture(data_root, seed)
+    metrics.reset()
+
+    cwd = os.getcwd()
+    os.chdir(path)
+    try:
+        with open('Data/Drug/Symbol_To_Target.json', 'r') as f:
+            symbol_to_target = json.load(f)
+        fa = [s for s, v in symbol_to_target.items() if [*v.values()][0] == 'Successful target'][:n_targets]
+        ct = [s for s, v in symbol_to_target.items() if [*v.values()][0] == 'Clinical Trial target'][:n_targets]
+        if corpus_docs:
+            es = mock_es.MockElasticsearch(latency=latency, corpus=_literature_corpus(fa + ct, corpus_docs, disease,
+                                                                                       seed=seed))
+        elif counts:
+            es = mock_es.MockElasticsearch.load(counts, latency=latency, seed=seed)
+        else:
+            es = mock_es.MockElasticsearch(latency=latency, seed=seed)
+        print(f'[literature] {len(fa)} FDA approved and {len(ct)} clinical targets, latency {latency}s, '
+              f'engine {engine}')
+
+        t = {}
+        lit = _measure('analysis.scan_literature', lambda: analysis.scan_literature(es, disease, fa + ct), 1, t) \
+            if engine == 'scan' else None
+        fda_no_review, fda_review, ct_no_review, ct_review = _measure(
+            'analysis.report_info', lambda: analysis.report_info(fa, ct, es, disease, 0, lit=lit), 1, t)
+        no_review = fda_no_review + ct_no_review
+        sort_list = _measure('output.sort_targets',
+                             lambda: output.sort_targets(no_review, target_max_number, es), 1, t)
+
+        target_to_drug = get.read_json('Data/Drug/Target_To_Drug.json')
+        drugs = []
+        for symbol in sort_list:
+            _, _, drug_ap, drug_cl = output.drug_classify([*symbol_to_target[symbol].keys()][0], target_to_drug)
+            drugs.append((drug_ap, drug_cl))
+        # 与 research_status_test 相同：全部推荐靶标的药物先统计一次，各靶标再查表
+        evidence = _measure('output.drug_evidence_table',
+                            lambda: output.drug_evidence_table(sort_list, symbol_to_target, disease, es, lit), 1, t) \
+            if use_evidence else None
+        reports = _measure('get.get_drug_report_info',
+                           lambda: [get.get_drug_report_info(ap, cl, disease, 0, es, lit, evidence)
+                                    for ap, cl in drugs], 1, t)
+        _measure('get.get_drug_frequency',
+                 lambda: [get.get_drug_frequency(r[0] + r[2], r[1] + r[3], es, evidence) for r in reports], 1, t)
+    finally:
+        os.chdir(cwd)
+
+    n_drugs = sum(len(d) for r in reports for d in r)
+    n_drug_reported = sum(len(r[1]) + len(r[3]) for r in reports)
+    print(f'  reported targets {len(fda_review) + len(ct_review)} / {len(fa) + len(ct)}, '
+          f'reported drugs {n_drug_reported} / {n_drugs}')
+    for stage_name, s in es.stats().items():
+        if stage_name in t:
+            t[stage_name].update(s)
+        # 同时列出嵌套阶段（如 analysis.disease_pubmed_ids）中的往返
+        print(f"  {stage_name:<32} {s['round_trips']} round trips, {s['request_bytes'] / 1024:.0f} KiB sent")
+    return t
+
+
+# 只在绘图、研究现状测试与安全性研究中使用的重型依赖，import main 时不应被导入
+LAZY_MODULES = ('pyecharts', 'elasticsearch', 'bs4')
+
+
+def startup(module='main', repeat=5, budget=1.0):
+    """
+    在新进程中测量导入 module 的耗时，并检查 LAZY_MODULES 是否被提前导入。
+
+    Args:
+        module: 要导入的模块。
+        repeat: 重复次数，取中位数。
+        budget: 导入耗时预算（秒）。
+
+    Returns:
+        (统计字典, 是否满足预算且未提前导入重型依赖)
+    """
+    code = ('import sys, time; t = time.perf_counter(); import {0}; '
+            'print(time.perf_counter() - t); print(",".join(m for m in {1} if m in sys.modules))')
+    walls, loaded = [], set()
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c', code.format(module, LAZY_MODULES)], cwd=HERE,
+                             capture_output=True, text=True, check=True).stdout.split('\n')
+        walls.append(float(out[0]))
+        loaded.update(m for m in out[1].split(',') if m)
+
+    t = {f'import {module}': {'wall_s_min': min(walls), 'wall_s_median': statistics.median(walls),
+                              'budget_s': budget, 'eager_modules': sorted(loaded), 'repeat': repeat}}
+    ok = statistics.median(walls) <= budget and not loaded
+    print(f"import {module}: median {statistics.median(walls):.3f}s (budget {budget}s), "
+          f"eagerly imported: {', '.join(sorted(loaded)) or 'none'}")
+    return t, ok
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=HERE).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _meta():
+    return {
+        'revision': _git_revision(),
+        'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+    }
+
+
+def _save(results, out=None):
+    """将结果写入 out，默认为 benchmark_results/<时间>.json。"""
+    if out is None:
+        os.makedirs('benchmark_results', exist_ok=True)
+        out = os.path.join('benchmark_results', time.strftime('%Y%m%d-%H%M%S') + '.json')
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=4)
+    print(f'Results written to {out}')
+
+
+def run(scales, seed=0, repeat=1, num=100, query_fraction=0.2, out=None, data_root='benchmark_data'):
+    """对多个规模运行基准测试，并将结果写入 out。"""
+    metrics.configure(enabled=True)
+    results = {'meta': dict(_meta(), seed=seed, num=num, query_fraction=query_fraction), 'results': {}}
+    for scale in scales:
+        results['results'][scale] = {
+            'params': synthetic.SCALES[scale],
+            'stages': run_scale(scale, seed, repeat, num, query_fraction, data_root),
+        }
+
+    _save(results, out)
+    return results
+
+
+def compare(old_path, new_path, threshold=0.2, min_seconds=0.01):
+    """
+    比较两次基准测试结果。
+
+    Args:
+        old_path: 基线结果文件。
+        new_path: 新结果文件。
+        threshold: 中位耗时增长超过该比例视为回归。
+        min_seconds: 耗时差小于该值时忽略（避免噪声）。
+
+    Returns:
+        回归的 (规模, 阶段) 列表。
+    """
+    with open(old_path, 'r', encoding='utf-8') as f:
+        old = json.load(f)['results']
+    with open(new_path, 'r', encoding='utf-8') as f:
+        new = json.load(f)['results']
+
+    regressions = []
+    print(f"{'scale':<8}{'stage':<34}{'old_s':>10}{'new_s':>10}{'ratio':>8}")
+    for scale in sorted(old.keys() & new.keys()):
+        for stage_name in sorted(old[scale]['stages'].keys() & new[scale]['stages'].keys()):
+            a = old[scale]['stages'][stage_name]['wall_s_median']
+            b = new[scale]['stages'][stage_name]['wall_s_median']
+            ratio = b / a if a > 0 else float('inf')
+            flag = ratio > 1 + threshold and b - a > min_seconds
+            if flag:
+                regressions.append((scale, stage_name))
+            print(f"{scale:<8}{stage_name:<34}{a:>10.3f}{b:>10.3f}{ratio:>8.2f}{'  REGRESSION' if flag else ''}")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='TCM-VOTER pipeline benchmarks')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_run = sub.add_parser('run', help='run benchmarks on synthetic data')
+    p_run.add_argument('--scales', nargs='+', default=['tiny', 'small'], choices=list(synthetic.SCALES))
+    p_run.add_argument('--seed', type=int, default=0)
+    p_run.add_argument('--repeat', type=int, default=1)
+    p_run.add_argument('--num', type=int, default=100, help='number of combinations for compute.component')
+    p_run.add_argument('--query-fraction', type=float, default=0.2)
+    p_run.add_argument('--data-root', default='benchmark_data')
+    p_run.add_argument('--out', default=None)
+
+    p_lit = sub.add_parser('literature', help='measure research-status stages against the mock literature backend')
+    p_lit.add_argument('--targets', type=int, default=100)
+    p_lit.add_argument('--target-max-number', type=int, default=70)
+    p_lit.add_argument('--disease', default='cough')
+    p_lit.add_argument('--latency', type=float, default=0.005)
+    p_lit.add_argument('--counts', default=None, help='recorded hit counts (JSON)')
+    p_lit.add_argument('--seed', type=int, default=0)
+    p_lit.add_argument('--data-root', default='benchmark_data')
+    p_lit.add_argument('--engine', default='es', choices=['es', 'scan'])
+    p_lit.add_argument('--no-evidence', action='store_true', help='query each drug per target instead of batching')
+    p_lit.add_argument('--corpus', type=int, default=0,
+                       help='number of synthetic abstracts to evaluate queries against (0: hashed hit counts)')
+    p_lit.add_argument('--out', default=None)
+
+    p_start = sub.add_parser('startup', help='check the import-time budget of main')
+    p_start.add_argument('--module', default='main')
+    p_start.add_argument('--repeat', type=int, default=5)
+    p_start.add_argument('--budget', type=float, default=1.0, help='seconds')
+    p_start.add_argument('--out', default=None)
+
+    p_cmp = sub.add_parser('compare', help='compare two result files')
+    p_cmp.add_argument('old')
+    p_cmp.add_argument('new')
+    p_cmp.add_argument('--threshold', type=float, default=0.2)
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args.scales, args.seed, args.repeat, args.num, args.query_fraction, args.out, args.data_root)
+    elif args.command == 'literature':
+        metrics.configure(enabled=True)
+        stages = run_literature(args.targets, args.target_max_number, args.disease, args.latency, args.counts,
+                                args.seed, args.data_root, args.engine, args.corpus, not args.no_evidence)
+        _save({'meta': dict(_meta(), latency=args.latency, targets=args.targets),
+               'results': {'literature': {'params': {'targets': args.targets, 'latency': args.latency,
+                                                     'engine': args.engine, 'corpus': args.corpus},
+                                          'stages': stages}}}, args.out)
+    elif args.command == 'startup':
+        stages, ok = startup(args.module, args.repeat, args.budget)
+        if args.out:
+            _save({'meta': _meta(), 'results': {'startup': {'params': {'budget': args.budget}, 'stages': stages}}},
+                  args.out)
+        sys.exit(0 if ok else 1)
+    else:
+        sys.exit(1 if compare(args.old, args.new, args.threshold) else 0)
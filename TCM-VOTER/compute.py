@@ -1,11 +1,16 @@
 from typing import Union
 from tqdm import tqdm
+import concurrent.futures
+import heapq
+import os
 import warnings
 import numpy as np
 import pandas as pd
 from math import ceil
 import random
+from functools import partial
 from typing import List, Tuple
+import metrics
 
 warnings.filterwarnings("ignore")
 np.seterr(all="ignore")
@@ -33,6 +38,186 @@ def calculate_herbiv_score(data: pd.DataFrame, id_col: str, link_data: pd.DataFr
     return data[id_col].map(scores).fillna(0)  # 如果没有匹配的分数，默认为 0
 
 
+# 每个靶点的 HerbiV Score 的输出方式：'wide' 每个靶点一列，'sparse' 只保留 Importance Score（见 score_sparse），
+# 'auto' 在靶点数超过 WIDE_MAX_PROTEINS 时使用 'sparse'
+PER_PROTEIN_MODES = ('wide', 'sparse', 'auto')
+
+# 'auto' 时仍按靶点展开为列的最大靶点数（Excel 工作表最多 16384 列）
+WIDE_MAX_PROTEINS = 1000
+
+SCORE_SUFFIX = ' HerbiV Score'
+
+COMPONENT_METHODS = ('knapsack', 'topk', 'beam', 'coverage')
+
+
+class ProteinScores:
+    """
+    各化合物、中药、复方对每个靶点的 HerbiV Score，以稀疏矩阵（行为实体，列为靶点）存储，0 不存储。
+
+    Args:
+        proteins: 靶点的 Ensembl ID（列的顺序）。
+        matrices: {'chem' | 'tcm' | 'formula': (实体 ID 数组, scipy.sparse.csr_matrix)}。
+    """
+
+    ID_COLUMNS = {'chem': 'DNCID', 'tcm': 'DNHID', 'formula': 'DNFID'}
+
+    def __init__(self, proteins, matrices):
+        self.proteins = pd.Index(proteins, name='Ensembl_ID')
+        self.matrices = matrices
+
+    def __contains__(self, kind):
+        return kind in self.matrices
+
+    def matrix(self, kind):
+        """实体 ID 数组与稀疏矩阵。"""
+        return self.matrices[kind]
+
+    def long(self, kind) -> pd.DataFrame:
+        """长表（实体 ID, Ensembl_ID, HerbiV Score），只包含非零的得分。"""
+        ids, m = self.matrices[kind]
+        coo = m.tocoo()
+        return pd.DataFrame({self.ID_COLUMNS[kind]: ids[coo.row],
+                             'Ensembl_ID': self.proteins.values[coo.col],
+                             'HerbiV Score': coo.data})
+
+    def wide(self, kind, proteins=None) -> pd.DataFrame:
+        """按靶点展开为 '{protein} HerbiV Score' 列（proteins 为 None 时展开全部靶点），行与实体表的行一致。"""
+        _, m = self.matrices[kind]
+        columns = self.proteins if proteins is None else pd.Index(proteins)
+        m = m if proteins is None else m[:, self.proteins.get_indexer(columns)]
+        return pd.DataFrame(m.toarray(), columns=[f'{p}{SCORE_SUFFIX}' for p in columns])
+
+    def nbytes(self) -> int:
+        return sum(m.data.nbytes + m.indices.nbytes + m.indptr.nbytes for _, m in self.matrices.values())
+
+
+def _membership(rows, row_col, links, link_row_col, link_item_col, items, item_col):
+    """rows 的第 i 行与 items 的第 j 行之间有连接时为 1 的稀疏矩阵（同一对只计一次）。"""
+    from scipy import sparse
+
+    pairs = (pd.DataFrame({row_col: rows[row_col].values, 'row': np.arange(len(rows))})
+             .merge(links[[link_row_col, link_item_col]].drop_duplicates()
+                    .rename(columns={link_row_col: row_col, link_item_col: item_col}), on=row_col)
+             .merge(pd.DataFrame({item_col: items[item_col].values, 'item': np.arange(len(items))}), on=item_col)
+             [['row', 'item']].drop_duplicates())
+    return sparse.csr_matrix((np.ones(len(pairs)), (pairs['row'].values, pairs['item'].values)),
+                             shape=(len(rows), len(items)))
+
+
+def _combine(membership, scores):
+    """1 - ∏(1 - score)：各实体对每个靶点的得分由其包含的下级实体的得分合并（在对数空间中以稀疏矩阵乘法计算）。"""
+    log_miss = scores.copy()
+    log_miss.data = np.log1p(-log_miss.data)
+    combined = (membership @ log_miss).tocsr()
+    combined.data = -np.expm1(combined.data)
+    combined.eliminate_zeros()
+    return combined
+
+
+@metrics.timed
+def protein_scores(
+        tcm: pd.DataFrame,
+        tcm_chem_links: pd.DataFrame,
+        chem: pd.DataFrame,
+        chem_protein_links: pd.DataFrame,
+        formula: Union[pd.DataFrame, None] = None,
+        formula_tcm_links: Union[pd.DataFrame, None] = None,
+        dtype=np.float32
+) -> ProteinScores:
+    """
+    计算化合物、中药和复方对每个靶点的 HerbiV Score（稀疏矩阵，行与输入表的行一致）。
+
+    化合物的得分为其与靶点连接的 Combined_score；中药、复方的得分为 1 - ∏(1 - 所含化合物/中药的得分)。
+    计算使用 float64，结果按 dtype 存储。
+    """
+    from scipy import sparse
+
+    proteins = pd.Index(chem_protein_links['Ensembl_ID'].unique())
+
+    # 同一化合物与靶点有多条连接时取最后一条
+    links = chem_protein_links.drop_duplicates(['DNCID', 'Ensembl_ID'], keep='last')
+    pairs = (pd.DataFrame({'DNCID': chem['DNCID'].values, 'row': np.arange(len(chem))})
+             .merge(links[['DNCID', 'Ensembl_ID', 'Combined_score']], on='DNCID'))
+    values = pairs['Combined_score'].astype(float).fillna(0).values
+    chem_m = sparse.csr_matrix((1 - (1 - values), (pairs['row'].values, proteins.get_indexer(pairs['Ensembl_ID']))),
+                               shape=(len(chem), len(proteins)))
+    chem_m.eliminate_zeros()
+
+    tcm_m = _combine(_membership(tcm, 'DNHID', tcm_chem_links, 'DNHID', 'DNCID', chem, 'DNCID'), chem_m)
+    matrices = {'chem': (chem['DNCID'].values, chem_m), 'tcm': (tcm['DNHID'].values, tcm_m)}
+    if formula is not None:
+        formula_m = _combine(_membership(formula, 'DNFID', formula_tcm_links, 'DNFID', 'DNHID', tcm, 'DNHID'), tcm_m)
+        matrices['formula'] = (formula['DNFID'].values, formula_m)
+
+    return ProteinScores(proteins, {k: (ids, m.astype(dtype)) for k, (ids, m) in matrices.items()})
+
+
+def _weight_vector(proteins, weights):
+    # weights 的键为 '{protein} HerbiV Score'，Importance Score 为加权得分对全部键的平均
+    if weights is None:
+        return np.ones(len(proteins)), len(proteins)
+    w = np.zeros(len(proteins))
+    for key, value in weights.items():
+        protein = key[:-len(SCORE_SUFFIX)] if key.endswith(SCORE_SUFFIX) else key
+        if protein not in proteins:
+            raise KeyError(key)
+        w[proteins.get_loc(protein)] = value
+    return w, len(weights)
+
+
+@metrics.timed
+def score_sparse(
+        tcm: pd.DataFrame,
+        tcm_chem_links: pd.DataFrame,
+        chem: pd.DataFrame,
+        chem_protein_links: pd.DataFrame,
+        formula: Union[pd.DataFrame, None] = None,
+        formula_tcm_links: Union[pd.DataFrame, None] = None,
+        weights: Union[dict, None] = None,
+        top_n: int = 0,
+        dtype=np.float32,
+        scores: Union[ProteinScores, None] = None
+) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, ProteinScores]:
+    """
+    计算复方、中药和化合物的 Importance Score，每个靶点的 HerbiV Score 以稀疏矩阵单独返回。
+
+    Args:
+        与 score 相同。
+        top_n: 在各实体表中另外保留加权得分之和最高的 top_n 个靶点的 '{protein} HerbiV Score' 列。
+        dtype: 每个靶点得分的存储类型。
+        scores: 与 score 相同。
+
+    Returns:
+        tcm_and_score, chem_and_score, formula_and_score: 与 score 相同，但不包含每个靶点的得分列。
+        scores: ProteinScores，行与排序前的输入表一致。
+    """
+    if scores is None:
+        scores = protein_scores(tcm, tcm_chem_links, chem, chem_protein_links, formula, formula_tcm_links, np.float64)
+    w, n_keys = _weight_vector(scores.proteins, weights)
+
+    results = {}
+    for kind, data in (('tcm', tcm), ('chem', chem), ('formula', formula)):
+        if kind not in scores:
+            results[kind] = None
+            continue
+        _, m = scores.matrix(kind)
+        frame = data.copy()
+        if top_n:
+            contribution = np.asarray(m.sum(axis=0)).ravel() * w
+            top = scores.proteins[np.argsort(-contribution, kind='stable')[:top_n]]
+            extra = scores.wide(kind, top)
+            extra.index = frame.index
+            frame = pd.concat([frame, extra], axis=1)
+        # 加权计算 Importance Score
+        frame['Importance Score'] = (m @ w) / n_keys if n_keys else np.nan
+        # 根据 Importance Score 降序排序
+        results[kind] = frame.sort_values(by='Importance Score', ascending=False).reset_index(drop=True)
+
+    scores = ProteinScores(scores.proteins, {k: (ids, m.astype(dtype)) for k, (ids, m) in scores.matrices.items()})
+    return results['tcm'], results['chem'], results['formula'], scores
+
+
+@metrics.timed
 def score(
         tcm: pd.DataFrame,
         tcm_chem_links: pd.DataFrame,
@@ -40,7 +225,10 @@ def score(
         chem_protein_links: pd.DataFrame,
         formula: Union[pd.DataFrame, None] = None,
         formula_tcm_links: Union[pd.DataFrame, None] = None,
-        weights: Union[dict, None] = None
+        weights: Union[dict, None] = None,
+        per_protein: str = 'wide',
+        top_n: int = 0,
+        scores: Union[ProteinScores, None] = None
 ) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
     """
     计算复方、中药和化合物的 HerbiV Score。
@@ -53,156 +241,448 @@ def score(
         formula: 复方信息。默认为 None。
         formula_tcm_links: 复方-中药连接信息。默认为 None。
         weights: 各靶点的权重，各权重的和应为 1。默认为 None。
+        per_protein: 每个靶点的 HerbiV Score 的输出方式（PER_PROTEIN_MODES）。'wide' 为每个靶点增加一列；
+            'sparse' 只增加 Importance Score 与 top_n 个靶点的列，全部得分可由 score_sparse 得到；
+            'auto' 在靶点数超过 WIDE_MAX_PROTEINS 时使用 'sparse'。默认为 'wide'。
+        top_n: per_protein 为 'sparse' 时保留的靶点列数（见 score_sparse）。默认为 0。
+        scores: 预先计算的每个靶点的得分（行与输入表一致，如 profile_store.query_scores 的结果），
+            为 None 时由 protein_scores 计算。默认为 None。
 
     Returns:
         tcm_and_score: 中药信息及 HerbiV Score。
         chem_and_score: 化合物信息及 HerbiV Score。
         formula_and_score: 复方信息及 HerbiV Score。
     """
-    # 创建副本以避免修改原始数据
-    formula_and_score = formula.copy() if formula is not None else None
-    tcm_and_score = tcm.copy()
-    chem_and_score = chem.copy()
-
-    # 获取所有蛋白质 ID
-    proteins_id = chem_protein_links['Ensembl_ID'].unique()
+    if per_protein not in PER_PROTEIN_MODES:
+        raise ValueError(f"per_protein must be one of {', '.join(PER_PROTEIN_MODES)}")
+    if per_protein == 'auto':
+        per_protein = 'wide' if chem_protein_links['Ensembl_ID'].nunique() <= WIDE_MAX_PROTEINS else 'sparse'
+    if per_protein == 'sparse':
+        return score_sparse(tcm, tcm_chem_links, chem, chem_protein_links, formula, formula_tcm_links, weights,
+                            top_n, scores=scores)[:3]
 
-    # 预计算化合物-蛋白质连接信息
-    chem_protein_dict = chem_protein_links.groupby('Ensembl_ID').apply(
-        lambda x: x.set_index('DNCID')['Combined_score'].to_dict()
-    ).to_dict()
-
-    # 预计算中药-化合物连接信息
-    tcm_chem_dict = tcm_chem_links.groupby('DNHID')['DNCID'].apply(list).to_dict()
-
-    # 预计算复方-中药连接信息
-    if formula is not None:
-        formula_tcm_dict = formula_tcm_links.groupby('DNFID')['DNHID'].apply(list).to_dict()
-
-    # 使用 tqdm 显示蛋白质计算的进度
-    for protein in proteins_id:
-        # 计算每一个化合物的 HerbiV Score
-        chem_scores = chem_protein_dict.get(protein, {})
-        chem_and_score[f'{protein} HerbiV Score'] = chem['DNCID'].map(chem_scores).fillna(0).apply(
-            lambda x: 1 - (1 - x) if x != 0 else 0
-        )
-
-        # 计算各中药的 HerbiV Score
-        tcm_scores = tcm['DNHID'].apply(
-            lambda x: 1 - (1 - chem_and_score.loc[chem_and_score['DNCID'].
-                           isin(tcm_chem_dict.get(x, [])), f'{protein} HerbiV Score']).prod()
-        )
-        tcm_and_score[f'{protein} HerbiV Score'] = tcm_scores
-
-        # 若传入了复方相关信息，则还需计算各复方的 HerbiV Score
-        if formula is not None:
-            formula_scores = formula['DNFID'].apply(
-                lambda x: 1 - (1 - tcm_and_score.loc[tcm_and_score['DNHID'].
-                               isin(formula_tcm_dict.get(x, [])), f'{protein} HerbiV Score']).prod()
-            )
-            formula_and_score[f'{protein} HerbiV Score'] = formula_scores
+    if scores is None:
+        scores = protein_scores(tcm, tcm_chem_links, chem, chem_protein_links, formula, formula_tcm_links, np.float64)
 
     # 设置默认权重
     if weights is None:
-        weights = {f'{protein} HerbiV Score': 1 for protein in proteins_id}
+        weights = {f'{protein}{SCORE_SUFFIX}': 1 for protein in scores.proteins}
 
     # 加权计算各复方、中药、成分（化合物）的 Importance Score
     def calculate_weighted_score(data: pd.DataFrame) -> pd.Series:
         return (data[list(weights.keys())] * pd.Series(weights)).mean(axis=1)
 
-    if formula is not None:
-        formula_and_score['Importance Score'] = calculate_weighted_score(formula_and_score)
-    tcm_and_score['Importance Score'] = calculate_weighted_score(tcm_and_score)
-    chem_and_score['Importance Score'] = calculate_weighted_score(chem_and_score)
+    results = {}
+    for kind, data in (('tcm', tcm), ('chem', chem), ('formula', formula)):
+        if kind not in scores:
+            results[kind] = None
+            continue
+        wide = scores.wide(kind)
+        wide.index = data.index
+        frame = pd.concat([data.drop(columns=wide.columns.intersection(data.columns)), wide], axis=1)
+        frame['Importance Score'] = calculate_weighted_score(frame)
+        # 根据 Importance Score 降序排序
+        results[kind] = frame.sort_values(by='Importance Score', ascending=False).reset_index(drop=True)
 
-    # 根据 Importance Score 降序排序
-    if formula is not None:
-        formula_and_score = formula_and_score.sort_values(by='Importance Score', ascending=False).reset_index(drop=True)
-    tcm_and_score = tcm_and_score.sort_values(by='Importance Score', ascending=False).reset_index(drop=True)
-    chem_and_score = chem_and_score.sort_values(by='Importance Score', ascending=False).reset_index(drop=True)
-
-    return tcm_and_score, chem_and_score, formula_and_score
+    return results['tcm'], results['chem'], results['formula']
 
 
-def component(items_and_score: pd.DataFrame, random_state=None, num=1000, c=10) -> pd.DataFrame:
+@metrics.timed
+def component_arrays(items_and_score: pd.DataFrame, random_state=None, num=1000, c=10, method='knapsack') -> dict:
     """
-    生成复方/中药的组合，并计算其重要性评分。
+    生成复方/中药的组合（与 component 相同），组合以物品编号的矩阵表示，不转换为字符串。
 
     Args:
-        items_and_score: 包含复方/中药信息及重要性评分的 DataFrame。
-        random_state: 随机种子。
-        num: 需要生成的组合数。
-        c: 背包容量。
+        与 component 相同。
+        method: 'knapsack' 以 knapsack 求解每组随机抽取的物品，之前得出的组合中的物品不再同时选择；
+            'topk' 以 topk_component 直接取每组中评分最高的物品（物品重量均为 1 时的精确解），
+            不使用禁止组合，重复的组合在最后去除。默认为 'knapsack'。
 
     Returns:
-        包含组合及其重要性评分的 DataFrame。
+        字典：
+            names: 物品名称（DNFID 或 DNHID），编号即其下标；
+            items: (组合数, 最大组合大小) 的编号矩阵，不足处为 -1；
+            score: 各组合的重要性评分；
+            boost: 各组合相对其中评分最高的物品的提升量。
+        去除了物品集合相同的重复组合，按 boost 降序排列。
     """
-    if 'DNFID' in items_and_score.columns:
-        by = 'DNFID'
-    else:
-        by = 'DNHID'
+    by = 'DNFID' if 'DNFID' in items_and_score.columns else 'DNHID'
 
-    dps = []
-    items_ls = []
-    n = len(items_and_score)
-    weights = np.ones(n, dtype=int)  # 使用 NumPy 数组替代列表
-    names = items_and_score[by].values  # 使用 NumPy 数组替代列表
-    values = items_and_score['Importance Score'].values  # 使用 NumPy 数组替代列表
+    # 名称相同的物品使用同一编号，knapsack 比较编号即比较名称
+    codes, names = pd.factorize(items_and_score[by])
+    values = items_and_score['Importance Score'].values
+    weights = np.ones(len(codes), dtype=int)
     n = ceil(len(weights) / 10)
 
     if random_state is not None:
         random.seed(random_state)
 
+    dps = []
+    items_ls = []
     for _ in tqdm(range(num), desc="Generating Components"):
         random_indices = random.sample(range(len(weights)), n)
-        sampled_weights = weights[random_indices]
-        sampled_names = names[random_indices]
-        sampled_values = values[random_indices]
 
-        # 不能再得出之前的解
-        dp, items = knapsack(sampled_weights, n, items_ls, sampled_names, sampled_values, c)
+        if method == 'topk':
+            # 同名物品只保留评分最高的一个
+            order = np.argsort(-values[random_indices], kind='stable')
+            sample = np.asarray(random_indices)[order]
+            _, first = np.unique(codes[sample], return_index=True)
+            sample = sample[np.sort(first)]
+            dp, top = topk_component(values[sample], c)
+            items = codes[sample][top].tolist()
+        else:
+            # 不能再得出之前的解
+            dp, items = knapsack(weights[random_indices], n, items_ls, codes[random_indices], values[random_indices],
+                                 c)
         dps.append(dp)
         items_ls.append(items)
 
-    # 用 pd.DataFrame 存储结果
-    components = pd.DataFrame({'Importance Score': dps, 'items': items_ls})
-    components['items'] = components['items'].apply(lambda x: ';'.join(x))
+    width = max((len(items) for items in items_ls), default=0)
+    matrix = np.full((len(items_ls), width), -1, dtype=np.int64)
+    for row, items in enumerate(items_ls):
+        matrix[row, :len(items)] = items
+    score = np.asarray(dps, dtype=float)
+
+    # 物品集合相同的组合只保留第一个（各行排序后按哈希去重）
+    keep = ~pd.DataFrame(np.sort(matrix, axis=1)).duplicated().values
+    matrix, score = matrix[keep], score[keep]
 
-    # 计算 Score 的提升量
-    components['Boost'] = components.apply(boost, axis=1, args=(items_and_score, by))
+    # 计算 Score 的提升量：组合中评分最高的物品（同名物品取最高分），一次 gather 完成
+    best = pd.Series(values).groupby(codes).max().reindex(range(len(names))).values
+    padded = np.append(best, -np.inf)
+    max_score = padded[matrix].max(axis=1, initial=-np.inf)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        boost = np.where(np.isfinite(max_score) & (max_score != 0), (score - max_score) / max_score, 0.0)
 
     # 根据 Boost 降序排序
-    components = components.sort_values(by='Boost', ascending=False).reset_index(drop=True)
+    order = np.argsort(-boost, kind='stable')
+    return {'names': np.asarray(names), 'items': matrix[order], 'score': score[order], 'boost': boost[order]}
+
+
+def component_frame(arrays: dict, sep=';') -> pd.DataFrame:
+    """将 component_arrays 的结果转换为 DataFrame（Importance Score、items、Boost），组合以 sep 连接的名称表示。"""
+    names = arrays['names']
+    return pd.DataFrame({
+        'Importance Score': arrays['score'],
+        'items': [sep.join(names[row[row >= 0]]) for row in arrays['items']],
+        'Boost': arrays['boost'],
+    })
 
-    return components
 
+def topk_component(values: np.ndarray, c: int = 10) -> Tuple[float, np.ndarray]:
+    """
+    物品重量均为 1 时背包问题的精确解：1 - ∏(1 - v) 对每个 v 单调，容量 j 下的最优组合即评分最高的 j 个物品。
+
+    Args:
+        values: 物品的价值。
+        c: 背包容量。
 
-def boost(row: pd.Series, items_and_score: pd.DataFrame, by: str) -> float:
+    Returns:
+        最大价值及选择的物品下标（组合大小的选择与 knapsack 相同）。
+    """
+    values = np.asarray(values, dtype=float)
+    top = np.argsort(-values, kind='stable')[:c]
+    dp = np.concatenate([[0.0], -np.expm1(np.cumsum(np.log1p(-values[top])))])
+    # 物品少于 c 个时，与 knapsack 的 dp 相同，容量超过物品数的最优值等于全部物品的值
+    dp = np.pad(dp, (0, c + 1 - len(dp)), mode='edge')
+    size = _component_size(dp)
+    return dp[size], top[:size]
+
+
+def _coverage_matrix(items_and_score, rows, names, by, scores, weights):
+    """各物品（rows 为每个物品所在的行）对每个靶点的得分矩阵及靶点权重，用于计算组合的互补覆盖。"""
+    from scipy import sparse
+
+    if scores is not None:
+        ids, m = scores.matrix('formula' if by == 'DNFID' else 'tcm')
+        w, n_keys = _weight_vector(scores.proteins, weights)
+        # 同一 ID 有多行时取第一行，score_sparse 中没有的物品得分为 0
+        first = np.nonzero(~pd.Index(ids).duplicated())[0]
+        index = pd.Index(ids[first]).get_indexer(names)
+        index = np.where(index >= 0, first[index], m.shape[0])
+        m = sparse.vstack([m.astype(float), sparse.csr_matrix((1, m.shape[1]))]).tocsr()[index]
+        return m, w / n_keys if n_keys else w
+    columns = [col for col in items_and_score.columns if col.endswith(SCORE_SUFFIX)]
+    if weights is not None:
+        columns = list(weights.keys())
+    if columns:
+        # score(per_protein='wide') 的结果中已有每个靶点的得分列
+        m = sparse.csr_matrix(np.nan_to_num(items_and_score[columns].values[rows].astype(float)))
+        w = np.ones(len(columns)) if weights is None else np.array([weights[col] for col in columns], dtype=float)
+        return m, w / len(columns)
+    # 没有每个靶点的得分时，组合的评分为 1 - ∏(1 - Importance Score)（只用于 beam，coverage 见 coverage_component）
+    values = items_and_score['Importance Score'].values[rows].astype(float)
+    return sparse.csr_matrix(values.reshape(-1, 1)), np.ones(1)
+
+
+@metrics.timed
+def beam_component_arrays(items_and_score: pd.DataFrame, scores: Union[ProteinScores, None] = None, num=1000, c=10,
+                          beam_width=None, weights: Union[dict, None] = None) -> dict:
     """
-    计算组合的重要性评分提升量。
+    以束搜索生成复方/中药的组合：组合的评分为其对各靶点的互补覆盖，即 1 - ∏(1 - 各物品对该靶点的得分) 的加权平均
+    （与单个物品的 Importance Score 的计算方式相同），组合之间互不重复。
 
     Args:
-        row: 包含组合及其重要性评分的行。
         items_and_score: 包含复方/中药信息及重要性评分的 DataFrame。
-        by: 用于匹配的列名。
+        scores: score_sparse 返回的 ProteinScores。为 None 时使用 items_and_score 中的 '{protein} HerbiV Score' 列，
+            两者都没有时组合的评分为 1 - ∏(1 - Importance Score)。默认为 None。
+        num: 需要生成的组合数。
+        c: 背包容量。
+        beam_width: 每层保留的部分组合数。默认为 max(num, 32)。
+        weights: 各靶点的权重（与 score 相同）。默认为 None。
+
+    Returns:
+        与 component_arrays 相同的字典。组合大小按 knapsack 的规则由贪心序列的评分选择。
+    """
+    from scipy import sparse
+
+    by = 'DNFID' if 'DNFID' in items_and_score.columns else 'DNHID'
+
+    # 名称相同的物品只保留评分最高的一行
+    codes, names = pd.factorize(items_and_score[by])
+    values = np.nan_to_num(items_and_score['Importance Score'].values.astype(float))
+    rows = pd.Series(values).groupby(codes).idxmax().reindex(range(len(names))).values
+    best = values[rows]
+    m, wv = _coverage_matrix(items_and_score, rows, np.asarray(names), by, scores, weights)
+    mt = m.T.tocsr()
+    single = m @ wv
+    n = len(names)
+
+    def coverage(hit):
+        return hit @ wv
+
+    def gains(hit):
+        # 加入物品 j 后覆盖的增量：Σ_p w_p (1 - hit_p) s_jp
+        return single[None, :] - np.asarray((hit.multiply(wv[None, :]) @ mt).todense())
+
+    # 贪心序列各长度的评分决定组合大小
+    size = 0
+    if n:
+        hit = sparse.csr_matrix((1, m.shape[1]))
+        curve = [0.0]
+        chosen = []
+        for _ in range(min(c, n)):
+            g = gains(hit)[0]
+            g[chosen] = -np.inf
+            j = int(np.argmax(g))
+            chosen.append(j)
+            hit = hit + m[j] - hit.multiply(m[j])
+            curve.append(float(coverage(hit)[0]))
+        size = min(_component_size(np.asarray(curve)), n)
+
+    width = beam_width or max(num, 32)
+    states = np.empty((1, 0), dtype=np.int64)
+    hits = sparse.csr_matrix((1, m.shape[1]))
+    state_score = np.zeros(1)
+    for depth in range(size):
+        keep = num if depth == size - 1 else width
+        # 每个部分组合扩展的物品数，使候选约为保留数的两倍
+        k = min(keep if depth == 0 else max(4, ceil(2 * keep / len(states))), n)
+        cand_state, cand_item = [], []
+        for start in range(0, len(states), 64):
+            block = states[start:start + 64]
+            g = gains(hits[start:start + 64])
+            # 已在组合中的物品不再加入
+            g[np.arange(len(block))[:, None], block] = -np.inf
+            top = np.argpartition(-g, k - 1, axis=1)[:, :k]
+            ok = np.isfinite(np.take_along_axis(g, top, axis=1))
+            cand_state.append(np.nonzero(ok)[0] + start)
+            cand_item.append(top[ok])
+        cand_state = np.concatenate(cand_state)
+        cand_item = np.concatenate(cand_item)
+        picked = m[cand_item]
+        parent = hits[cand_state]
+        cand_hits = (parent + picked - parent.multiply(picked)).tocsr()
+        cand_score = coverage(cand_hits)
+        # 按评分排序后，物品集合相同的组合只保留第一个
+        cand = np.sort(np.column_stack([states[cand_state], cand_item]), axis=1)
+        order = np.argsort(-cand_score, kind='stable')
+        order = order[~pd.DataFrame(cand[order]).duplicated().values][:keep]
+        states, hits, state_score = cand[order], cand_hits[order], cand_score[order]
+
+    if size == 0:
+        states, state_score = np.empty((0, 0), dtype=np.int64), np.zeros(0)
+    max_score = best[states].max(axis=1, initial=-np.inf) if states.size else np.full(len(states), -np.inf)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        boost = np.where(np.isfinite(max_score) & (max_score != 0), (state_score - max_score) / max_score, 0.0)
+
+    # 根据 Boost 降序排序
+    order = np.argsort(-boost, kind='stable')
+    return {'names': np.asarray(names), 'items': states[order], 'score': state_score[order], 'boost': boost[order]}
+
+
+def coverage_bitsets(m, threshold=0.0, chunk=4096) -> np.ndarray:
+    """各物品覆盖的靶点（得分大于 threshold）按位压缩为 uint8 数组，形状为 (物品数, ceil(靶点数 / 8))。"""
+    m = m.tocsr()
+    return np.vstack([np.packbits((m[start:start + chunk] > threshold).toarray(), axis=1)
+                      for start in range(0, m.shape[0], chunk)] or [np.zeros((0, ceil(m.shape[1] / 8)), np.uint8)])
+
+
+def _weight_table(wv: np.ndarray) -> np.ndarray:
+    """每个字节位置上 256 种取值对应的靶点权重之和，(字节数, 256)。"""
+    padded = np.zeros(ceil(len(wv) / 8) * 8)
+    padded[:len(wv)] = wv
+    bits = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1)
+    return padded.reshape(-1, 8) @ bits.T.astype(float)
+
+
+def _covered_weight(bits: np.ndarray, table: np.ndarray) -> float:
+    """一个物品或组合的位集覆盖的靶点权重之和。"""
+    return float(table[np.arange(len(bits)), bits].sum())
+
+
+def celf(bits: np.ndarray, table: np.ndarray, k: int, single: np.ndarray, start=None) -> Tuple[List[int], List[float]]:
+    """
+    以懒惰贪心（CELF）求最大加权覆盖：每步加入覆盖增量最大的物品，增量的上界为之前计算的增量（覆盖函数为次模函数）。
+
+    Args:
+        bits: coverage_bitsets 的结果。
+        table: _weight_table 的结果。
+        k: 最多选择的物品数。
+        single: 各物品单独的覆盖权重（初始上界）。
+        start: 必须首先选择的物品。默认为 None。
 
     Returns:
-        重要性评分的提升量。如果无法计算（没有匹配项），返回0。
+        依次选择的物品及选择后各步的覆盖权重。
+    """
+    covered = np.zeros(bits.shape[1], dtype=np.uint8)
+    chosen, curve = [], []
+    total = 0.0
+    if start is not None:
+        covered = bits[start].copy()
+        total = float(single[start])
+        chosen.append(int(start))
+        curve.append(total)
+    heap = [(-g, i, 0) for i, g in enumerate(single) if i != start and g > 0]
+    heapq.heapify(heap)
+    while len(chosen) < k and heap:
+        neg, i, step = heapq.heappop(heap)
+        if step == len(chosen):
+            covered |= bits[i]
+            total -= neg
+            chosen.append(i)
+            curve.append(total)
+            continue
+        # 上界已过期，重新计算增量
+        gain = _covered_weight(bits[i] & ~covered, table)
+        if gain > 0:
+            heapq.heappush(heap, (-gain, i, len(chosen)))
+    return chosen, curve
+
+
+def _celf_runs(bits, table, single, k, starts):
+    return [celf(bits, table, k, single, start) for start in starts]
+
+
+@metrics.timed
+def coverage_component(items_and_score: pd.DataFrame, scores: Union[ProteinScores, None] = None, num=100, c=10,
+                       capacities=None, weights: Union[dict, None] = None, threshold=0.0, workers=None
+                       ) -> pd.DataFrame:
     """
-    ls = row['items'].split(';')
-    scores = items_and_score.loc[items_and_score[by].isin(ls), 'Importance Score'].values
+    按靶点覆盖生成复方/中药的组合：每个物品覆盖得分大于 threshold 的靶点，组合的评分为其覆盖的靶点的权重占比，
+    靶点重复的物品不会提高评分。以覆盖面最大的 num 个物品分别作为起点，用 CELF 贪心补充覆盖增量最大的物品，
+    贪心序列的前缀即各容量下的组合，一次得到全部容量的结果。
 
-    # Handle empty case
-    if len(scores) == 0:
-        return 0.0
+    Args:
+        items_and_score: 包含复方/中药信息及重要性评分的 DataFrame。
+        scores: 每个靶点的得分（与 beam_component_arrays 相同）。默认为 None。
+        num: 起点（作为组合中第一个物品）的数量。
+        c: 背包容量。
+        capacities: 输出的组合大小。默认为 2..c。
+        weights: 各靶点的权重（与 score 相同）。默认为 None。
+        threshold: 视为覆盖靶点的最低得分。默认为 0。
+        workers: 进程数（0 为 CPU 核数，1 为不使用进程池）。默认为 None，即 1。
 
-    max_score = max(scores)
+    Returns:
+        与 component 相同的 DataFrame（Importance Score 为覆盖的权重占比）。物品集合相同的组合只保留一个。
+
+    Raises:
+        ValueError: 没有每个靶点的得分（scores 为 None，且 items_and_score 中没有 '{protein} HerbiV Score' 列，
+            如 score(per_protein='sparse') 的结果）。
+    """
+    by = 'DNFID' if 'DNFID' in items_and_score.columns else 'DNHID'
+    if scores is None and not any(col.endswith(SCORE_SUFFIX) for col in items_and_score.columns):
+        raise ValueError('coverage_component needs per-protein scores: pass scores=ProteinScores '
+                         '(see score_sparse) or score with per_protein=\'wide\'')
+    capacities = sorted(set(range(2, c + 1) if capacities is None else capacities))
+
+    codes, names = pd.factorize(items_and_score[by])
+    values = np.nan_to_num(items_and_score['Importance Score'].values.astype(float))
+    rows = pd.Series(values).groupby(codes).idxmax().reindex(range(len(names))).values
+    m, wv = _coverage_matrix(items_and_score, rows, np.asarray(names), by, scores, weights)
+
+    # 权重归一化，评分为覆盖的权重占比
+    wv = wv / wv.sum() if wv.sum() else wv
+    bits = coverage_bitsets(m, threshold)
+    table = _weight_table(wv)
+    single = (m > threshold).astype(float) @ wv
+    starts = np.argsort(-single, kind='stable')[:num]
+    k = max(capacities, default=0)
+
+    workers = min((workers if workers is not None else 1) or os.cpu_count() or 1, len(starts))
+    if workers <= 1 or len(starts) < 2 * workers:
+        runs = _celf_runs(bits, table, single, k, starts)
+    else:
+        chunks = np.array_split(starts, 4 * workers)
+        run = partial(_celf_runs, bits, table, single, k)
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            runs = [r for part in executor.map(run, chunks) for r in part]
+
+    combos, score = [], []
+    for chosen, curve in runs:
+        for size in capacities:
+            if size <= len(chosen):
+                combos.append(sorted(chosen[:size]))
+                score.append(curve[size - 1])
+    matrix = np.full((len(combos), k), -1, dtype=np.int64)
+    for row, combo in enumerate(combos):
+        matrix[row, :len(combo)] = combo
+    score = np.asarray(score, dtype=float)
+
+    # 物品集合相同的组合只保留第一个
+    keep = ~pd.DataFrame(matrix).duplicated().values
+    matrix, score = matrix[keep], score[keep]
+
+    # 相对组合中覆盖面最大的物品的提升量
+    padded = np.append(single, -np.inf)
+    max_score = padded[matrix].max(axis=1, initial=-np.inf)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        boost = np.where(np.isfinite(max_score) & (max_score != 0), (score - max_score) / max_score, 0.0)
+
+    order = np.argsort(-boost, kind='stable')
+    return component_frame({'names': np.asarray(names), 'items': matrix[order], 'score': score[order],
+                            'boost': boost[order]})
+
+
+@metrics.timed
+def component(items_and_score: pd.DataFrame, random_state=None, num=1000, c=10, method='knapsack',
+              scores: Union[ProteinScores, None] = None, weights: Union[dict, None] = None) -> pd.DataFrame:
+    """
+    生成复方/中药的组合，并计算其重要性评分。
 
-    # Avoid division by zero
-    if max_score == 0:
-        return 0.0
+    Args:
+        items_and_score: 包含复方/中药信息及重要性评分的 DataFrame。
+        random_state: 随机种子。
+        num: 需要生成的组合数。
+        c: 背包容量。
+        method: 组合的生成方式（COMPONENT_METHODS）。'knapsack' 在随机抽取的 10% 物品上求解背包问题；
+            'topk' 在同样的随机抽样上直接取评分最高的物品（见 component_arrays），不再逐个物品动态规划；
+            'beam' 见 beam_component_arrays，'coverage' 见 coverage_component（二者不使用 random_state）。
+            默认为 'knapsack'。
+        scores: method 为 'beam' 或 'coverage' 时每个靶点的得分（见 beam_component_arrays）。
+            items_and_score 中没有每个靶点的得分列（score(per_protein='sparse')）时必须给定。默认为 None。
+        weights: method 为 'beam' 或 'coverage' 时各靶点的权重。默认为 None。
 
-    return (row['Importance Score'] - max_score) / max_score
+    Returns:
+        包含组合及其重要性评分的 DataFrame。物品集合相同的组合只保留一个。
+    """
+    if method not in COMPONENT_METHODS:
+        raise ValueError(f"method must be one of {', '.join(COMPONENT_METHODS)}")
+    if method == 'coverage':
+        return coverage_component(items_and_score, scores, num, c, weights=weights)
+    if method == 'beam':
+        return component_frame(beam_component_arrays(items_and_score, scores, num, c, weights=weights))
+    return component_frame(component_arrays(items_and_score, random_state, num, c, method))
 
 
 def knapsack(weights: np.ndarray, n: int, forbidden_combinations: List[List[str]],
@@ -251,8 +731,15 @@ def knapsack(weights: np.ndarray, n: int, forbidden_combinations: List[List[str]
                 dp[i][j] = dp[i - 1][j]
                 items[i][j] = items[i - 1][j]
 
+    num_components = _component_size(dp[-1])
+
+    return dp[-1][num_components], items[-1][num_components]
+
+
+def _component_size(dp: np.ndarray) -> int:
+    """由各容量（0..c）下的最优值选择组合大小。"""
     # 计算累计 Score 比例
-    score_ratio = np.cumsum(dp[-1]) / np.sum(dp[-1])
+    score_ratio = np.cumsum(dp) / np.sum(dp)
 
     # 最大似然估计
     mle_estimates = (score_ratio - 1 / len(score_ratio)) / np.sqrt(2 / len(score_ratio))
@@ -260,5 +747,4 @@ def knapsack(weights: np.ndarray, n: int, forbidden_combinations: List[List[str]
     # 应选择的复方/中药数（即索引）但不能只选择一个
     num_components = np.argmin(mle_estimates) + 1
     num_components = 2 if num_components <= 1 else num_components
-
-    return dp[-1][num_components], items[-1][num_components]
+    return num_components
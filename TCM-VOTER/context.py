@@ -0,0 +1,74 @@
+"""
+单次分析的运行参数。
+
+RunContext 创建后不可修改，随调用链传递给研究现状测试的各个阶段，代替原先各阶段反复读写的 config.json。
+每次分析的输出写入各自的目录，同一进程或线程池中的多个分析互不干扰。
+
+config.json 仍可作为命令行的默认参数来源：RunContext.from_config() 读取，ctx.save() 写回。
+"""
+import dataclasses
+import json
+import os
+
+
+@dataclasses.dataclass(frozen=True)
+class RunContext:
+    """
+    研究现状测试的运行参数。
+
+    Args:
+        disease_name: 疾病名称，用作文献检索关键词与输出目录名。
+        target_max_number: 推荐靶点的最大数量（按文献数量排序）。
+        reported_number: 文献数量超过该值视为已报道。
+        interaction_num: PPI 扩展时，蛋白至少与输入列表中多少个蛋白相互作用。
+        results_dir: 结果目录，输出写入 results_dir/disease_name。
+        es_url: Elasticsearch 地址。
+        literature_engine: 文献检索方式，'es' 逐个靶点与药物查询，'scan' 检索一次疾病相关文献后本地扫描
+            （见 literature.py）。
+        chart_mode: 靶标树状图与柱状图的输出方式，'pages' 每个靶标一个页面，'single' 一个页面按需加载各靶标
+            （见 output.render_target_charts）。
+        render_workers: 并行绘制靶标页面的进程数，0 为 CPU 核数，1 为不使用进程池。
+    """
+    disease_name: str = 'cough'
+    target_max_number: int = 70
+    reported_number: int = 0
+    interaction_num: int = 0
+    results_dir: str = 'results'
+    es_url: str = 'http://localhost:9200/'
+    literature_engine: str = 'es'
+    chart_mode: str = 'pages'
+    render_workers: int = 0
+
+    @classmethod
+    def from_config(cls, config_path='config.json', **overrides):
+        """从 config.json 读取参数，overrides 中的参数优先。"""
+        with open(config_path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        fields = {f.name for f in dataclasses.fields(cls)}
+        return cls(**{**{k: v for k, v in config.items() if k in fields}, **overrides})
+
+    @property
+    def output_dir(self) -> str:
+        """本次分析的输出目录。"""
+        return os.path.join(self.results_dir, self.disease_name)
+
+    def path(self, *parts) -> str:
+        """返回输出目录下的路径，并确保其上级目录存在。"""
+        path = os.path.join(self.output_dir, *parts)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def replace(self, **changes):
+        """返回修改了部分参数的新 RunContext。"""
+        return dataclasses.replace(self, **changes)
+
+    def save(self, config_path='config.json'):
+        """将疾病名称与阈值写回 config.json（作为下次运行的默认参数），文件中的其他参数保持不变。"""
+        config = {}
+        if os.path.exists(config_path):
+            with open(config_path, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+        config.update({'disease_name': self.disease_name, 'reported_number': self.reported_number,
+                       'target_max_number': self.target_max_number, 'interaction_num': self.interaction_num})
+        with open(config_path, 'w', encoding='utf-8') as f:
+            json.dump(config, f, indent=4)
@@ -2,8 +2,117 @@ from collections import Counter
 import pandas as pd
 import os
 import json
+import threading
+import idmap
+import literature
+import metrics
 
+# 数据集所在目录，可通过环境变量 TCM_VOTER_DATA 指向其他数据（如基准测试生成的合成数据）
+DATA_DIR = os.environ.get('TCM_VOTER_DATA') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Data')
 
+# 是否在内存中缓存已读取的数据集与JSON文件（常驻服务中开启），可通过环境变量 TCM_VOTER_CACHE=1 开启
+CACHE = os.environ.get('TCM_VOTER_CACHE') == '1'
+_cache = {}
+_cache_lock = threading.Lock()
+
+# 预编译的靶点西药分类表，由 build_drug_class_table() 生成
+DRUG_CLASS_PATH = 'Data/Drug/Symbol_Drug_Class.csv'
+
+
+def enable_cache(enabled=True):
+    """开启或关闭数据缓存。关闭时清空已缓存的数据。"""
+    global CACHE
+    CACHE = enabled
+    if not enabled:
+        clear_cache()
+
+
+def clear_cache():
+    """清空已缓存的数据。"""
+    with _cache_lock:
+        _cache.clear()
+
+
+def _load(path, loader):
+    """读取文件；开启缓存时，文件未修改前只读取一次。缓存的对象由各调用方共享，不应原地修改。"""
+    if not CACHE:
+        return loader(path)
+    mtime = os.path.getmtime(path)
+    with _cache_lock:
+        hit = _cache.get(path)
+    if hit is not None and hit[0] == mtime:
+        return hit[1]
+    value = loader(path)
+    with _cache_lock:
+        _cache[path] = (mtime, value)
+    return value
+
+
+def _load_json(path):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def read_data(file_name) -> pd.DataFrame:
+    """
+        读取DATA_DIR中的数据集。
+        Read a dataset from DATA_DIR.
+
+        Args:
+            file_name (str): 数据集文件名。File name of the dataset.
+
+        Returns:
+            pandas.DataFrame: 数据集内容。Content of the dataset.
+    """
+
+    return _load(os.path.join(DATA_DIR, file_name), pd.read_excel)
+
+
+def read_table(path) -> pd.DataFrame:
+    """
+        读取Excel文件（相对于当前工作目录的路径）。
+        Read an Excel file (path relative to the current working directory).
+
+        Args:
+            path (str): Excel文件路径。Path of the Excel file.
+
+        Returns:
+            pandas.DataFrame: 文件内容。Content of the file.
+    """
+
+    return _load(os.path.abspath(path), pd.read_excel)
+
+
+def read_json(path):
+    """
+        读取JSON文件（相对于当前工作目录的路径）。
+        Read a JSON file (path relative to the current working directory).
+
+        Args:
+            path (str): JSON文件路径。Path of the JSON file.
+
+        Returns:
+            JSON文件内容。Content of the JSON file.
+    """
+
+    return _load(os.path.abspath(path), _load_json)
+
+
+def preload():
+    """将DATA_DIR中的全部数据集与PPI、药物等JSON文件读入缓存（需先开启缓存），并准备ID转换映射包。"""
+    for file_name in sorted(os.listdir(DATA_DIR)):
+        if file_name.endswith('.xlsx'):
+            read_data(file_name)
+    for path in ('Data/PPI/PPI.json', 'Data/Drug/Target_To_Drug.json'):
+        if os.path.exists(path):
+            read_json(path)
+    if os.path.exists('Data/Drug/Symbol_To_Target.json'):
+        get_drug_class_table()
+    # ID转换映射包：不存在或过期时在此编译，之后按需查询
+    idmap.open_bundle()
+
+
+@metrics.timed
 def get_formula(by, items) -> pd.DataFrame:
     """
         读取HerbiV_formula数据集，返回items中复方的信息。
@@ -17,13 +126,14 @@ def get_formula(by, items) -> pd.DataFrame:
             formula: items中复方的信息。Formula(s) information in items.
     """
 
-    formula_all = pd.read_excel(os.path.dirname(os.path.abspath(__file__)) + r'/Data/Formula.xlsx')
+    formula_all = read_data('Formula.xlsx')
     formula = formula_all.loc[formula_all[by].isin(items)].copy()
     formula.index = range(formula.shape[0])
 
     return formula
 
 
+@metrics.timed
 def get_formula_tcm_links(by, items) -> pd.DataFrame:
     """
         读取HerbiV_formula_tcm_links数据集，返回items中复方/中药的复方-中药连接信息。
@@ -40,8 +150,7 @@ def get_formula_tcm_links(by, items) -> pd.DataFrame:
     """
 
     # 读取HerbiV_formula_tcm_links数据集
-    formula_tcm_links_all = pd.read_excel(os.path.dirname(os.path.abspath(__file__)) +
-                                          r'/Data/Formula_TCM_Links.xlsx')
+    formula_tcm_links_all = read_data('Formula_TCM_Links.xlsx')
 
     # 在数据集中获取items中复方/中药的复方-中药连接信息
     formula_tcm_links = formula_tcm_links_all.loc[formula_tcm_links_all[by].isin(items)].copy()
@@ -52,6 +161,7 @@ def get_formula_tcm_links(by, items) -> pd.DataFrame:
     return formula_tcm_links
 
 
+@metrics.timed
 def get_tcm(by, items) -> pd.DataFrame:
     """
         读取HerbiV_tcm数据集，返回items中中药的信息。
@@ -66,7 +176,7 @@ def get_tcm(by, items) -> pd.DataFrame:
     """
 
     # 读取HerbiV_tcm数据集
-    tcm_all = pd.read_excel(os.path.dirname(os.path.abspath(__file__)) + r'/Data/TCM.xlsx')
+    tcm_all = read_data('TCM.xlsx')
 
     # 在数据集中获取items中中药的信息
     tcm = tcm_all.loc[tcm_all[by].isin(items)].copy()
@@ -77,6 +187,7 @@ def get_tcm(by, items) -> pd.DataFrame:
     return tcm
 
 
+@metrics.timed
 def get_tcm_chem_links(by, items) -> pd.DataFrame:
     """
         读取HerbiV_tcm_chemical_links数据集，返回items中中药/化合物的中药-成分（化合物）连接信息。
@@ -92,8 +203,7 @@ def get_tcm_chem_links(by, items) -> pd.DataFrame:
     """
 
     # 读取HerbiV_tcm_chemical_links数据集
-    current_directory = os.path.dirname(os.path.abspath(__file__))
-    tcm_chem_links_all = pd.read_excel(current_directory + r'/Data/TCM_Chemical_Links.xlsx')
+    tcm_chem_links_all = read_data('TCM_Chemical_Links.xlsx')
 
     # 在数据集中获取items中中药/化合物的中药-成分连接信息
     tcm_chem_links = tcm_chem_links_all.loc[tcm_chem_links_all[by].isin(items)].copy()
@@ -104,6 +214,7 @@ def get_tcm_chem_links(by, items) -> pd.DataFrame:
     return tcm_chem_links
 
 
+@metrics.timed
 def get_chemicals(by, items) -> pd.DataFrame:
     """
         读取HerbiV_chemicals数据集，返回items中化合物的信息。
@@ -118,8 +229,7 @@ def get_chemicals(by, items) -> pd.DataFrame:
     """
 
     # 读取HerbiV_chemical_protein_links数据集
-    current_directory = os.path.dirname(os.path.abspath(__file__))
-    chem_all = pd.read_excel(current_directory + r'/Data/Chemical.xlsx')
+    chem_all = read_data('Chemical.xlsx')
 
     # 在数据集中获取items中化合物的信息
     chem = chem_all.loc[chem_all[by].isin(items)].copy()
@@ -130,6 +240,7 @@ def get_chemicals(by, items) -> pd.DataFrame:
     return chem
 
 
+@metrics.timed
 def get_chem_protein_links(by, items, score=900) -> pd.DataFrame:
     """
         读取HerbiV_chemical_protein_links数据集，
@@ -150,8 +261,7 @@ def get_chem_protein_links(by, items, score=900) -> pd.DataFrame:
     """
 
     # 读取HerbiV_chemical_protein_links数据集
-    current_directory = os.path.dirname(os.path.abspath(__file__))
-    chem_protein_links_all = pd.read_excel(current_directory + r'/Data/Chemical_Protein_Links.xlsx')
+    chem_protein_links_all = read_data('Chemical_Protein_Links.xlsx')
 
     # 在数据集中获取items中化合物/蛋白的化合物-靶点（蛋白）连接的combined_score大于等于score的连接信息
     chem_protein_links = chem_protein_links_all.loc[
@@ -169,6 +279,7 @@ def get_chem_protein_links(by, items, score=900) -> pd.DataFrame:
     return chem_protein_links
 
 
+@metrics.timed
 def get_proteins(by, items) -> pd.DataFrame:
     """
         读取HerbiV_proteins数据集，返回items中蛋白的信息。
@@ -183,8 +294,7 @@ def get_proteins(by, items) -> pd.DataFrame:
     """
 
     # 读取HerbiV_proteins数据集
-    current_directory = os.path.dirname(os.path.abspath(__file__))
-    proteins_all = pd.read_excel(current_directory + r'/Data/Protein.xlsx')
+    proteins_all = read_data('Protein.xlsx')
 
     # 在数据集中获取items中蛋白的信息
     proteins = proteins_all.loc[proteins_all[by].isin(items)].drop_duplicates(subset=['Ensembl_ID'])
@@ -195,6 +305,7 @@ def get_proteins(by, items) -> pd.DataFrame:
     return proteins
 
 
+@metrics.timed
 def get_SD(by, items) -> pd.DataFrame:
     """
         读取HerbiV_proteins数据集，返回items中蛋白的信息。
@@ -209,14 +320,14 @@ def get_SD(by, items) -> pd.DataFrame:
     """
 
     # 读取HerbiV_proteins数据集
-    current_directory = os.path.dirname(os.path.abspath(__file__))
-    proteins_all = pd.read_excel(current_directory + r'/Data/SD.xlsx')
+    proteins_all = read_data('SD.xlsx')
     proteins = proteins_all.loc[proteins_all[by].isin(items)].copy()
     proteins.index = range(proteins.shape[0])
 
     return proteins
 
 
+@metrics.timed
 def get_SD_Formula_links(by, items) -> pd.DataFrame:
     """
         读取HerbiV_formula_tcm_links数据集，返回items中复方/中药的复方-中药连接信息。
@@ -232,13 +343,87 @@ def get_SD_Formula_links(by, items) -> pd.DataFrame:
             Formula(s)-TCM connection information of formula(s)/TCM in items.
     """
 
-    formula_tcm_links_all = pd.read_excel(os.path.dirname(os.path.abspath(__file__)) + r'/Data/SD_Formula_Links.xlsx')
+    formula_tcm_links_all = read_data('SD_Formula_Links.xlsx')
     formula_tcm_links = formula_tcm_links_all.loc[formula_tcm_links_all[by].isin(items)].copy()
     formula_tcm_links.index = range(formula_tcm_links.shape[0])
 
     return formula_tcm_links
 
 
+def _is_clinical(status):
+    return status.startswith('Phase') or status.startswith('Clinical')
+
+
+def build_drug_class_table(symbol_to_target_path='Data/Drug/Symbol_To_Target.json',
+                           target_to_drug_path='Data/Drug/Target_To_Drug.json',
+                           out_path=DRUG_CLASS_PATH) -> pd.DataFrame:
+    """
+        由 Symbol_To_Target.json 与 Target_To_Drug.json 编译靶点西药分类表，每个symbol一行。
+        Compile the drug-class table (one row per symbol) from Symbol_To_Target.json and Target_To_Drug.json.
+
+        分类规则与 output.drug_classify 一致：靶点处于 Successful target 阶段且有已批准药物为 approved，
+        处于 Clinical Trial target 阶段且有临床试验药物为 clinical，其余有药物的靶点为 other。
+
+        Args:
+            symbol_to_target_path (str): Symbol_To_Target.json 路径。Path of Symbol_To_Target.json.
+            target_to_drug_path (str): Target_To_Drug.json 路径。Path of Target_To_Drug.json.
+            out_path (str): 分类表输出路径，为 None 时不写出。Output path (CSV), None to skip writing.
+
+        Returns:
+            pandas.DataFrame: 以symbol为索引，包含 target_id、target_phase、n_approved、n_clinical、
+            has_drug、approved、clinical、other 列。
+    """
+
+    with open(symbol_to_target_path, 'r') as f:
+        Symbol_To_Target = json.load(f)
+    with open(target_to_drug_path, 'r') as f:
+        Target_To_Drug = json.load(f)
+
+    rows = []
+    for symbol, target in Symbol_To_Target.items():
+        target_id, target_phase = next(iter(target.items()))
+        statuses = [status for drug in Target_To_Drug.get(target_id, []) for status in drug.values()]
+        rows.append((symbol, target_id, target_phase,
+                     sum(status == 'Approved' for status in statuses), sum(map(_is_clinical, statuses))))
+
+    table = pd.DataFrame(rows, columns=['symbol', 'target_id', 'target_phase', 'n_approved', 'n_clinical'])
+    table['has_drug'] = True
+    table['approved'] = (table['target_phase'] == 'Successful target') & (table['n_approved'] > 0)
+    table['clinical'] = ~table['approved'] & (table['target_phase'] == 'Clinical Trial target') & (
+            table['n_clinical'] > 0)
+    table['other'] = ~table['approved'] & ~table['clinical']
+    table = table.set_index('symbol')
+
+    if out_path is not None:
+        # 先写临时文件再替换，并发读取时不会读到写了一半的表
+        tmp = f'{out_path}.tmp-{os.getpid()}-{threading.get_ident()}'
+        table.to_csv(tmp)
+        os.replace(tmp, out_path)
+    return table
+
+
+def _read_drug_class(path):
+    return pd.read_csv(path, index_col='symbol')
+
+
+def get_drug_class_table() -> pd.DataFrame:
+    """
+        读取预编译的靶点西药分类表；分类表不存在或早于源JSON文件时重新编译。
+        分类表是生成文件（不纳入版本库），首次使用时在本地编译。
+        Read the precompiled drug-class table, rebuilding it if missing or older than its source JSON files.
+        The table is a generated file (not tracked in git) and is built locally on first use.
+
+        Returns:
+            pandas.DataFrame: 见 build_drug_class_table。See build_drug_class_table.
+    """
+
+    sources = ('Data/Drug/Symbol_To_Target.json', 'Data/Drug/Target_To_Drug.json')
+    if not os.path.exists(DRUG_CLASS_PATH) or (
+            os.path.getmtime(DRUG_CLASS_PATH) < max(os.path.getmtime(p) for p in sources)):
+        build_drug_class_table(*sources)
+    return _load(os.path.abspath(DRUG_CLASS_PATH), _read_drug_class)
+
+
 def get_targetNum_dict(symbol_list, interaction_num, PPI_DICT):
     ALL_PPI_PROTEIN = [
         p for symbol in symbol_list
@@ -249,9 +434,13 @@ def get_targetNum_dict(symbol_list, interaction_num, PPI_DICT):
     return {k: v for k, v in PPI_NUMBER.items() if v >= interaction_num}
 
 
-def get_data(protein_list_path, interaction_num):
-    file_name = protein_list_path
-    Symbol_list = get_Symbol(file_name)
+@metrics.timed
+def get_data(protein_list, interaction_num):
+    # protein_list 可以是蛋白质列表文件路径，也可以是内存中（已规范化）的基因符号列表
+    if isinstance(protein_list, str):
+        Symbol_list = normalize_symbols(get_Symbol(protein_list)['gene_name'])
+    else:
+        Symbol_list = list(protein_list)
 
     print('The number of proteins in the file is: ', len(Symbol_list))
 
@@ -263,11 +452,11 @@ def get_data(protein_list_path, interaction_num):
     print('The number of PPI proteins list is: ', len(Symbol_PPI_list))
     print('Please wait for a while, the program is running...')
 
-    with open('Data/Drug/Symbol_To_Target.json', 'r') as f:
-        Symbol_To_Target_wm = json.load(f)
+    # 映射包中的只读字典视图，按需查询
+    bundle = idmap.open_bundle()
+    Symbol_To_Target_wm = bundle.mapping('target')
 
-    with open('Data/ID_Transformed/Symbol_To_Fullname.json', 'r') as f:
-        Symbol_To_Fullname = json.load(f)
+    Symbol_To_Fullname = bundle.mapping('fullname')
 
     return Symbol_PPI_list, Symbol_To_Target_wm, Symbol_To_Fullname, Symbol_list
 
@@ -282,6 +471,24 @@ def get_txt():
             return file_name
 
 
+def normalize_symbols(gene_names) -> list:
+    """
+        规范化基因符号：拆分以空格或斜杠分隔的多个基因名，去除空值与重复项（保持首次出现的顺序）。
+        Normalize gene symbols: split names separated by whitespace or slashes, drop empty values and duplicates.
+
+        Args:
+            gene_names (collections.abc.Iterable): 基因名，如 protein_df['gene_name']。Gene names.
+
+        Returns:
+            list: 基因符号列表。List of gene symbols.
+    """
+
+    symbols = pd.Series(list(gene_names), dtype=object).dropna().astype(str)
+    symbols = symbols.str.split(r"[\s/]+").explode()
+    symbols = symbols[symbols.notna() & (symbols != '')]
+    return symbols.drop_duplicates().tolist()
+
+
 #
 def get_Symbol(file_name):
     """
@@ -294,72 +501,124 @@ def get_Symbol(file_name):
     return Symbol
 
 
+def _drug_disease_query(drug_name, disease):
+    # 摘要中同时出现药物名（任一词）与疾病关键词
+    return {
+        'query': {
+            'bool': {
+                'must': [
+                    {
+                        "match": {
+                            "abstract": drug_name
+                        }
+                    },
+                    {
+                        "match_phrase": {
+                            "abstract": disease
+                        }
+                    },
+                ]
+            }
+        }
+    }
+
+
+def _drug_query(drug_name):
+    # 摘要中出现药物名（任一词）
+    return {
+        'query': {
+            "match": {
+                "abstract": drug_name
+            }
+        }
+    }
+
+
+def _drug_report_number(drug_name, disease, es, lit=None, evidence=None):
+    # 摘要中同时出现药物名（任一词）与疾病关键词的文献数
+    if evidence is not None:
+        return int(evidence.at[drug_name, 'disease_count'])
+    if lit is not None:
+        return lit.drug_count(drug_name)
+    res = es.search(index='abstract22', body=_drug_disease_query(drug_name, disease), scroll='5m')
+    reported_number = res['hits']['total']['value']
+    es.clear_scroll(scroll_id=res['_scroll_id'])
+    return reported_number
+
+
+def msearch_counts(es, bodies, batch_size=100) -> list:
+    """分批以 msearch 发送计数查询（abstract22），返回各查询的命中数（与逐个 search 相同，不截断）。"""
+    counts = []
+    for start in range(0, len(bodies), batch_size):
+        searches = []
+        for body in bodies[start:start + batch_size]:
+            searches += [{}, {**body, 'size': 0, 'track_total_hits': True}]
+        for res in es.msearch(index='abstract22', searches=searches)['responses']:
+            if 'error' in res:
+                raise RuntimeError(f"msearch failed: {res['error']}")
+            counts.append(res['hits']['total']['value'])
+    return counts
+
+
+@metrics.timed
+def get_drug_evidence(drug_names, disease, es, lit=None, batch_size=100) -> pd.DataFrame:
+    """
+        统计每个药物在摘要中与疾病共同出现的文献数和出现的文献总数，每个药物只统计一次。
+        Count, once per drug, the abstracts mentioning the drug together with the disease and in total.
+
+        Args:
+            drug_names (collections.abc.Iterable): 药物名（可重复）。Drug names (may repeat).
+            disease (str | list): 疾病名称；为列表时各疾病的查询合并发送。
+            Disease name, or a list of diseases whose queries are batched together.
+            es: Elasticsearch 客户端。Elasticsearch client.
+            lit (literature.DiseaseLiterature): 给定时在本地统计与疾病共同出现的文献数（仅单个疾病）。
+            Local disease literature used for the co-mention counts, if given (single disease only).
+            batch_size (int): 每次 msearch 的查询数。Queries per msearch request.
+
+        Returns:
+            pandas.DataFrame: 以处理后的药物名为索引，列 disease_count、total_count；
+            disease 为列表时每种疾病一列（列名为疾病名称）与 total_count。
+            Indexed by the normalized drug name, with columns disease_count and total_count,
+            or one column per disease and total_count when disease is a list.
+    """
+
+    diseases = [disease] if isinstance(disease, str) else list(disease)
+    names = list(dict.fromkeys(literature.normalize_drug_name(d) for d in drug_names))
+    bodies = [_drug_query(name) for name in names]
+    if lit is None:
+        bodies += [_drug_disease_query(name, d) for d in diseases for name in names]
+    counts = msearch_counts(es, bodies, batch_size)
+
+    columns = {}
+    for k, d in enumerate(diseases, 1):
+        columns[d] = [lit.drug_count(name) for name in names] if lit is not None \
+            else counts[k * len(names):(k + 1) * len(names)]
+    columns['total_count'] = counts[:len(names)]
+    evidence = pd.DataFrame(columns, index=pd.Index(names, name='drug'), dtype='int64')
+    if isinstance(disease, str):
+        evidence = evidence.rename(columns={disease: 'disease_count'})
+    return evidence
+
+
 # 'hepatocellular carcinoma'
 # 查询药物关于疾病的报道信息
-def get_drug_report_info(drug_ap, drug_cl, disease, input_num, es):
+@metrics.timed
+def get_drug_report_info(drug_ap, drug_cl, disease, input_num, es, lit=None, evidence=None):
+    # lit: literature.DiseaseLiterature，给定时在已检索的疾病文献中本地计数，不再逐个药物查询
+    # evidence: get_drug_evidence() 的结果，给定时直接查表
     drug_ap_not_report, drug_ap_report, drug_cl_not_report, drug_cl_report = [], [], [], []
     for drug_name in drug_ap:
         # 这个名字需要进行处理
         # 会出现特殊字符无法处理的情况[Avastin+/-Tarceva]
-        drug_name = drug_name.replace(
-            '+/-', ' ').replace(
-            '/', ' ').replace(
-            '[', '').replace(
-            ']', '').replace(
-            '-', ' ')
-        query = {
-            'query': {
-                'bool': {
-                    'must': [
-                        {
-                            "match": {
-                                "abstract": drug_name
-                            }
-                        },
-                        {
-                            "match_phrase": {
-                                "abstract": disease
-                            }
-                        },
-                    ]
-                }
-            }
-        }
-        res = es.search(index='abstract22', body=query, scroll='5m')
-        reported_number = res['hits']['total']['value']
-        es.clear_scroll(scroll_id=res['_scroll_id'])
+        drug_name = literature.normalize_drug_name(drug_name)
+        reported_number = _drug_report_number(drug_name, disease, es, lit, evidence)
         if reported_number > input_num:
             drug_ap_report.append(drug_name)
         else:
             drug_ap_not_report.append(drug_name)
     for drug_name in drug_cl:
-        drug_name = drug_name.replace(
-            '+/-', ' ').replace(
-            '/', ' ').replace(
-            '[', '').replace(
-            ']', '').replace(
-            '-', ' ')
-        query = {
-            'query': {
-                'bool': {
-                    'must': [
-                        {
-                            "match": {
-                                "abstract": drug_name
-                            }
-                        },
-                        {
-                            "match_phrase": {
-                                "abstract": disease
-                            }
-                        },
-                    ]
-                }
-            }
-        }
-        res = es.search(index='abstract22', body=query, scroll='5m')
-        reported_number = res['hits']['total']['value']
-        es.clear_scroll(scroll_id=res['_scroll_id'])
+        drug_name = literature.normalize_drug_name(drug_name)
+        reported_number = _drug_report_number(drug_name, disease, es, lit, evidence)
         if reported_number > input_num:
             drug_cl_report.append(drug_name)
         else:
@@ -368,62 +627,38 @@ def get_drug_report_info(drug_ap, drug_cl, disease, input_num, es):
 
 
 # 从药物列表获取药物的频率
-def get_drug_frequency(drug_not_report, drug_report, es):
+@metrics.timed
+def get_drug_frequency(drug_not_report, drug_report, es, evidence=None):
+    # evidence: get_drug_evidence() 的结果，给定时直接查表
     drug_frequency = []
-    if drug_not_report:
-        for drug in drug_not_report:
-            # 这个名字需要进行处理
-            # 会出现特殊字符无法处理的情况[Avastin+/-Tarceva]
-            drug_name = drug.replace(
-                '+/-', ' ').replace(
-                '/', ' ').replace(
-                '[', '').replace(
-                ']', '').replace(
-                '-', ' ')
-            query = {
-                'query': {
-                    "match": {
-                        "abstract": drug_name
-                    }
-                }
-            }
-            res = es.search(index='abstract22', body=query, scroll='5m')
-            reported_number = res['hits']['total']['value']
-            drug_frequency.append(reported_number)
-            es.clear_scroll(scroll_id=res['_scroll_id'])
-    else:
-        for drug in drug_report:
-            drug_name = drug.replace(
-                '+/-', ' ').replace(
-                '/', ' ').replace(
-                '[', '').replace(
-                ']', '').replace(
-                '-', ' ')
-            query = {
-                'query': {
-                    "match": {
-                        "abstract": drug_name
-                    }
-                }
-            }
-            res = es.search(index='abstract22', body=query, scroll='5m')
-            reported_number = res['hits']['total']['value']
-            drug_frequency.append(reported_number)
-            es.clear_scroll(scroll_id=res['_scroll_id'])
+    # 未报道的药物优先
+    for drug in drug_not_report or drug_report:
+        # 这个名字需要进行处理
+        # 会出现特殊字符无法处理的情况[Avastin+/-Tarceva]
+        drug_name = literature.normalize_drug_name(drug)
+        if evidence is not None:
+            drug_frequency.append(int(evidence.at[drug_name, 'total_count']))
+            continue
+        res = es.search(index='abstract22', body=_drug_query(drug_name), scroll='5m')
+        reported_number = res['hits']['total']['value']
+        drug_frequency.append(reported_number)
+        es.clear_scroll(scroll_id=res['_scroll_id'])
     return drug_frequency
 
 
+@metrics.timed
 def get_PPI_Symbol_List(symbol_list, interaction_num):
     """
     获取PPI列表
     """
-    with open('Data/PPI/PPI.json', 'r') as f:
-        PPI_DICT = json.load(f)
+    PPI_DICT = read_json('Data/PPI/PPI.json')
 
-    symbol_list = symbol_list['gene_name'].tolist()
+    if isinstance(symbol_list, pd.DataFrame):
+        symbol_list = symbol_list['gene_name'].tolist()
 
     TARGET_PPI = get_targetNum_dict(symbol_list, interaction_num, PPI_DICT)
-    TARGET_PPI_LIST = [i for i in TARGET_PPI.keys() if i not in symbol_list]
+    symbol_set = set(symbol_list)
+    TARGET_PPI_LIST = [i for i in TARGET_PPI.keys() if i not in symbol_set]
 
     return TARGET_PPI_LIST
 
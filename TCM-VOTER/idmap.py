@@ -0,0 +1,268 @@
+"""
+基因符号 ID 映射包。
+
+将 Data/ID_Transformed 与 Data/Drug 中的 Symbol_To_* JSON 字典编译为一个 SQLite 文件：
+基因符号统一编号（symbols 表），各映射表以编号为主键；PubMed ID 以排序后的 int32 数组存储。
+运行时按需查询，不再在启动时解析数 MB 的 JSON。
+
+    bundle = idmap.open_bundle()
+    bundle.get('fullname', 'TP53')                    # 单个查询
+    bundle.lookup('uniprot', ['TP53', 'EGFR'])        # 批量查询，返回 pd.Series
+    bundle.pubmed_ids('TP53')                         # np.ndarray(int32)
+    bundle.mapping('target')                          # 与原 JSON 字典接口兼容的只读映射
+
+源文件更新或格式版本变化时自动重新编译；也可以手动编译: python idmap.py
+"""
+import json
+import os
+import sqlite3
+import threading
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+# 编译格式版本，修改表结构时递增
+SCHEMA_VERSION = 1
+
+BUNDLE_PATH = 'Data/ID_Transformed/id_bundle.sqlite'
+
+# 映射表 -> 源文件
+SOURCES = {
+    'uniprot': 'Data/ID_Transformed/Symbol_To_UniprotID.json',
+    'fullname': 'Data/ID_Transformed/Symbol_To_Fullname.json',
+    'gene_id': 'Data/ID_Transformed/Symbol_To_GeneID.json',
+    'pubmed': 'Data/ID_Transformed/Symbol_To_PubMedID.json',
+    'target': 'Data/Drug/Symbol_To_Target.json',
+}
+
+# 映射表 -> 查询的值列
+_COLUMNS = {'uniprot': 'uniprot_id', 'fullname': 'fullname', 'gene_id': 'gene_id', 'pubmed': 'pmids',
+            'target': 'target_id, t.phase'}
+
+# SQLite 单条语句的参数个数有上限，批量查询按块进行
+_CHUNK = 500
+
+_bundles = {}
+_bundles_lock = threading.Lock()
+
+
+def _find(path):
+    """查找源文件，文件名大小写不一致时（如 Symbol_to_Fullname.json）也能找到。"""
+    if os.path.exists(path):
+        return path
+    directory, name = os.path.split(path)
+    if os.path.isdir(directory):
+        for f in os.listdir(directory):
+            if f.lower() == name.lower():
+                return os.path.join(directory, f)
+    return None
+
+
+def _signature() -> str:
+    """源文件的大小与修改时间，用于判断映射包是否过期。"""
+    sig = {'schema': SCHEMA_VERSION}
+    for table, path in SOURCES.items():
+        found = _find(path)
+        sig[table] = None if found is None else [os.path.getsize(found), int(os.path.getmtime(found))]
+    return json.dumps(sig, sort_keys=True)
+
+
+def build_bundle(out_path=BUNDLE_PATH) -> str:
+    """
+    由 Symbol_To_* JSON 文件编译映射包（先写入临时文件再替换，不影响正在读取的进程）。
+
+    Args:
+        out_path: 映射包路径。
+
+    Returns:
+        映射包路径。
+    """
+    data = {}
+    for table, path in SOURCES.items():
+        found = _find(path)
+        if found is not None:
+            with open(found, 'r', encoding='utf-8') as f:
+                data[table] = json.load(f)
+    symbols = sorted(set().union(*(d.keys() for d in data.values())))
+    symbol_id = {s: i for i, s in enumerate(symbols)}
+
+    tmp = f'{out_path}.{os.getpid()}.tmp'
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    con = sqlite3.connect(tmp)
+    try:
+        con.executescript('''
+            CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE symbols (id INTEGER PRIMARY KEY, symbol TEXT UNIQUE NOT NULL);
+            CREATE TABLE uniprot (symbol_id INTEGER PRIMARY KEY, uniprot_id TEXT);
+            CREATE TABLE fullname (symbol_id INTEGER PRIMARY KEY, fullname TEXT);
+            CREATE TABLE gene_id (symbol_id INTEGER PRIMARY KEY, gene_id INTEGER);
+            CREATE TABLE pubmed (symbol_id INTEGER PRIMARY KEY, n INTEGER, pmids BLOB);
+            CREATE TABLE target (symbol_id INTEGER PRIMARY KEY, target_id TEXT, phase TEXT);
+        ''')
+        con.executemany('INSERT INTO symbols VALUES (?, ?)', [(i, s) for s, i in symbol_id.items()])
+        for table in ('uniprot', 'fullname', 'gene_id'):
+            con.executemany(f'INSERT INTO {table} VALUES (?, ?)',
+                            [(symbol_id[s], v) for s, v in data.get(table, {}).items()])
+        pubmed = {s: np.unique(np.asarray(v, dtype=np.int64)) for s, v in data.get('pubmed', {}).items()}
+        if any(len(v) and v[-1] > np.iinfo(np.int32).max for v in pubmed.values()):
+            raise ValueError('PubMed ID 超出 int32 范围，需提高 SCHEMA_VERSION 并改用 int64 存储')
+        con.executemany('INSERT INTO pubmed VALUES (?, ?, ?)',
+                        [(symbol_id[s], len(v), v.astype(np.int32).tobytes()) for s, v in pubmed.items()])
+        con.executemany('INSERT INTO target VALUES (?, ?, ?)',
+                        [(symbol_id[s], *next(iter(v.items()))) for s, v in data.get('target', {}).items()])
+        con.executemany('INSERT INTO meta VALUES (?, ?)', [('signature', _signature()),
+                                                            ('schema', str(SCHEMA_VERSION))])
+        con.commit()
+    finally:
+        con.close()
+    os.replace(tmp, out_path)
+    return out_path
+
+
+def _decode(table, row):
+    if table == 'pubmed':
+        return np.frombuffer(row[1], dtype=np.int32)
+    if table == 'target':
+        return {row[1]: row[2]}
+    return row[1]
+
+
+class Bundle:
+    """只读的映射包。每个线程使用各自的 SQLite 连接。"""
+
+    def __init__(self, path=BUNDLE_PATH):
+        self.path = os.path.abspath(path)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        # close() 后递增，各线程在下次查询时重新连接
+        self._generation = 0
+
+    @property
+    def _con(self):
+        con = getattr(self._local, 'con', None)
+        if con is None or self._local.generation != self._generation:
+            con = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True, check_same_thread=False)
+            with self._lock:
+                self._connections.append(con)
+                self._local.con, self._local.generation = con, self._generation
+        return con
+
+    def close(self):
+        """关闭各线程的连接（之后的查询会重新连接）。"""
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._generation += 1
+        for con in connections:
+            con.close()
+
+    def _select(self, table):
+        return (f'SELECT s.symbol, t.{_COLUMNS[table]} FROM {table} t '
+                f'JOIN symbols s ON s.id = t.symbol_id')
+
+    def get(self, table, symbol, default=None):
+        """查询单个基因符号，不存在时返回 default。"""
+        row = self._con.execute(self._select(table) + ' WHERE s.symbol = ?', (symbol,)).fetchone()
+        return default if row is None else _decode(table, row)
+
+    def contains(self, table, symbol) -> bool:
+        return self._con.execute(f'SELECT 1 FROM {table} t JOIN symbols s ON s.id = t.symbol_id '
+                                 f'WHERE s.symbol = ?', (symbol,)).fetchone() is not None
+
+    def lookup(self, table, symbols) -> pd.Series:
+        """批量查询，返回以基因符号为索引的 Series（只包含存在的符号）。"""
+        symbols = list(dict.fromkeys(symbols))
+        keys, values = [], []
+        for start in range(0, len(symbols), _CHUNK):
+            chunk = symbols[start:start + _CHUNK]
+            sql = self._select(table) + f" WHERE s.symbol IN ({','.join('?' * len(chunk))})"
+            for row in self._con.execute(sql, chunk):
+                keys.append(row[0])
+                values.append(_decode(table, row))
+        return pd.Series(values, index=pd.Index(keys, name='symbol'), dtype=object, name=table)
+
+    def pubmed_ids(self, symbol) -> np.ndarray:
+        """返回基因符号对应的 PubMed ID（排序后的 int32 数组），不存在时为空数组。"""
+        return self.get('pubmed', symbol, np.empty(0, dtype=np.int32))
+
+    def keys(self, table) -> list:
+        return [row[0] for row in self._con.execute(
+            f'SELECT s.symbol FROM {table} t JOIN symbols s ON s.id = t.symbol_id')]
+
+    def count(self, table) -> int:
+        return self._con.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+    def mapping(self, table) -> 'MappingView':
+        return MappingView(self, table)
+
+
+class MappingView(Mapping):
+    """映射包中一个表的只读字典视图，按需查询，可替代原先 json.load 得到的字典。"""
+
+    def __init__(self, bundle, table):
+        self.bundle = bundle
+        self.table = table
+
+    def __getitem__(self, symbol):
+        value = self.bundle.get(self.table, symbol)
+        if value is None:
+            raise KeyError(symbol)
+        return value
+
+    def __contains__(self, symbol):
+        return self.bundle.contains(self.table, symbol)
+
+    def __iter__(self):
+        return iter(self.bundle.keys(self.table))
+
+    def __len__(self):
+        return self.bundle.count(self.table)
+
+
+def _stored_signature(path):
+    """映射包中记录的源文件签名，映射包不存在或无法读取时返回 None。"""
+    if not os.path.exists(path):
+        return None
+    try:
+        con = sqlite3.connect(f'file:{os.path.abspath(path)}?mode=ro', uri=True)
+        try:
+            row = con.execute("SELECT value FROM meta WHERE key = 'signature'").fetchone()
+        finally:
+            con.close()
+    except sqlite3.DatabaseError:
+        return None
+    return None if row is None else row[0]
+
+
+def _mtime(path):
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+
+def open_bundle(path=BUNDLE_PATH) -> Bundle:
+    """
+    打开映射包（同一路径在进程内只打开一次），不存在或已过期时先编译。
+
+    已打开的映射包记录打开时的源文件签名与映射包的修改时间，二者均未变化时直接返回，
+    不再读取 SQLite；映射包被替换时关闭原有的连接。
+    """
+    key = os.path.abspath(path)
+    signature = _signature()
+    with _bundles_lock:
+        hit = _bundles.get(key)
+        if hit is not None and hit[0] == signature and hit[1] == _mtime(path):
+            return hit[2]
+        if _stored_signature(path) != signature:
+            build_bundle(path)
+        if hit is not None:
+            hit[2].close()
+        bundle = Bundle(path)
+        _bundles[key] = (signature, _mtime(path), bundle)
+    return bundle
+
+
+if __name__ == '__main__':
+    out = build_bundle()
+    b = Bundle(out)
+    print(out, {table: b.count(table) for table in SOURCES})
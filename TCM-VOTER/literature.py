@@ -0,0 +1,175 @@
+"""
+以疾病为先的文献扫描，研究现状测试的另一种检索方式。
+
+默认方式（'es'）为每个基因符号、基因全名与药物名分别向 abstract22 发送查询。
+'scan' 方式只检索一次摘要中出现疾病关键词的文献（point-in-time + search_after 分页），
+再用多模式匹配在本地一次扫描全部候选基因符号、基因全名与药物名，得到 report_info 与
+get_drug_report_info 所需的全部共现计数。疾病相关文献数量不大时，数千次查询变为一次扫描。
+
+分词按 Elasticsearch standard 分析器近似处理（转为小写，按非字母数字字符切分）：
+match_phrase 对应连续的词序列，match 对应任一词出现。
+安装了 pyahocorasick 时使用 Aho–Corasick 自动机匹配短语，否则使用按首词索引的匹配。
+
+    lit = literature.DiseaseLiterature.fetch(es, 'cough')
+    lit.scan(phrases=symbols + fullnames, terms=drug_names)
+    lit.target_count(symbol, pubmed_ids, fullname)
+    lit.drug_count(drug_name)
+"""
+import re
+from collections import defaultdict
+
+import numpy as np
+
+import metrics
+
+try:
+    import ahocorasick
+except ImportError:  # 未安装 pyahocorasick 时使用按首词索引的匹配
+    ahocorasick = None
+
+# 研究现状测试的文献检索方式
+ENGINES = ('es', 'scan')
+
+_TOKEN = re.compile(r'\w+')
+
+
+def tokenize(text) -> list:
+    """将文本切分为小写的词（近似 Elasticsearch standard 分析器）。"""
+    return _TOKEN.findall(str(text).lower())
+
+
+def normalize_drug_name(drug_name) -> str:
+    """处理药物名中无法直接检索的特殊字符，如 [Avastin+/-Tarceva]。"""
+    return drug_name.replace(
+        '+/-', ' ').replace(
+        '/', ' ').replace(
+        '[', '').replace(
+        ']', '').replace(
+        '-', ' ')
+
+
+def _phrase_matcher(patterns):
+    """返回函数：输入一篇文献的词序列，返回其中出现的短语（词元组）的下标集合。"""
+    if ahocorasick is not None:
+        automaton = ahocorasick.Automaton()
+        for i, pattern in enumerate(patterns):
+            automaton.add_word(f" {' '.join(pattern)} ", i)
+        automaton.make_automaton()
+        return lambda tokens: {i for _, i in automaton.iter(f" {' '.join(tokens)} ")}
+
+    by_first = defaultdict(list)
+    for i, pattern in enumerate(patterns):
+        by_first[pattern[0]].append((i, pattern))
+
+    def match(tokens):
+        found = set()
+        for pos, token in enumerate(tokens):
+            for i, pattern in by_first.get(token, ()):
+                if len(pattern) == 1 or tuple(tokens[pos:pos + len(pattern)]) == pattern:
+                    found.add(i)
+        return found
+
+    return match
+
+
+class DiseaseLiterature:
+    """
+    摘要中出现疾病关键词的文献，以及在其中扫描得到的短语与词的命中文献。
+
+    Args:
+        disease: 疾病名称。
+        pmids: 各文献的 PubMed ID。
+        abstracts: 各文献的摘要。
+    """
+
+    def __init__(self, disease, pmids, abstracts):
+        self.disease = disease
+        self.pmids = np.asarray(pmids, dtype=np.int64)
+        self.abstracts = list(abstracts)
+        self._phrase_docs = {}  # 词元组 -> 命中文献下标
+        self._term_docs = {}  # 词 -> 命中文献下标
+
+    def __len__(self):
+        return len(self.pmids)
+
+    @classmethod
+    @metrics.timed
+    def fetch(cls, es, disease, page_size=1000, keep_alive='5m'):
+        """使用 point-in-time 与 search_after 分页检索摘要中出现疾病关键词的全部文献。"""
+        pit_id = es.open_point_in_time(index='abstract22', keep_alive=keep_alive)['id']
+        body = {
+            'query': {'match_phrase': {'abstract': disease}},
+            '_source': ['pubMedId', 'abstract'],
+            'size': page_size,
+            'sort': [{'_shard_doc': 'asc'}],
+            'track_total_hits': False,
+        }
+        pmids, abstracts = [], []
+        try:
+            while True:
+                res = es.search(body={**body, 'pit': {'id': pit_id, 'keep_alive': keep_alive}})
+                pit_id = res.get('pit_id', pit_id)
+                hits = res['hits']['hits']
+                for hit in hits:
+                    pmids.append(hit['_source']['pubMedId'])
+                    abstracts.append(hit['_source'].get('abstract', ''))
+                if len(hits) < page_size:
+                    break
+                body['search_after'] = hits[-1]['sort']
+        finally:
+            es.close_point_in_time(id=pit_id)
+        return cls(disease, pmids, abstracts)
+
+    @metrics.timed
+    def scan(self, phrases=(), terms=()):
+        """
+        一次扫描全部文献，统计各短语（match_phrase）与药物名中各词（match）的命中文献。
+        已扫描过的短语与词不会重复扫描。
+        """
+        patterns = list({p for p in (tuple(tokenize(s)) for s in phrases) if p and p not in self._phrase_docs})
+        words = {w for s in terms for w in tokenize(normalize_drug_name(s)) if w not in self._term_docs}
+        if not patterns and not words:
+            return self
+
+        match = _phrase_matcher(patterns)
+        phrase_hits = [[] for _ in patterns]
+        term_hits = defaultdict(list)
+        for d, abstract in enumerate(self.abstracts):
+            tokens = tokenize(abstract)
+            for i in match(tokens):
+                phrase_hits[i].append(d)
+            for w in words.intersection(tokens):
+                term_hits[w].append(d)
+
+        for pattern, docs in zip(patterns, phrase_hits):
+            self._phrase_docs[pattern] = np.asarray(docs, dtype=np.int64)
+        for w in words:
+            self._term_docs[w] = np.asarray(term_hits.get(w, ()), dtype=np.int64)
+        return self
+
+    def phrase_docs(self, phrase) -> np.ndarray:
+        """摘要中出现该短语的文献下标。"""
+        pattern = tuple(tokenize(phrase))
+        if pattern not in self._phrase_docs:
+            self.scan(phrases=[phrase])
+        return self._phrase_docs.get(pattern, np.empty(0, dtype=np.int64))
+
+    def target_count(self, symbol, pubmed_ids, fullname=None) -> int:
+        """
+        与 analysis.query_target 相同的报道数：先统计靶点的文献中摘要出现基因符号的数量，
+        为 0 时改为统计摘要中出现基因全名或基因符号的文献数。
+        """
+        symbol_docs = self.phrase_docs(symbol)
+        count = int(np.isin(self.pmids[symbol_docs], np.asarray(pubmed_ids, dtype=np.int64)).sum())
+        if count == 0 and fullname is not None:
+            count = len(np.union1d(self.phrase_docs(fullname), symbol_docs))
+        return count
+
+    def drug_count(self, drug_name) -> int:
+        """与 get.get_drug_report_info 相同的报道数：摘要中出现药物名中任一词的文献数。"""
+        words = tokenize(normalize_drug_name(drug_name))
+        missing = [w for w in words if w not in self._term_docs]
+        if missing:
+            self.scan(terms=missing)
+        docs = [self._term_docs[w] for w in words]
+        return len(np.unique(np.concatenate(docs))) if docs else 0
@@ -2,9 +2,12 @@ import output
 import get
 import Assist
 import compute
+import report
+import significance
 import os
 import time
-from datetime import datetime
+import numpy as np
+import pandas as pd
 import logging
 
 logging.basicConfig(
@@ -44,14 +47,15 @@ def from_chemical(chemical_id,
     参数:
         chemical_id (str): 待分析化学物的ID(DNCID格式)
         score (int, 可选): 蛋白质相互作用的综合分数阈值，默认为990
-        DiseaseName (str, 可选): 用于研究状态分析的疾病名称，默认为"cough"(咳嗽)
+        DiseaseName (str | list, 可选): 用于研究状态分析的疾病名称，默认为"cough"(咳嗽)；为列表时分别输出各疾病的结果
         target_max_number (int, 可选): 最大靶点数量，默认为70
         report_number (int, 可选): 生成报告数量，默认为0
         interaction_number (int, 可选): 考虑的相互作用数量，默认为0
         out_for_excel (bool, 可选): 是否输出Excel文件，默认为True
         out_for_cytoscape (bool, 可选): 是否准备Cytoscape文件，默认为True
         research_status_test (bool, 可选): 是否执行研究状态测试，默认为True
-        safety_research (bool, 可选): 是否进行安全性研究，默认为True
+        safety_research (bool, 可选): 是否进行安全性研究，默认为True；为True时复方、中药、化学物、靶点数据
+            增加毒性暴露得分列（见 report.toxicity_exposure），并随结果一起输出与返回
         out_graph (bool, 可选): 是否生成可视化图形，默认为True
         re (bool, 可选): 是否返回原始结果，默认为True
         path (str, 可选): 输出目录路径，默认为'results'
@@ -115,6 +119,13 @@ def from_chemical(chemical_id,
             tcm, tcm_chem_links, chem, chem_protein_links, proteins
         )
 
+        # 毒性暴露得分随结果一起输出与返回
+        if safety_research:
+            logger.info("Computing toxicity exposure...")
+            formula_df, tcm_df, chem_df, protein_df = report.toxicity_exposure(
+                formula_df, formula_tcm_links_df, tcm_df, tcm_chem_links_df, chem_df, chem_protein_links_df,
+                protein_df)
+
         # 可视化输出
         if out_graph:
             logger.info("Generating network visualizations...")
@@ -148,12 +159,13 @@ def from_chemical(chemical_id,
         if research_status_test:
             logger.info("Performing research status test...")
 
-            Assist.analyze_proteins(DiseaseName, target_max_number, report_number, interaction_number, protein_df)
+            Assist.analyze_proteins(DiseaseName, target_max_number, report_number, interaction_number, protein_df,
+                                    path=path)
 
         # 安全性研究
         if safety_research:
             logger.info("Performing safety research analysis...")
-            Assist.generate_toxicity_report(protein_df, chem_df, formula_df, tcm_df)
+            Assist.generate_toxicity_report(protein_df, chem_df, formula_df, tcm_df, path=path)
 
         # 计算并记录总时间
         elapsed_time = time.time() - start_time
@@ -231,6 +243,12 @@ def from_tcm_or_formula(tcm_or_formula_id,
         tcm, tcm_chem_links, chem, chem_protein_links, proteins
     )
 
+    # Toxicity exposure is returned and exported together with the results
+    if safety_research:
+        logger_TCM_VOTER.info("Computing toxicity exposure")
+        formula_df, tcm_df, chem_df, protein_df = report.toxicity_exposure(
+            formula_df, formula_tcm_links_df, tcm_df, tcm_chem_links_df, chem_df, chem_protein_links_df, protein_df)
+
     # Output visualization
     if out_graph:
         logger_TCM_VOTER.info("Generating visualization")
@@ -265,13 +283,14 @@ def from_tcm_or_formula(tcm_or_formula_id,
     if research_status_test:
         logger_TCM_VOTER.info("Performing research status test")
 
-        Assist.analyze_proteins(DiseaseName, target_max_number, report_number, interaction_number, protein_df)
+        Assist.analyze_proteins(DiseaseName, target_max_number, report_number, interaction_number, protein_df,
+                                path=path)
 
     # Safety research (placeholder)
     if safety_research:
         logger_TCM_VOTER.info("Performing safety research test")
 
-        Assist.generate_toxicity_report(protein_df, chem_df, formula_df, tcm_df)
+        Assist.generate_toxicity_report(protein_df, chem_df, formula_df, tcm_df, path=path)
 
     logger_TCM_VOTER.info("Analysis completed")
 
@@ -297,6 +316,8 @@ def from_proteins(proteins,
                   num=1000,
                   tcm_component=False,
                   formula_component=False,
+                  component_method='knapsack',
+                  permutations=0,
                   re=True,
                   path='results/'):
     # 初始化计时和日志
@@ -304,7 +325,7 @@ def from_proteins(proteins,
 
     def log_step(step_name):
         elapsed = time.time() - start_time
-        print(f"[{datetime.now().strftime('%H:%M:%S')}] [Step: {step_name}] | Time elapsed: {elapsed:.2f}s")
+        logger.info(f"[Step: {step_name}] | Time elapsed: {elapsed:.2f}s")
 
     # 创建输出目录
     log_step("Creating output directory")
@@ -342,16 +363,38 @@ def from_proteins(proteins,
     sd = get.get_SD('DNSID', sd_formula_links['DNSID'])
 
     log_step("Computing scores")
-    tcm, chem, formula = compute.score(tcm, tcm_chem_links, chem,
-                                       chem_protein_links, formula, formula_tcm_links)
+    # 每个靶点的得分保存为稀疏矩阵（compute.ProteinScores），随结果返回；
+    # 靶点较多时不再展开为列（见 compute.score 的 per_protein），改为写出长表
+    protein_scores = compute.protein_scores(tcm, tcm_chem_links, chem, chem_protein_links, formula,
+                                            formula_tcm_links, np.float64)
+    tcm, chem, formula = compute.score(tcm, tcm_chem_links, chem, chem_protein_links, formula, formula_tcm_links,
+                                       per_protein='auto', scores=protein_scores)
+
+    if permutations:
+        # 零模型使用网络中各复方、中药的完整组成及其化合物与全部靶点的连接，
+        # 而不是已按输入靶点筛选的子图（见 significance.permutation_test）
+        log_step("Running permutation test")
+        full_formula_tcm_links = get.get_formula_tcm_links('DNFID', formula['DNFID'])
+        full_tcm = get.get_tcm('DNHID', pd.concat([tcm['DNHID'], full_formula_tcm_links['DNHID']]))
+        full_tcm_chem_links = get.get_tcm_chem_links('DNHID', full_tcm['DNHID'])
+        full_chem = get.get_chemicals('DNCID', full_tcm_chem_links['DNCID'])
+        universe_links = get.get_chem_protein_links('DNCID', full_chem['DNCID'], score)
+        significant = significance.permutation_test(full_tcm, full_tcm_chem_links, full_chem, universe_links,
+                                                    proteins['Ensembl_ID'], formula, full_formula_tcm_links,
+                                                    n_perm=permutations, random_state=random_state)
+        tcm = significance.annotate(tcm, significant['tcm'])
+        chem = significance.annotate(chem, significant['chem'])
+        formula = significance.annotate(formula, significant['formula'])
 
     tcms, formulas = None, None
     if tcm_component:
         log_step("Computing TCM components")
-        tcms = compute.component(tcm.loc[tcm['Importance Score'] != 1.0], random_state, num)
+        tcms = compute.component(tcm.loc[tcm['Importance Score'] != 1.0], random_state, num,
+                                 method=component_method, scores=protein_scores)
     if formula_component:
         log_step("Computing formula components")
-        formulas = compute.component(formula.loc[formula['Importance Score'] != 1.0], random_state, num)
+        formulas = compute.component(formula.loc[formula['Importance Score'] != 1.0], random_state, num,
+                                     method=component_method, scores=protein_scores)
 
     # 转换为 DataFrame
     log_step("Converting to DataFrames")
@@ -360,6 +403,12 @@ def from_proteins(proteins,
         Assist.create_dataframes(sd, sd_formula_links, formula, formula_tcm_links, tcm,
                                  tcm_chem_links, chem, chem_protein_links, proteins))
 
+    # 毒性暴露得分随结果一起输出与返回
+    if safety_research:
+        log_step("Computing toxicity exposure")
+        formula_df, tcm_df, chem_df, protein_df = report.toxicity_exposure(
+            formula_df, formula_tcm_links_df, tcm_df, tcm_chem_links_df, chem_df, chem_protein_links_df, protein_df)
+
     # 输出结果
     if out_for_cytoscape:
         log_step("Exporting for Cytoscape")
@@ -388,21 +437,27 @@ def from_proteins(proteins,
                                      chem_protein_links_df=chem_protein_links_df,
                                      protein_df=protein_df)
 
+        if not any(col.endswith(compute.SCORE_SUFFIX) for col in tcm_df.columns):
+            # 每个靶点的得分没有展开为列时，以 (ID, Ensembl_ID, HerbiV Score) 长表写在结果旁
+            for kind in protein_scores.matrices:
+                protein_scores.long(kind).to_csv(os.path.join(path, f'{kind}_protein_scores.csv'), index=False)
+
     if research_status_test:
         log_step("Running research status test")
 
-        Assist.analyze_proteins(DiseaseName, target_max_number, report_number, interaction_number, protein_df)
+        Assist.analyze_proteins(DiseaseName, target_max_number, report_number, interaction_number, protein_df,
+                                path=path)
 
     if safety_research:
         log_step("Safety research (placeholder)")
 
-        Assist.generate_toxicity_report(protein_df, chem_df, formula_df, tcm_df)
+        Assist.generate_toxicity_report(protein_df, chem_df, formula_df, tcm_df, path=path)
 
     log_step("Completed")
     if re:
         return (SD_df, SD_Formula_Links_df, formula_df, formula_tcm_links_df,
                 tcm_df, tcm_chem_links_df, chem_df, chem_protein_links_df, protein_df,
-                tcms, formulas)
+                tcms, formulas, protein_scores)
 
 
 def from_SD(SD_ID,
@@ -429,7 +484,7 @@ def from_SD(SD_ID,
 
     def log_step(step_name):
         elapsed = time.time() - start_time
-        print(f"[{datetime.now().strftime('%H:%M:%S')}] [Step: {step_name}] | Time elapsed: {elapsed:.2f}s")
+        logger.info(f"[Step: {step_name}] | Time elapsed: {elapsed:.2f}s")
 
     log_step("Creating output directory")
     if not os.path.exists(path):
@@ -469,6 +524,12 @@ def from_SD(SD_ID,
         Assist.create_dataframes(SD, SD_Formula_Links, formula, formula_tcm_links, tcm,
                                  tcm_chem_links, chem, chem_protein_links, protein))
 
+    # 毒性暴露得分随结果一起输出与返回
+    if safety_research:
+        log_step("Computing toxicity exposure")
+        formula_df, tcm_df, chem_df, protein_df = report.toxicity_exposure(
+            formula_df, formula_tcm_links_df, tcm_df, tcm_chem_links_df, chem_df, chem_protein_links_df, protein_df)
+
     if out_graph:
         log_step("Generating visualization graphs")
         output.vis(SD_df, SD_Formula_Links_df, formula_df, formula_tcm_links_df,
@@ -495,12 +556,13 @@ def from_SD(SD_ID,
     if research_status_test:
         log_step("Running research status test")
 
-        Assist.analyze_proteins(DiseaseName, target_max_number, report_number, interaction_number, protein_df)
+        Assist.analyze_proteins(DiseaseName, target_max_number, report_number, interaction_number, protein_df,
+                                path=path)
 
     if safety_research:
         log_step("Running safety research")
 
-        Assist.generate_toxicity_report(protein_df, chem_df, formula_df, tcm_df)
+        Assist.generate_toxicity_report(protein_df, chem_df, formula_df, tcm_df, path=path)
 
     log_step("Completed all operations")
     if re:
@@ -510,6 +572,37 @@ def from_SD(SD_ID,
         return 0
 
 
+# 各搜索类型对应的 (检索函数, 名称所在列, ID列, 分析函数)
+SEARCH_TYPES = {
+    0: (get.get_SD, '证候', 'DNSID', from_SD),
+    1: (get.get_formula, 'name', 'DNFID', from_tcm_or_formula),
+    2: (get.get_tcm, 'cn_name', 'DNHID', from_tcm_or_formula),
+    3: (get.get_chemicals, 'Name', 'DNCID', from_chemical),
+    4: (get.get_proteins, 'gene_name', 'Ensembl_ID', from_proteins),
+}
+
+
+def resolve_search(SearchType, SearchName):
+    """
+    根据搜索类型与名称查找对应的ID及分析函数
+
+    参数:
+        SearchType (int): 搜索类型，0-辨证 1-方剂 2-中药 3-化学成分 4-靶点蛋白
+        SearchName (list): 证候名/方剂名/中药名/成分名/基因名
+
+    返回:
+        tuple: (SearchID, 分析函数)
+
+    异常:
+        ValueError: SearchType不在0-4之间
+    """
+    if SearchType not in SEARCH_TYPES:
+        raise ValueError(f"SearchType 应为 0-4，而不是 {SearchType}")
+
+    getter, name_column, id_column, analyze = SEARCH_TYPES[SearchType]
+    return getter(name_column, SearchName)[id_column], analyze
+
+
 def TCM_VOTER(SearchType,
               SearchName,
               DiseaseName="cough",
@@ -539,7 +632,7 @@ def TCM_VOTER(SearchType,
             4 - 靶点蛋白
         SearchName (str): 搜索名称，根据SearchType不同而不同:
             证候名/方剂名/中药名/成分名/基因名
-        DiseaseName (str, 可选): 目标疾病名称，用于研究状态分析，默认为"cough"
+        DiseaseName (str | list, 可选): 目标疾病名称，用于研究状态分析，默认为"cough"；为列表时分别输出各疾病的结果
         target_max_number (int, 可选): 最大靶点数量限制，默认为70
         report_number (int, 可选): 报告生成数量，默认为0
         interaction_number (int, 可选): 相互作用数量限制，默认为0
@@ -582,7 +675,7 @@ def TCM_VOTER(SearchType,
 
     工作流程:
         1. 根据SearchType确定搜索类型
-        2. 调用get模块获取对应的ID
+        2. 通过resolve_search调用get模块获取对应的ID
         3. 根据类型调用相应的分析函数:
             - 辨证: from_SD()
             - 方剂/中药: from_tcm_or_formula()
@@ -592,91 +685,22 @@ def TCM_VOTER(SearchType,
         5. 返回固定值0
     """
 
-    if SearchType == 0:
-        SearchID = get.get_SD('证候', SearchName)['DNSID']
-
-        from_SD(SearchID,
-                score=score,
-                DiseaseName=DiseaseName,
-                target_max_number=target_max_number,
-                report_number=report_number,
-                interaction_number=interaction_number,
-                out_graph=out_graph,
-                out_for_cytoscape=out_for_cytoscape,
-                out_for_excel=out_for_excel,
-                research_status_test=research_status_test,
-                safety_research=safety_research,
-                re=re,
-                path=path
-                )
-
-    if SearchType == 1:
-        SearchID = get.get_formula('name', SearchName)['DNFID']
-
-        from_tcm_or_formula(SearchID, score=score,
-                            DiseaseName=DiseaseName,
-                            target_max_number=target_max_number,
-                            report_number=report_number,
-                            interaction_number=interaction_number,
-                            out_graph=out_graph,
-                            out_for_cytoscape=out_for_cytoscape,
-                            out_for_excel=out_for_excel,
-                            research_status_test=research_status_test,
-                            safety_research=safety_research,
-                            re=re,
-                            path=path
-                            )
-
-    if SearchType == 2:
-        SearchID = get.get_tcm('cn_name', SearchName)['DNHID']
-
-        from_tcm_or_formula(SearchID, score=score,
-                            DiseaseName=DiseaseName,
-                            target_max_number=target_max_number,
-                            report_number=report_number,
-                            interaction_number=interaction_number,
-                            out_graph=out_graph,
-                            out_for_cytoscape=out_for_cytoscape,
-                            out_for_excel=out_for_excel,
-                            research_status_test=research_status_test,
-                            safety_research=safety_research,
-                            re=re,
-                            path=path
-                            )
-
-    if SearchType == 3:
-        SearchID = get.get_chemicals('Name', SearchName)['DNCID']
-
-        from_chemical(SearchID, score=score,
-                      DiseaseName=DiseaseName,
-                      target_max_number=target_max_number,
-                      report_number=report_number,
-                      interaction_number=interaction_number,
-                      out_graph=out_graph,
-                      out_for_cytoscape=out_for_cytoscape,
-                      out_for_excel=out_for_excel,
-                      research_status_test=research_status_test,
-                      safety_research=safety_research,
-                      re=re,
-                      path=path
-                      )
-
-    if SearchType == 4:
-        SearchID = get.get_proteins('gene_name', SearchName)['Ensembl_ID']
-
-        from_proteins(SearchID, score=score,
-                      DiseaseName=DiseaseName,
-                      target_max_number=target_max_number,
-                      report_number=report_number,
-                      interaction_number=interaction_number,
-                      out_graph=out_graph,
-                      out_for_cytoscape=out_for_cytoscape,
-                      out_for_excel=out_for_excel,
-                      research_status_test=research_status_test,
-                      safety_research=safety_research,
-                      re=re,
-                      path=path
-                      )
+    SearchID, analyze = resolve_search(SearchType, SearchName)
+
+    analyze(SearchID,
+            score=score,
+            DiseaseName=DiseaseName,
+            target_max_number=target_max_number,
+            report_number=report_number,
+            interaction_number=interaction_number,
+            out_graph=out_graph,
+            out_for_cytoscape=out_for_cytoscape,
+            out_for_excel=out_for_excel,
+            research_status_test=research_status_test,
+            safety_research=safety_research,
+            re=re,
+            path=path
+            )
 
     return 0
 
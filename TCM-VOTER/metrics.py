@@ -0,0 +1,271 @@
+"""
+各分析阶段的运行统计（墙钟时间、CPU 时间、峰值内存增量、行数）。
+
+cpu_s 为阶段内整个进程（全部线程）及其已结束的子进程（如 ProcessPoolExecutor 的工作进程）消耗的 CPU 时间，
+多个阶段在不同线程中并发运行时会相互计入；thread_cpu_s 只统计调用阶段的线程。
+
+无需修改代码即可通过环境变量开启：
+    TCM_VOTER_METRICS: 统计输出文件。以 .prom 结尾时在进程结束时写出 Prometheus 文本格式，
+                       否则每个阶段结束时追加一行 JSON（JSON Lines）。
+    TCM_VOTER_PROFILE: cProfile 输出文件。对最外层阶段进行剖析，只保留最慢阶段的结果，
+                       可用 ``python -m pstats <文件>`` 或 snakeviz 查看。
+
+也可以在代码中调用 configure() 开启，或用 stage()/timed() 标记新的阶段。
+"""
+import atexit
+import cProfile
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows 下没有 resource 模块，改用 psutil（若已安装）
+    resource = None
+
+_config = {'path': None, 'format': None, 'profile_path': None, 'enabled': False}
+_records = []
+_lock = threading.Lock()
+_profile_lock = threading.Lock()
+_local = threading.local()
+_slowest = {'stage': None, 'wall_s': -1.0, 'profile': None}
+
+
+def configure(path=None, fmt=None, profile_path=None, enabled=True):
+    """
+    开启或关闭阶段统计。
+
+    Args:
+        path: 统计输出文件，为 None 时只在内存中保存，可通过 records() 获取。
+        fmt: 输出格式，'jsonl' 或 'prometheus'，默认根据 path 的后缀判断。
+        profile_path: cProfile 输出文件，为 None 时不做剖析。
+        enabled: 是否开启统计。
+    """
+    if fmt is None and path is not None:
+        fmt = 'prometheus' if str(path).endswith('.prom') else 'jsonl'
+    _config.update(path=path, format=fmt, profile_path=profile_path,
+                   enabled=enabled or profile_path is not None)
+
+
+def is_enabled() -> bool:
+    return _config['enabled']
+
+
+def reset():
+    """清空已记录的统计数据。"""
+    with _lock:
+        _records.clear()
+        _slowest.update(stage=None, wall_s=-1.0, profile=None)
+
+
+def records() -> list:
+    """返回已记录的阶段统计（按完成顺序）。"""
+    with _lock:
+        return list(_records)
+
+
+def current_stage():
+    """返回当前线程正在运行的最内层阶段名称，不在任何阶段内时返回 None。"""
+    parents = getattr(_local, 'parents', [])
+    return parents[-1] if parents else None
+
+
+def _peak_rss():
+    """当前进程的峰值常驻内存（字节），无法获取时返回 None。"""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 下单位为 KB，macOS 下为字节
+        return peak if sys.platform == 'darwin' else peak * 1024
+    try:
+        import psutil
+    except ImportError:
+        return None
+    info = psutil.Process().memory_info()
+    return getattr(info, 'peak_wset', info.rss)
+
+
+def _cpu_time():
+    """进程（全部线程）与已回收的子进程的 CPU 时间之和（秒）。"""
+    cpu = time.process_time()
+    if resource is not None:
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu += children.ru_utime + children.ru_stime
+    return cpu
+
+
+def count_rows(result):
+    """统计阶段返回值中的行数：DataFrame/列表取长度，元组中的各 DataFrame 行数求和。"""
+    if result is None or isinstance(result, (str, bytes, int, float)):
+        return None
+    if isinstance(result, tuple):
+        counts = [count_rows(item) for item in result]
+        counts = [c for c in counts if c is not None]
+        return sum(counts) if counts else None
+    if hasattr(result, 'shape'):
+        return int(result.shape[0]) if len(result.shape) else None
+    if hasattr(result, '__len__'):
+        return len(result)
+    return None
+
+
+def _emit(record):
+    with _lock:
+        _records.append(record)
+        if _config['path'] is not None and _config['format'] == 'jsonl':
+            with open(_config['path'], 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+@contextmanager
+def stage(name, rows=None):
+    """
+    记录一个阶段的运行统计。
+
+    Args:
+        name: 阶段名称，如 'get.get_formula'。
+        rows: 行数，也可以在 with 块内通过 record['rows'] 设置。
+
+    Yields:
+        record: 该阶段的统计字典，阶段结束后写入。
+    """
+    if not _config['enabled']:
+        yield {}
+        return
+
+    depth = getattr(_local, 'depth', 0)
+    parents = getattr(_local, 'parents', [])
+    record = {'stage': name, 'parent': parents[-1] if parents else None, 'depth': depth,
+              'pid': os.getpid(), 'thread': threading.current_thread().name,
+              'start': time.time(), 'rows': rows, 'ok': True}
+
+    # cProfile 不能嵌套，只剖析最外层阶段，且同一时间只剖析一个线程
+    profiler = None
+    if _config['profile_path'] is not None and depth == 0 and _profile_lock.acquire(blocking=False):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:  # 已有其他剖析工具在运行
+            profiler = None
+            _profile_lock.release()
+
+    _local.depth = depth + 1
+    _local.parents = parents + [name]
+    rss_before = _peak_rss()
+    wall_before = time.perf_counter()
+    cpu_before = _cpu_time()
+    thread_cpu_before = time.thread_time()
+    try:
+        yield record
+    except BaseException:
+        record['ok'] = False
+        raise
+    finally:
+        record['wall_s'] = time.perf_counter() - wall_before
+        record['cpu_s'] = _cpu_time() - cpu_before
+        record['thread_cpu_s'] = time.thread_time() - thread_cpu_before
+        rss_after = _peak_rss()
+        record['peak_rss_delta_bytes'] = None if rss_before is None else rss_after - rss_before
+        _local.depth = depth
+        _local.parents = parents
+
+        if profiler is not None:
+            profiler.disable()
+            _profile_lock.release()
+            with _lock:
+                if record['wall_s'] > _slowest['wall_s']:
+                    _slowest.update(stage=name, wall_s=record['wall_s'], profile=profiler)
+
+        _emit(record)
+
+
+def timed(func=None, *, name=None):
+    """
+    装饰器：记录被装饰函数每次调用的运行统计，行数取自返回值。
+
+    可直接使用 ``@timed``，也可以指定名称 ``@timed(name='compute.score')``。
+    """
+    if func is None:
+        return functools.partial(timed, name=name)
+
+    stage_name = name or f'{func.__module__}.{func.__qualname__}'
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _config['enabled']:
+            return func(*args, **kwargs)
+        with stage(stage_name) as record:
+            result = func(*args, **kwargs)
+            if record.get('rows') is None:
+                record['rows'] = count_rows(result)
+            return result
+
+    return wrapper
+
+
+def summary() -> list:
+    """按阶段汇总调用次数、总墙钟时间、总 CPU 时间、最大内存增量与总行数，按总墙钟时间降序排列。"""
+    totals = {}
+    for r in records():
+        t = totals.setdefault(r['stage'], {'stage': r['stage'], 'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0,
+                                           'peak_rss_delta_bytes': 0, 'rows': 0, 'errors': 0})
+        t['calls'] += 1
+        t['wall_s'] += r['wall_s']
+        t['cpu_s'] += r['cpu_s']
+        t['peak_rss_delta_bytes'] = max(t['peak_rss_delta_bytes'], r['peak_rss_delta_bytes'] or 0)
+        t['rows'] += r['rows'] or 0
+        t['errors'] += 0 if r['ok'] else 1
+    return sorted(totals.values(), key=lambda x: x['wall_s'], reverse=True)
+
+
+def to_prometheus() -> str:
+    """将汇总结果转换为 Prometheus 文本格式。"""
+    metrics = [
+        ('tcm_voter_stage_calls_total', 'counter', 'Number of stage invocations', 'calls'),
+        ('tcm_voter_stage_wall_seconds_total', 'counter', 'Wall clock seconds spent in stage', 'wall_s'),
+        ('tcm_voter_stage_cpu_seconds_total', 'counter', 'CPU seconds spent in stage', 'cpu_s'),
+        ('tcm_voter_stage_peak_rss_delta_bytes', 'gauge', 'Largest peak RSS growth during stage',
+         'peak_rss_delta_bytes'),
+        ('tcm_voter_stage_rows_total', 'counter', 'Rows returned by stage', 'rows'),
+        ('tcm_voter_stage_errors_total', 'counter', 'Stage invocations that raised', 'errors'),
+    ]
+    totals = summary()
+    lines = []
+    for metric, kind, text, key in metrics:
+        lines.append(f'# HELP {metric} {text}')
+        lines.append(f'# TYPE {metric} {kind}')
+        for t in totals:
+            label = t['stage'].replace('\\', '\\\\').replace('"', '\\"')
+            lines.append(f'{metric}{{stage="{label}"}} {t[key]}')
+    return '\n'.join(lines) + '\n'
+
+
+def flush():
+    """写出 Prometheus 汇总文件与最慢阶段的 cProfile 结果。进程退出时会自动调用。"""
+    if _config['path'] is not None and _config['format'] == 'prometheus':
+        with open(_config['path'], 'w', encoding='utf-8') as f:
+            f.write(to_prometheus())
+    with _lock:
+        profiler = _slowest['profile']
+    if _config['profile_path'] is not None and profiler is not None:
+        profiler.dump_stats(_config['profile_path'])
+
+
+if os.environ.get('TCM_VOTER_METRICS') or os.environ.get('TCM_VOTER_PROFILE'):
+    configure(path=os.environ.get('TCM_VOTER_METRICS') or None,
+              profile_path=os.environ.get('TCM_VOTER_PROFILE') or None)
+
+atexit.register(flush)
+
+
+if __name__ == '__main__':
+    # 汇总已有的 JSON Lines 统计文件: python metrics.py metrics.jsonl
+    with open(sys.argv[1], 'r', encoding='utf-8') as f:
+        _records.extend(json.loads(line) for line in f if line.strip())
+    print(f"{'stage':<45}{'calls':>7}{'wall_s':>10}{'cpu_s':>10}{'rss_MB':>9}{'rows':>10}")
+    for t in summary():
+        print(f"{t['stage']:<45}{t['calls']:>7}{t['wall_s']:>10.3f}{t['cpu_s']:>10.3f}"
+              f"{t['peak_rss_delta_bytes'] / 2 ** 20:>9.1f}{t['rows']:>10}")
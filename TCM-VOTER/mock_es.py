@@ -0,0 +1,421 @@
+"""
+本地文献检索替身，用于在没有 Elasticsearch 的环境中运行和测量研究现状相关阶段。
+
+MockElasticsearch 实现了流程中用到的 Elasticsearch 客户端接口（search、scroll、count、msearch、clear_scroll），
+按查询内容返回命中数：优先使用录制的命中数，否则根据查询的哈希生成确定的命中数。
+显式请求了文档（size > 0 且使用 scroll 或 point-in-time）的查询返回带有合成 pubMedId 的文档，
+可用 scroll 或 search_after 翻页。
+给定 Corpus（内存中的摘要集合）时，按 Elasticsearch 的语义对摘要求值 match、match_phrase、terms 与 bool 查询，
+命中数与返回的文档彼此一致，可用于比较不同检索方式的结果。
+每次往返都可以附加固定延迟，并按 metrics 中的当前阶段统计往返次数、查询数与请求体大小。
+
+RecordingElasticsearch 包装真实客户端，记录各查询的命中数并保存为 JSON，供 MockElasticsearch 回放。
+
+也可以作为 HTTP 服务运行，使未修改的代码（Elasticsearch('http://localhost:9200/')）直接连接：
+    python mock_es.py --port 9200 --counts recorded_counts.json --latency 0.02
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import metrics
+from literature import tokenize
+
+# Elasticsearch 默认的 track_total_hits 上限
+TOTAL_HITS_LIMIT = 10000
+
+
+def _normalize(node):
+    """规范化查询：字典按键排序、terms 列表排序，使等价查询得到相同的键。"""
+    if isinstance(node, dict):
+        out = {}
+        for key in sorted(node):
+            value = node[key]
+            if key == 'terms' and isinstance(value, dict):
+                value = {f: sorted(map(str, v)) if isinstance(v, list) else v for f, v in value.items()}
+            out[key] = _normalize(value)
+        return out
+    if isinstance(node, list):
+        return [_normalize(v) for v in node]
+    return node
+
+
+def query_key(query) -> str:
+    """返回查询（body['query'] 部分）的规范化哈希键。"""
+    canonical = json.dumps(_normalize(query), ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+
+def describe(query) -> str:
+    """将查询概括为可读字符串，如 'match_phrase:cough & match_phrase:TNF & terms:pubMedId[1532]'。"""
+    parts = []
+
+    def walk(node):
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if key in ('match', 'match_phrase') and isinstance(value, dict):
+                    for v in value.values():
+                        parts.append(f"{key}:{v['query'] if isinstance(v, dict) else v}")
+                elif key == 'terms' and isinstance(value, dict):
+                    for field, v in value.items():
+                        parts.append(f'terms:{field}[{len(v)}]')
+                else:
+                    walk(value)
+        elif isinstance(node, list):
+            for v in node:
+                walk(v)
+
+    walk(query)
+    return ' & '.join(parts)
+
+
+def _extract_query(body, query):
+    if query is not None:
+        return query
+    if body is None:
+        return {'match_all': {}}
+    return body.get('query', {'match_all': {}})
+
+
+class Corpus:
+    """
+    内存中的摘要集合及其倒排索引，用于按查询内容求值命中的文献。
+
+    Args:
+        docs: (pubMedId, abstract) 的序列。
+    """
+
+    def __init__(self, docs):
+        self.pmids, self.abstracts = [], []
+        self.postings = defaultdict(dict)  # 词 -> {文献下标: 出现位置}
+        self._by_pmid = defaultdict(set)
+        for d, (pmid, abstract) in enumerate(docs):
+            self.pmids.append(int(pmid))
+            self.abstracts.append(abstract)
+            self._by_pmid[str(pmid)].add(d)
+            for pos, token in enumerate(tokenize(abstract)):
+                self.postings[token].setdefault(d, []).append(pos)
+
+    def __len__(self):
+        return len(self.pmids)
+
+    def _phrase(self, text):
+        tokens = tokenize(text)
+        if not tokens:
+            return set()
+        docs = set(self.postings.get(tokens[0], ()))
+        for token in tokens[1:]:
+            docs &= self.postings.get(token, {}).keys()
+        found = set()
+        for d in docs:
+            positions = [set(self.postings[t][d]) for t in tokens]
+            if any(all(p + i in positions[i] for i in range(1, len(tokens))) for p in positions[0]):
+                found.add(d)
+        return found
+
+    def evaluate(self, query) -> set:
+        """返回命中文献的下标集合。"""
+        (kind, value), = query.items()
+        if kind == 'match_all':
+            return set(range(len(self.pmids)))
+        if kind in ('match', 'match_phrase'):
+            text = next(iter(value.values()))
+            text = text['query'] if isinstance(text, dict) else text
+            if kind == 'match_phrase':
+                return self._phrase(text)
+            return set().union(*(self.postings.get(t, {}).keys() for t in tokenize(text)))
+        if kind == 'terms':
+            ids = next(iter(value.values()))
+            return set().union(*(self._by_pmid.get(str(p), ()) for p in ids))
+        if kind == 'bool':
+            must = list(value.get('must', [])) + list(value.get('filter', []))
+            docs = set(range(len(self.pmids)))
+            for clause in must:
+                docs &= self.evaluate(clause)
+            if value.get('should') and not must:
+                docs &= set().union(*(self.evaluate(clause) for clause in value['should']))
+            for clause in value.get('must_not', []):
+                docs -= self.evaluate(clause)
+            return docs
+        raise ValueError(f'unsupported query {kind}')
+
+
+class MockElasticsearch:
+    """
+    与 elasticsearch.Elasticsearch 接口兼容的本地文献检索替身。
+
+    Args:
+        counts: 录制的命中数，{查询键: 命中数} 或 {查询键: {'count': 命中数, ...}}。
+        latency: 每次往返的延迟（秒）。
+        zero_rate: 未录制的组合查询（bool）返回 0 的比例，用于模拟未报道的靶点/药物。
+        seed: 生成未录制查询命中数时使用的种子。
+        corpus: Corpus，给定时按摘要内容求值查询，不再使用录制或生成的命中数。
+    """
+
+    def __init__(self, counts=None, latency=0.0, zero_rate=0.5, seed=0, corpus=None):
+        self.counts = {k: v['count'] if isinstance(v, dict) else v for k, v in (counts or {}).items()}
+        self.latency = latency
+        self.zero_rate = zero_rate
+        self.seed = seed
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._scroll_id = 0
+        self._scrolls = {}
+        self.corpus = corpus
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        """从 RecordingElasticsearch.save() 保存的文件创建替身。"""
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f), **kwargs)
+
+    def hit_count(self, query) -> int:
+        """返回查询的命中数（未截断）。"""
+        if self.corpus is not None:
+            return len(self.corpus.evaluate(query))
+        key = query_key(query)
+        if key in self.counts:
+            return self.counts[key]
+        h = int(hashlib.sha1(f'{self.seed}:{key}'.encode()).hexdigest(), 16)
+        if 'bool' in query and (h % 10000) / 10000 < self.zero_rate:
+            return 0
+        # 对数均匀分布于 1 ~ 50000
+        return int(50000 ** (((h >> 16) % 65536) / 65535))
+
+    def _round_trip(self, n_queries, body):
+        nbytes = len(json.dumps(body, ensure_ascii=False).encode('utf-8')) if body is not None else 0
+        stage_name = metrics.current_stage()
+        with self._lock:
+            s = self._stats.setdefault(stage_name, {'round_trips': 0, 'queries': 0, 'request_bytes': 0})
+            s['round_trips'] += 1
+            s['queries'] += n_queries
+            s['request_bytes'] += nbytes
+        if self.latency:
+            time.sleep(self.latency)
+
+    def documents(self, query) -> list:
+        """返回查询命中的文档（_source），给定 Corpus 时包含摘要。"""
+        if self.corpus is not None:
+            return [{'pubMedId': str(self.corpus.pmids[d]), 'abstract': self.corpus.abstracts[d]}
+                    for d in sorted(self.corpus.evaluate(query))]
+        return [{'pubMedId': str(p)} for p in self.pubmed_ids(query)]
+
+    def pubmed_ids(self, query) -> np.ndarray:
+        """返回查询命中文档的合成 PubMed ID（与 hit_count 数量一致，按查询确定）。"""
+        if self.corpus is not None:
+            return np.sort(np.asarray([self.corpus.pmids[d] for d in self.corpus.evaluate(query)], dtype=np.int64))
+        n = self.hit_count(query)
+        rng = np.random.default_rng(int(query_key(query)[:12], 16))
+        # 随机间隔的累加和：严格递增、互不相同，分布在 1 ~ 约 36,000,000
+        return np.cumsum(rng.integers(1, 2 * 36_000_000 // max(n, 1) + 1, n))
+
+    def _page(self, scroll_id):
+        with self._lock:
+            docs, start, size = self._scrolls[scroll_id]
+            self._scrolls[scroll_id] = (docs, start + size, size)
+        return [{'_index': 'abstract22', '_source': doc} for doc in docs[start:start + size]]
+
+    def _response(self, query, track_total_hits=None, size=0):
+        n = self.hit_count(query)
+        if track_total_hits is True:
+            limit = None
+        elif isinstance(track_total_hits, int) and not isinstance(track_total_hits, bool):
+            limit = track_total_hits
+        else:
+            limit = TOTAL_HITS_LIMIT
+        with self._lock:
+            self._scroll_id += 1
+            scroll_id = f'mock-scroll-{self._scroll_id}'
+        if limit is not None and n > limit:
+            total = {'value': limit, 'relation': 'gte'}
+        else:
+            total = {'value': n, 'relation': 'eq'}
+        hits = []
+        if size:
+            with self._lock:
+                self._scrolls[scroll_id] = (self.documents(query), 0, size)
+            hits = self._page(scroll_id)
+        return {'took': 0, 'timed_out': False, '_scroll_id': scroll_id,
+                'hits': {'total': total, 'max_score': None, 'hits': hits}}
+
+    def search(self, index=None, body=None, query=None, scroll=None, track_total_hits=None, **kwargs):
+        q = _extract_query(body, query)
+        self._round_trip(1, body if body is not None else {'query': q})
+        if body is not None and 'pit' in body:
+            return self._pit_page(q, body)
+        if track_total_hits is None and body is not None:
+            track_total_hits = body.get('track_total_hits')
+        if scroll:  # Elasticsearch 在 scroll 请求中总是精确统计命中数
+            track_total_hits = True
+        size = kwargs.get('size', body.get('size', 0) if body is not None else 0)
+        return self._response(q, track_total_hits, size if scroll else 0)
+
+    def open_point_in_time(self, index=None, keep_alive=None, **kwargs):
+        self._round_trip(0, None)
+        with self._lock:
+            self._scroll_id += 1
+            return {'id': f'mock-pit-{self._scroll_id}'}
+
+    def close_point_in_time(self, id=None, body=None, **kwargs):
+        self._round_trip(0, None)
+        return {'succeeded': True, 'num_freed': 1}
+
+    def _pit_page(self, query, body):
+        # 按文档顺序排序，search_after 为上一页最后一个文档的排序值
+        docs = self.documents(query)
+        start = body['search_after'][0] + 1 if body.get('search_after') else 0
+        size = body.get('size', 10)
+        hits = [{'_index': 'abstract22', '_source': doc, 'sort': [i]}
+                for i, doc in enumerate(docs[start:start + size], start)]
+        return {'took': 0, 'timed_out': False, 'pit_id': body['pit']['id'],
+                'hits': {'total': {'value': len(docs), 'relation': 'eq'}, 'max_score': None, 'hits': hits}}
+
+    def scroll(self, scroll_id=None, body=None, scroll=None, **kwargs):
+        scroll_id = scroll_id or body['scroll_id']
+        self._round_trip(1, {'scroll_id': scroll_id})
+        return {'took': 0, 'timed_out': False, '_scroll_id': scroll_id,
+                'hits': {'total': None, 'max_score': None, 'hits': self._page(scroll_id)}}
+
+    def count(self, index=None, body=None, query=None, **kwargs):
+        q = _extract_query(body, query)
+        self._round_trip(1, body if body is not None else {'query': q})
+        return {'count': self.hit_count(q)}
+
+    def msearch(self, body=None, searches=None, index=None, **kwargs):
+        lines = searches if searches is not None else body
+        pairs = list(zip(lines[0::2], lines[1::2]))
+        self._round_trip(len(pairs), lines)
+        return {'took': 0, 'responses': [self._response(_extract_query(b, None), b.get('track_total_hits'))
+                                         for _, b in pairs]}
+
+    def clear_scroll(self, scroll_id=None, body=None, **kwargs):
+        self._round_trip(0, None)
+        with self._lock:
+            self._scrolls.pop(scroll_id, None)
+        return {'succeeded': True, 'num_freed': 1}
+
+    def stats(self) -> dict:
+        """按阶段返回往返次数、查询数与请求体字节数。"""
+        with self._lock:
+            return {k: dict(v) for k, v in self._stats.items()}
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats.clear()
+
+
+class RecordingElasticsearch:
+    """包装真实 Elasticsearch 客户端，记录各查询的命中数，保存后可由 MockElasticsearch 回放。"""
+
+    def __init__(self, es):
+        self.es = es
+        self.counts = {}
+
+    def _record(self, query, count):
+        self.counts[query_key(query)] = {'count': count, 'query': describe(query)}
+
+    def search(self, index=None, body=None, query=None, **kwargs):
+        res = self.es.search(index=index, body=body, query=query, **kwargs)
+        q = _extract_query(body, query)
+        # 为了录制准确命中数，另行计数（search 的 total 可能被截断为 10000）
+        if res['hits']['total'].get('relation') == 'gte':
+            self._record(q, self.es.count(index=index, query=q)['count'])
+        else:
+            self._record(q, res['hits']['total']['value'])
+        return res
+
+    def count(self, index=None, body=None, query=None, **kwargs):
+        res = self.es.count(index=index, body=body, query=query, **kwargs)
+        self._record(_extract_query(body, query), res['count'])
+        return res
+
+    def __getattr__(self, name):
+        return getattr(self.es, name)
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.counts, f, ensure_ascii=False, indent=1)
+
+
+def _handler(mock):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, payload, status=200):
+            data = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('X-Elastic-Product', 'Elasticsearch')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _body(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            return self.rfile.read(length).decode('utf-8') if length else ''
+
+        def _dispatch(self):
+            path = urlparse(self.path).path.rstrip('/')
+            raw = self._body()
+            if path.endswith('/_msearch'):
+                lines = [json.loads(line) for line in raw.splitlines() if line.strip()]
+                return self._send(mock.msearch(body=lines))
+            body = json.loads(raw) if raw else None
+            if path.endswith('/_pit'):
+                if self.command == 'DELETE':
+                    return self._send(mock.close_point_in_time(id=(body or {}).get('id')))
+                return self._send(mock.open_point_in_time())
+            if path.endswith('/_search/scroll'):
+                if self.command == 'DELETE':
+                    ids = (body or {}).get('scroll_id')
+                    return self._send(mock.clear_scroll(ids[0] if isinstance(ids, list) else ids))
+                return self._send(mock.scroll(body=body))
+            if path.endswith('/_search'):
+                return self._send(mock.search(body=body))
+            if path.endswith('/_count'):
+                return self._send(mock.count(body=body))
+            if path == '':
+                return self._send({'name': 'mock', 'cluster_name': 'mock', 'version': {'number': '8.17.2'},
+                                   'tagline': 'You Know, for Search'})
+            return self._send({'error': f'unsupported path {path}'}, 404)
+
+        do_GET = do_POST = do_DELETE = _dispatch
+
+        def do_HEAD(self):
+            self.send_response(200)
+            self.send_header('X-Elastic-Product', 'Elasticsearch')
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(mock, host='127.0.0.1', port=9200):
+    """创建回答 Elasticsearch HTTP 请求的服务，调用 serve_forever() 开始服务。"""
+    return ThreadingHTTPServer((host, port), _handler(mock))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local stand-in for the abstract22 Elasticsearch index')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9200)
+    parser.add_argument('--counts', default=None, help='recorded hit counts (JSON)')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to each round trip')
+    parser.add_argument('--zero-rate', type=float, default=0.5)
+    args = parser.parse_args()
+
+    es = MockElasticsearch.load(args.counts) if args.counts else MockElasticsearch()
+    es.latency, es.zero_rate = args.latency, args.zero_rate
+    server = serve(es, args.host, args.port)
+    print(f'Mock literature service listening on http://{args.host}:{args.port}/')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,287 @@
+"""
+大型网络的分级（level-of-detail）可视化。
+
+output.plot_circle 只能展示每类几十个节点；辩证、方剂级别的查询得到的网络有数万个节点、十余万条边，
+直接写入一个 HTML 时浏览器无法打开。本模块：
+    1. 按 Importance Score（没有得分的类别按度数）在各类别内排序，按类别内的百分位合并为全局顺序；
+    2. 在 Python 中预先计算力导向布局（边的吸引力按稀疏边表计算，斥力在节点较多时用网格 + FFT 卷积近似），
+       布局按图的哈希缓存在 LAYOUT_CACHE_DIR，相同的网络不再重新计算；
+    3. 按全局顺序将节点分为若干层（TIER_SIZES），每层只包含新增的节点及两端都已出现的新增边，
+       写入 network/tier_<i>.js。页面 Network.html 先加载第一层，放大或点击“更多细节”时再加载下一层。
+
+    netvis.render_network(SD, SD_formula_links, formula, formula_tcm_links, tcm, tcm_chem_links,
+                          chem, chem_protein_links, protein, path, scores={'TCM': tcm_df['Importance Score']})
+
+节点与边的表为 output.re_name 的输出（Key / Attribute 与 SourceNode / TargetNode）。
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import metrics
+
+# scipy.fft 仅在计算大型网络的布局时使用，在函数内部导入，避免增加 import main 的耗时
+
+# 节点类别（re_name 的 Attribute）-> 图例名称、颜色、基础大小，顺序与 output.plot_circle 的图例一致
+CATEGORIES = {
+    'TCM': ('中药', '#61a0a8', 25),
+    'Chemicals': ('成分', '#f47920', 15),
+    'Proteins': ('靶点', '#ca8622', 10),
+    'SD': ('辩证', '#d48265', 15),
+    'Formula': ('方剂', '#749f83', 20),
+}
+
+# 各层累计的节点数，最后一层包含其余全部节点
+TIER_SIZES = (300, 3000, 30000)
+
+# 第一层中显示名称的节点数
+LABEL_NODES = 100
+
+LAYOUT_CACHE_DIR = 'Data/Cache/layouts'
+
+# 布局算法版本，修改布局算法时递增，使缓存失效
+LAYOUT_VERSION = 1
+
+# 节点数不超过该值时精确计算两两斥力，否则用网格近似
+EXACT_REPULSION_NODES = 2000
+
+NETWORK_DIR = 'network'
+
+_layouts = {}
+
+
+def node_table(SD, formula, tcm, chem, protein, scores=None) -> pd.DataFrame:
+    """
+    合并各类节点（名称相同的节点只保留一个）。
+
+    Args:
+        scores: {Attribute: Importance Score 的 Series}，与对应节点表的索引对齐；没有得分的类别按度数排序。
+
+    Returns:
+        列为 name、category、score（缺失为 NaN）的 DataFrame。
+    """
+    scores = scores or {}
+    frames = []
+    for df in (SD, formula, tcm, chem, protein):
+        if df is None or df.empty:
+            continue
+        attribute = df['Attribute'].iloc[0]
+        score = scores.get(attribute)
+        frames.append(pd.DataFrame({
+            'name': df['Key'].astype(str).values,
+            'category': attribute,
+            'score': np.nan if score is None else
+            (score.values if score.index.equals(df.index) else score.reindex(df.index).values).astype(float),
+        }))
+    if not frames:
+        return pd.DataFrame({'name': [], 'category': [], 'score': []})
+    nodes = pd.concat(frames, ignore_index=True)
+    # 同一节点可能出现多次（如多个复方包含同一中药），保留得分最高的一条
+    nodes = nodes.sort_values('score', ascending=False, na_position='last', kind='stable')
+    return nodes.drop_duplicates('name').sort_index().reset_index(drop=True)
+
+
+def edge_array(nodes, *link_frames) -> np.ndarray:
+    """将各连接表（SourceNode / TargetNode）转为节点下标的 (m, 2) 数组，去掉自环、重复边与未知节点。"""
+    index = pd.Index(nodes['name'])
+    pairs = []
+    for links in link_frames:
+        if links is None or links.empty:
+            continue
+        src = index.get_indexer(links.iloc[:, 0].astype(str))
+        dst = index.get_indexer(links.iloc[:, 1].astype(str))
+        pairs.append(np.column_stack([src, dst]))
+    if not pairs:
+        return np.empty((0, 2), dtype=np.int64)
+    edges = np.concatenate(pairs)
+    edges = edges[(edges >= 0).all(axis=1) & (edges[:, 0] != edges[:, 1])]
+    return np.unique(np.sort(edges, axis=1), axis=0)
+
+
+def rank_nodes(nodes, edges) -> np.ndarray:
+    """
+    节点的全局顺序（下标数组，重要的在前）。各类别内按 Importance Score 排序（没有得分时按度数），
+    再按类别内的百分位合并，因此任意前 N 个节点都按比例包含各类节点。
+    """
+    degree = np.bincount(edges.ravel(), minlength=len(nodes)) if len(edges) else np.zeros(len(nodes))
+    key = nodes['score'].where(nodes['score'].notna(), pd.Series(degree, index=nodes.index))
+    pct = key.groupby(nodes['category']).rank(ascending=False, method='first', pct=True)
+    # 百分位相同时按类别顺序
+    order = nodes['category'].map({c: i for i, c in enumerate(CATEGORIES)}).fillna(len(CATEGORIES))
+    return np.lexsort((order.values, pct.values))
+
+
+def graph_hash(names, edges) -> str:
+    """网络的哈希（节点名称与边），用作布局缓存的键。"""
+    h = hashlib.sha1(f'v{LAYOUT_VERSION}'.encode())
+    h.update('\0'.join(names).encode('utf-8'))
+    h.update(np.ascontiguousarray(edges, dtype=np.int64).tobytes())
+    return h.hexdigest()
+
+
+def _repulsion_exact(pos, k):
+    delta = pos[:, None, :] - pos[None, :, :]
+    d2 = np.maximum((delta ** 2).sum(-1), 1e-12)
+    np.fill_diagonal(d2, np.inf)
+    return (delta * (k * k / d2)[..., None]).sum(1)
+
+
+def _grid_kernel(k, grid):
+    from scipy import fft as sp_fft
+
+    # 斥力核 k^2 * r / |r|^2（x 分量为实部，y 分量为虚部）的频谱，每次布局只计算一次
+    offsets = (np.arange(2 * grid) - grid) / grid
+    dx, dy = np.meshgrid(offsets, offsets, indexing='ij')
+    r2 = dx ** 2 + dy ** 2
+    r2[grid, grid] = np.inf
+    shape = (sp_fft.next_fast_len(3 * grid - 1),) * 2
+    return sp_fft.fft2(k * k * (dx + 1j * dy) / r2, shape), shape
+
+
+def _repulsion_grid(pos, grid, kernel):
+    from scipy import fft as sp_fft
+
+    # 节点按网格累计质量，斥力场 = 质量分布与斥力核的卷积（FFT），再在节点所在网格取值
+    spectrum, shape = kernel
+    cell = np.minimum((pos * grid).astype(np.int64), grid - 1)
+    mass = np.bincount(cell[:, 0] * grid + cell[:, 1], minlength=grid * grid).reshape(grid, grid).astype(float)
+    field = sp_fft.ifft2(sp_fft.fft2(mass, shape) * spectrum)[grid:2 * grid, grid:2 * grid]
+    value = field[cell[:, 0], cell[:, 1]]
+    return np.column_stack([value.real, value.imag])
+
+
+@metrics.timed
+def force_layout(n, edges, iterations=100, seed=0, gravity=1.0) -> np.ndarray:
+    """
+    Fruchterman–Reingold 力导向布局，坐标在 [0, 1] 内。
+
+    吸引力只沿边计算（O(边数)）；节点数超过 EXACT_REPULSION_NODES 时，斥力用网格上的 FFT 卷积近似
+    （O(节点数 + 网格数 log 网格数)），十万条边的网络也能在数秒内完成。
+    """
+    rng = np.random.default_rng(seed)
+    pos = rng.random((n, 2))
+    if n < 2:
+        return pos
+    k = 1.0 / np.sqrt(n)
+    src, dst = edges[:, 0], edges[:, 1]
+    grid = int(np.clip(np.sqrt(n), 32, 256))
+    kernel = _grid_kernel(k, grid) if n > EXACT_REPULSION_NODES else None
+    for it in range(iterations):
+        pos = _normalize(pos)
+        if n <= EXACT_REPULSION_NODES:
+            disp = _repulsion_exact(pos, k)
+        else:
+            disp = _repulsion_grid(pos, grid, kernel)
+        if len(edges):
+            delta = pos[src] - pos[dst]
+            pull = delta * (np.sqrt((delta ** 2).sum(1)) / k)[:, None]
+            for axis in (0, 1):
+                disp[:, axis] -= np.bincount(src, pull[:, axis], minlength=n)
+                disp[:, axis] += np.bincount(dst, pull[:, axis], minlength=n)
+        # 向中心的引力，避免不连通的部分被推到边缘
+        disp -= gravity * (pos - 0.5)
+        # 温度线性降低，限制每步的位移
+        t = 0.1 * (1 - it / iterations)
+        length = np.maximum(np.sqrt((disp ** 2).sum(1)), 1e-12)
+        pos = pos + disp / length[:, None] * np.minimum(length, t)[:, None]
+    return _normalize(pos)
+
+
+def _normalize(pos, q=0.5):
+    # 按 q% 与 (100 - q)% 分位数缩放到 [0, 1]，个别远离主体的节点（如孤立节点）放在边界上，不压缩整个布局
+    lo, hi = np.percentile(pos, [q, 100 - q], axis=0)
+    return np.clip((pos - lo) / max((hi - lo).max(), 1e-12), 0, 1)
+
+
+def cached_layout(names, edges, iterations=100, cache_dir=LAYOUT_CACHE_DIR) -> np.ndarray:
+    """按网络的哈希缓存 force_layout 的结果（进程内与 cache_dir 下的 .npy 文件）。"""
+    key = f'{graph_hash(names, edges)}-{iterations}'
+    if key in _layouts:
+        return _layouts[key]
+    path = os.path.join(cache_dir, key + '.npy') if cache_dir else None
+    if path and os.path.exists(path):
+        pos = np.load(path)
+    else:
+        seed = int(key[:8], 16)
+        pos = force_layout(len(names), edges, iterations, seed)
+        if path:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp = f'{path}.{os.getpid()}.tmp.npy'
+            np.save(tmp, pos)
+            os.replace(tmp, path)
+    _layouts[key] = pos
+    return pos
+
+
+def tiers(n, edges, rank, sizes=TIER_SIZES) -> list:
+    """
+    按节点的全局顺序分层，返回 [(该层新增节点的下标, 该层新增边的下标)]。
+    一条边在其两端节点都出现的那一层加入，因此各层的节点与边互不重复。
+    """
+    position = np.empty(n, dtype=np.int64)
+    position[rank] = np.arange(n)
+    bounds = [s for s in sizes if s < n] + [n]
+    edge_tier = np.searchsorted(bounds, position[edges].max(1), side='right') if len(edges) else np.empty(0, int)
+    result, start = [], 0
+    for i, end in enumerate(bounds):
+        result.append((rank[start:end], np.flatnonzero(edge_tier == i)))
+        start = end
+    return result
+
+
+@metrics.timed
+def render_network(SD, SD_formula_links, formula, formula_tcm_links, tcm, tcm_chem_links, chem,
+                   chem_protein_links, protein, path, scores=None, iterations=100, cache_dir=LAYOUT_CACHE_DIR):
+    """
+    写入分级网络页面 path/Network.html 及各层数据 path/network/tier_<i>.js。
+
+    Returns:
+        Network.html 的路径。
+    """
+    from pyecharts.globals import CurrentConfig
+
+    nodes = node_table(SD, formula, tcm, chem, protein, scores)
+    edges = edge_array(nodes, SD_formula_links, formula_tcm_links, tcm_chem_links, chem_protein_links)
+    rank = rank_nodes(nodes, edges)
+    pos = cached_layout(nodes['name'].tolist(), edges, iterations, cache_dir)
+
+    n = len(nodes)
+    position = np.empty(n, dtype=np.int64)
+    position[rank] = np.arange(n)
+    names = nodes['name'].values
+    categories = list(CATEGORIES)
+    category = nodes['category'].map({c: i for i, c in enumerate(categories)}).values
+    # 节点大小随顺序由基础大小的 1 倍降到 0.4 倍
+    base = np.array([CATEGORIES[c][2] for c in categories])[category]
+    size = np.round(base * (1 - 0.6 * position / max(n - 1, 1)), 1)
+    xy = np.round(pos * 1000, 1)
+
+    out_dir = os.path.join(path, NETWORK_DIR)
+    os.makedirs(out_dir, exist_ok=True)
+    layers = tiers(n, edges, rank)
+    for i, (tier_nodes, tier_edges) in enumerate(layers):
+        # 边以节点在页面中的序号（即全局顺序）表示
+        payload = {
+            'nodes': [list(row) for row in zip(names[tier_nodes].tolist(), category[tier_nodes].tolist(),
+                                               xy[tier_nodes, 0].tolist(), xy[tier_nodes, 1].tolist(),
+                                               size[tier_nodes].tolist())],
+            'links': position[edges[tier_edges]].tolist(),
+        }
+        with open(os.path.join(out_dir, f'tier_{i}.js'), 'w', encoding='utf-8') as f:
+            f.write(f'loadNetworkTier({i}, {json.dumps(payload, ensure_ascii=False)});\n')
+
+    text_html = open(r'Template/network_template.html', 'r', encoding='utf-8').read()
+    text_html = text_html.replace(
+        'ECHARTS_HOST', CurrentConfig.ONLINE_HOST).replace(
+        'NETWORK_DIR', NETWORK_DIR).replace(
+        'TIER_COUNT', str(len(layers))).replace(
+        'LABEL_NODES', str(LABEL_NODES)).replace(
+        'CATEGORY_LIST', json.dumps([{'name': CATEGORIES[c][0], 'itemStyle': {'color': CATEGORIES[c][1]}}
+                                     for c in categories], ensure_ascii=False))
+    out = os.path.join(path, 'Network.html')
+    with open(out, 'w', encoding='utf-8') as f:
+        f.write(text_html)
+    return out
@@ -1,18 +1,28 @@
+import concurrent.futures
 import json
 import os
+import shutil
 import get
 import textwrap
 import pandas as pd
-from pyecharts import options as opts
-from pyecharts.charts import Sunburst, Tree, Bar, Page, Graph, Pie
+import metrics
+import netvis
+from context import RunContext
 
+# pyecharts 仅在绘图时使用，在各绘图函数内部导入，避免不绘图的调用方承担导入开销
 
-def all_targets_tree(fda_unre, fda_re, clinical_unre, clinical_re):
-    with open('config.json', 'r') as f:
-        config = json.load(f)
+# 靶标树状图与柱状图的输出方式（见 render_target_charts）
+CHART_MODES = ('pages', 'single')
+# single 方式下各靶标图表配置的目录
+TARGET_CHARTS_DIR = 'target_charts'
 
-    disease_name = config['disease_name']
-    reported_number = config['reported_number']
+
+@metrics.timed
+def all_targets_tree(fda_unre, fda_re, clinical_unre, clinical_re, ctx=None):
+    from pyecharts import options as opts
+    from pyecharts.charts import Tree
+
+    ctx = ctx or RunContext.from_config()
 
     fda_all_nmb = len(fda_unre) + len(fda_re)
     cli_all_nmb = len(clinical_unre) + len(clinical_re)
@@ -77,14 +87,14 @@ def all_targets_tree(fda_unre, fda_re, clinical_unre, clinical_re):
         ),
         )
 
-        .render('results/' + disease_name + '/' + "/Targets_tree.html")
+        .render(ctx.path("Targets_tree.html"))
     )
 
 
-# 通过phase将药物进行分类
-def drug_classify(target_name):
-    with open('data\Drug\Target_To_Drug.json', 'r') as f:
-        Target_To_Drug = json.load(f)
+# 通过phase将药物进行分类，Target_To_Drug 为 Data/Drug/Target_To_Drug.json 的内容（逐个靶点调用时由调用方读取一次后传入）
+def drug_classify(target_name, Target_To_Drug=None):
+    if Target_To_Drug is None:
+        Target_To_Drug = get.read_json('Data/Drug/Target_To_Drug.json')
 
     drug_phase = {'Approved': [], 'Clinical_trial': [], 'Others': []}
     drug_ap_cl, drug_ap, drug_cl = [], [], []
@@ -126,11 +136,10 @@ def drug_treetype_data(drugs):
     return drug
 
 
-# 生成每个靶标对应药物的树状图以及柱状图
-def target_tree_bar(symbol, drug_frequency,
-                    drug_ap_not_report, drug_ap_report,
-                    drug_cl_not_report, drug_cl_report,
-                    disease_name, reported_number):
+# 每个靶标树状图与柱状图的数据（可序列化，用于批量绘制）
+def target_chart_data(symbol, drug_frequency,
+                      drug_ap_not_report, drug_ap_report,
+                      drug_cl_not_report, drug_cl_report):
     drug_ap_cl = drug_ap_not_report + drug_ap_report + drug_cl_not_report + drug_cl_report
     drug_not_report = drug_ap_not_report + drug_cl_not_report
     drug_report = drug_ap_report + drug_cl_report
@@ -179,16 +188,28 @@ def target_tree_bar(symbol, drug_frequency,
         }
     ]
 
+    if drug_not_report == []:
+        drug_data = drug_report
+    else:
+        drug_data = drug_not_report
+    return {'symbol': symbol, 'tree': tree_data, 'drugs': drug_data, 'frequency': list(drug_frequency)}
+
+
+# 由 target_chart_data 的结果生成树状图与柱状图
+def target_charts(chart_data):
+    from pyecharts import options as opts
+    from pyecharts.charts import Tree, Bar
+
     tree = (
         Tree(init_opts=opts.InitOpts(width="1600px", height="800px", renderer="svg"))
-        .add("", tree_data, collapse_interval=2,
+        .add("", chart_data['tree'], collapse_interval=2,
              symbol_size=10,
              symbol="emptyCircle",
              #leaves_label_opts=opts.LabelOpts(position="right"),
              itemstyle_opts=opts.ItemStyleOpts(border_width=1, border_color="#48466d"),
              edge_fork_position="100%",
              )
-        .set_global_opts(title_opts=opts.TitleOpts(title=symbol + ' corresponding drugs'))
+        .set_global_opts(title_opts=opts.TitleOpts(title=chart_data['symbol'] + ' corresponding drugs'))
         .set_series_opts(label_opts=opts.LabelOpts(
             font_size=15,
             font_weight='bold',
@@ -196,15 +217,11 @@ def target_tree_bar(symbol, drug_frequency,
         ),
         )
     )
-    if drug_not_report == []:
-        drug_data = drug_report
-    else:
-        drug_data = drug_not_report
 
     bar = (
         Bar(init_opts=opts.InitOpts(width="2000px", height="800px", renderer="svg"))
-        .add_xaxis(drug_data)
-        .add_yaxis("Drug Frequency", drug_frequency, color='#617bdb')
+        .add_xaxis(chart_data['drugs'])
+        .add_yaxis("Drug Frequency", chart_data['frequency'], color='#617bdb')
         .set_global_opts(
             xaxis_opts=opts.AxisOpts(
                 is_show=False,
@@ -232,21 +249,97 @@ def target_tree_bar(symbol, drug_frequency,
         .reversal_axis()
     )
 
-    (
-        Page()
-        .add(tree, bar)
-    ).render(
-        'results/' + disease_name + '/' + symbol + '/' + symbol + '.html'
-    )
+    return tree, bar
+
+
+def _render_target_page(chart_data, path):
+    from pyecharts.charts import Page
+
+    Page().add(*target_charts(chart_data)).render(path)
+    return path
+
+
+# 生成每个靶标对应药物的树状图以及柱状图
+@metrics.timed
+def target_tree_bar(symbol, drug_frequency,
+                    drug_ap_not_report, drug_ap_report,
+                    drug_cl_not_report, drug_cl_report,
+                    disease_name, reported_number, ctx=None):
+    ctx = ctx or RunContext(disease_name=disease_name, reported_number=reported_number)
+
+    chart_data = target_chart_data(symbol, drug_frequency,
+                                   drug_ap_not_report, drug_ap_report,
+                                   drug_cl_not_report, drug_cl_report)
+    _render_target_page(chart_data, ctx.path(symbol, symbol + '.html'))
+
+
+@metrics.timed
+def render_target_charts(charts, ctx=None, mode=None, workers=None, rendered=()):
+    """
+    绘制各靶标的树状图与柱状图。
+
+    Args:
+        charts: target_chart_data 的结果列表。
+        ctx: 运行参数 RunContext。
+        mode: 'pages' 每个靶标一个页面（{symbol}/{symbol}.html），由进程池并行绘制；
+              'single' 只写一个页面 target_charts.html，各靶标的图表配置写入 target_charts/ 并在选中时加载。
+              为 None 时使用 ctx.chart_mode。
+        workers: 进程数，为 None 时使用 ctx.render_workers（0 为 CPU 核数，1 为不使用进程池）。
+        rendered: 本次分析中已绘制的靶标（同一目录中直接靶标与PPI靶标分两次绘制）。'single' 时页面列出
+              rendered 与 charts 中的靶标；rendered 为空时先清空 target_charts/ 中之前运行留下的靶标。
+
+    Returns:
+        生成的 HTML 文件路径列表。
+    """
+    ctx = ctx or RunContext.from_config()
+    mode = mode or ctx.chart_mode
+    if mode not in CHART_MODES:
+        raise ValueError(f"chart mode must be one of {', '.join(CHART_MODES)}")
+    if mode == 'single':
+        return [_render_single_page(charts, ctx, rendered)]
+
+    paths = [ctx.path(c['symbol'], c['symbol'] + '.html') for c in charts]
+    workers = ctx.render_workers if workers is None else workers
+    workers = min(workers or os.cpu_count() or 1, len(charts))
+    # 启动进程的开销约等于绘制几个页面，靶标较少时直接绘制
+    if workers <= 1 or len(charts) < 2 * workers:
+        return [_render_target_page(c, path) for c, path in zip(charts, paths)]
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        return list(executor.map(_render_target_page, charts, paths, chunksize=max(1, len(charts) // (4 * workers))))
+
+
+def _render_single_page(charts, ctx, rendered=()):
+    from pyecharts.globals import CurrentConfig
+
+    if not rendered:
+        shutil.rmtree(os.path.join(ctx.output_dir, TARGET_CHARTS_DIR), ignore_errors=True)
+    for c in charts:
+        tree, bar = target_charts(c)
+        with open(ctx.path(TARGET_CHARTS_DIR, c['symbol'] + '.js'), 'w', encoding='utf-8') as f:
+            f.write(f"showTargetCharts({json.dumps(c['symbol'])}, "
+                    f"{{\"tree\": {tree.dump_options()}, \"bar\": {bar.dump_options()}}});\n")
+
+    # 同一目录中直接靶标与PPI靶标分两次绘制，页面内联的靶标列表只合并本次分析绘制的靶标
+    symbols = list(dict.fromkeys([*rendered, *(c['symbol'] for c in charts)]))
+
+    text_html = open(r'Template/target_charts_template.html', 'r', encoding='utf-8').read()
+    text_html = text_html.replace(
+        'ECHARTS_HOST', CurrentConfig.ONLINE_HOST).replace(
+        'TARGET_LIST', json.dumps(symbols)).replace(
+        'CHARTS_DIR', TARGET_CHARTS_DIR)
+    path = ctx.path('target_charts.html')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text_html)
+    return path
 
 
 # 制作sunburst图
-def get_sunburst(un_relevant_targets_recommend_drug, fa):
-    with open('config.json', 'r') as f:
-        config = json.load(f)
+@metrics.timed
+def get_sunburst(un_relevant_targets_recommend_drug, fa, ctx=None):
+    from pyecharts import options as opts
+    from pyecharts.charts import Sunburst
 
-    disease_name = config['disease_name']
-    reported_number = config['reported_number']
+    ctx = ctx or RunContext.from_config()
 
     data2 = [
         {
@@ -330,7 +423,7 @@ def get_sunburst(un_relevant_targets_recommend_drug, fa):
                                                    font_family='Microsoft YaHei',
                                                    ))
 
-        .render('results/' + disease_name + "/drug_suggestion.html")
+        .render(ctx.path("drug_suggestion.html"))
     )
 
 
@@ -341,40 +434,53 @@ def get_excel(un_relevant_targets_recommend_drug, disease_name, reported_number)
     df.to_excel('results/' + disease_name + "/drug_suggestion.html", index=False)
 
 
-# 生成靶标对应药物的sunburst图和每个靶标对应的药物信息
-def get_sunburst_tree_bar(fda_no_review, ct_no_review, fa, disease, input, Symbol_To_Target, es):
-    with open('config.json', 'r') as f:
-        config = json.load(f)
+# 汇总推荐靶标的全部已批准/临床药物，每个药物只统计一次文献数（disease 为列表时每种疾病一列）
+@metrics.timed
+def drug_evidence_table(symbols, Symbol_To_Target, disease, es, lit=None):
+    Target_To_Drug = get.read_json('Data/Drug/Target_To_Drug.json')
+    drugs = []
+    for symbol in dict.fromkeys(symbols):
+        _, _, drug_ap, drug_cl = drug_classify([*Symbol_To_Target[symbol].keys()][0], Target_To_Drug)
+        drugs += drug_ap + drug_cl
+    return get.get_drug_evidence(drugs, disease, es, lit)
+
 
-    disease_name = config['disease_name']
-    reported_number = config['reported_number']
+# 生成靶标对应药物的sunburst图和每个靶标对应的药物信息
+@metrics.timed
+def get_sunburst_tree_bar(fda_no_review, ct_no_review, fa, disease, input, Symbol_To_Target, es, ctx=None, lit=None,
+                          evidence=None, rendered=()):
+    # rendered: 本次分析中已绘制图表的靶标（见 render_target_charts），返回加上本次绘制的靶标后的列表
+    ctx = ctx or RunContext.from_config()
+    disease_name = ctx.disease_name
+    reported_number = ctx.reported_number
 
     target_not_report = fda_no_review + ct_no_review
     un_relevant_targets_recommend_drug = {}
+    charts = []
+    # 药物的文献数（drug_evidence_table 的结果），未给定时为这些靶标统计一次
+    if evidence is None:
+        evidence = drug_evidence_table(target_not_report, Symbol_To_Target, disease, es, lit)
 
+    Target_To_Drug = get.read_json('Data/Drug/Target_To_Drug.json')
     for symbol in target_not_report:
         target = [*Symbol_To_Target[symbol].keys()][0]
         # print(symbol)
         # 一个靶标对应的药物信息
-        drug_phase, drug_ap_cl, drug_ap, drug_cl = drug_classify(target)
+        drug_phase, drug_ap_cl, drug_ap, drug_cl = drug_classify(target, Target_To_Drug)
 
         (drug_ap_not_report,
          drug_ap_report,
          drug_cl_not_report,  # 需要提供两个关键词 1.疾病的名字 2.命中的数量
-         drug_cl_report) = get.get_drug_report_info(drug_ap, drug_cl, disease, input, es)
+         drug_cl_report) = get.get_drug_report_info(drug_ap, drug_cl, disease, input, es, lit, evidence)
 
         # 药物热度频率
         drug_not_report = drug_ap_not_report + drug_cl_not_report
         drug_report = drug_ap_report + drug_cl_report
-        drug_frequency = get.get_drug_frequency(drug_not_report, drug_report, es)
+        drug_frequency = get.get_drug_frequency(drug_not_report, drug_report, es, evidence)
         if drug_frequency:
-            os.makedirs(
-                'results/' + disease_name + '/' + symbol,
-                exist_ok=True)
-            target_tree_bar(symbol, drug_frequency,
-                            drug_ap_not_report, drug_ap_report,
-                            drug_cl_not_report, drug_cl_report,
-                            disease_name, reported_number)
+            charts.append(target_chart_data(symbol, drug_frequency,
+                                            drug_ap_not_report, drug_ap_report,
+                                            drug_cl_not_report, drug_cl_report))
 
             number_index = drug_frequency.index(max(drug_frequency))
 
@@ -384,20 +490,36 @@ def get_sunburst_tree_bar(fda_no_review, ct_no_review, fa, disease, input, Symbo
                 suggest_drug = drug_not_report[number_index]
             un_relevant_targets_recommend_drug[symbol] = suggest_drug
 
+    # 先收集全部靶标的图表数据，再统一绘制
+    render_target_charts(charts, ctx, rendered=rendered)
+
     # 输出为excel文件
     df = pd.DataFrame(un_relevant_targets_recommend_drug.items(), columns=['Target', 'Recommend Drug'])
-    df.to_excel('results/' + disease_name + "/drug_suggestion.xlsx", index=False)
-    get_sunburst(un_relevant_targets_recommend_drug, fa)
+    df.to_excel(ctx.path("drug_suggestion.xlsx"), index=False)
+    get_sunburst(un_relevant_targets_recommend_drug, fa, ctx)
+    return list(dict.fromkeys([*rendered, *(c['symbol'] for c in charts)]))
+
 
+# 靶标热度：摘要中出现靶标的文献数，与疾病无关，合并为批量查询
+@metrics.timed
+def target_hotness(targets, es, batch_size=100):
+    targets = list(dict.fromkeys(targets))
+    counts = get.msearch_counts(es, [{"query": {"match": {"abstract": target}}} for target in targets], batch_size)
+    return dict(zip(targets, counts))
 
-# 对推荐靶标数量进行控制
-def sort_targets(no_review, target_max_number, es):
+
+# 对推荐靶标数量进行控制，hotness 为 target_hotness 的结果（多种疾病共用）
+@metrics.timed
+def sort_targets(no_review, target_max_number, es, hotness=None):
     # 将靶标和对应文献数量做成列表
     sort_list = []
     for target in no_review:
-        res = es.search(index="abstract22", body={"query": {"match": {"abstract": target}}}, scroll='5m')
-        target_hot = res['hits']['total']['value']
-        es.clear_scroll(scroll_id=res['_scroll_id'])
+        if hotness is not None:
+            target_hot = hotness[target]
+        else:
+            res = es.search(index="abstract22", body={"query": {"match": {"abstract": target}}}, scroll='5m')
+            target_hot = res['hits']['total']['value']
+            es.clear_scroll(scroll_id=res['_scroll_id'])
         sort_list.append([target, target_hot])
 
     # 使用sorted函数对列表进行排序
@@ -418,6 +540,7 @@ def new_targets_list(list, sort_list):
     return new_list
 
 
+@metrics.timed
 def re_name(SD, SD_Formula_Links, formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, protein):
     """
     清洗和重命名数据。
@@ -528,6 +651,7 @@ def re_name(SD, SD_Formula_Links, formula, formula_tcm_links, tcm, tcm_chem_link
             out_tcm_chem, out_chem, out_chem_protein_links, out_gene)
 
 
+@metrics.timed
 def out_for_cyto(SD,
                  SD_Formula_Links,
                  formula,
@@ -563,6 +687,7 @@ def out_for_cyto(SD,
     pd.concat([SD, formula, tcm, chem, protein]).to_csv(os.path.join(path, "Type.csv"), index=False)
 
 
+@metrics.timed
 def vis(SD_df, SD_formula_links_df, formula_df, formula_tcm_links_df, tcm_df, tcm_chem_df, chem_df, chem_pro_df, pro_df,
         path):
     if not os.path.exists(path):
@@ -572,13 +697,24 @@ def vis(SD_df, SD_formula_links_df, formula_df, formula_tcm_links_df, tcm_df, tc
         re_name(SD_df, SD_formula_links_df, formula_df, formula_tcm_links_df, tcm_df, tcm_chem_df, chem_df, chem_pro_df,
                 pro_df)
 
+    # 各类节点的 Importance Score（与 re_name 输出的索引对齐），没有得分的类别按度数排序
+    scores = {attribute: df['Importance Score'] for attribute, df in
+              (('Formula', formula_df), ('TCM', tcm_df), ('Chemicals', chem_df)) if 'Importance Score' in df}
+
     plot_circle(SD, SD_formula_links, formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links,
-                protein, path)
+                protein, path, scores)
+    # 完整网络按重要性分层输出，大型网络也能在浏览器中打开
+    netvis.render_network(SD, SD_formula_links, formula, formula_tcm_links, tcm, tcm_chem_links, chem,
+                          chem_protein_links, protein, path, scores)
     plot_node_category_pie(SD, formula, tcm, chem, protein, path)
 
 
+@metrics.timed
 def plot_circle(SD, SD_formula_links, formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links,
-                protein, path):
+                protein, path, scores=None):
+    from pyecharts import options as opts
+    from pyecharts.charts import Graph
+
     nodes = []
     links = []
 
@@ -590,24 +726,19 @@ def plot_circle(SD, SD_formula_links, formula, formula_tcm_links, tcm, tcm_chem_
         {"name": "方剂", "color": "#749f83"},  # 橄榄绿
     ]
 
-    # 筛选每个类别的前50个节点（如果存在）
-    def get_top_nodes(df, column='Key', top_n=50):
-        """返回前 top_n 个节点（按出现频率或自定义规则）"""
-        return df[column].value_counts().head(top_n).index.tolist()
-
-    top_sd = get_top_nodes(SD)
-    top_formula = get_top_nodes(formula)
-    top_tcm = get_top_nodes(tcm)
-    top_chem = get_top_nodes(chem)
-    top_protein = get_top_nodes(protein)
+    # 筛选每个类别的前50个节点（按 Importance Score，没有得分的类别按度数）
+    all_nodes = netvis.node_table(SD, formula, tcm, chem, protein, scores)
+    ranked = all_nodes.iloc[netvis.rank_nodes(
+        all_nodes, netvis.edge_array(all_nodes, SD_formula_links, formula_tcm_links, tcm_chem_links,
+                                     chem_protein_links))]
 
     # 保存所有筛选后的节点名称（用于后续边的过滤）
-    selected_nodes = set(top_sd + top_formula + top_tcm + top_chem + top_protein)
+    selected_nodes = set(ranked.groupby('category', sort=False).head(50)['name'])
 
     def add_nodes(node_list, id_list, category, symbol_size=20):
         """只添加在筛选列表中的节点"""
         for node_id in id_list:
-            if node_id in selected_nodes:  # 确保节点在筛选范围内
+            if str(node_id) in selected_nodes:  # 确保节点在筛选范围内
                 nodes.append({
                     'name': str(node_id),
                     'symbol_size': symbol_size,
@@ -617,15 +748,15 @@ def plot_circle(SD, SD_formula_links, formula, formula_tcm_links, tcm, tcm_chem_
 
     def add_links(link_df, source_col=0, target_col=1):
         """只添加两端节点都在筛选列表中的边"""
-        for _, row in link_df.iterrows():
-            source = str(row.iloc[source_col])
-            target = str(row.iloc[target_col])
-            if source in selected_nodes and target in selected_nodes:
-                links.append({
-                    'source': source,
-                    'target': target,
-                    'lineStyle': {'opacity': 0.5, 'width': 0.3}
-                })
+        sources = link_df.iloc[:, source_col].astype(str)
+        targets = link_df.iloc[:, target_col].astype(str)
+        keep = sources.isin(selected_nodes) & targets.isin(selected_nodes)
+        for source, target in zip(sources[keep], targets[keep]):
+            links.append({
+                'source': source,
+                'target': target,
+                'lineStyle': {'opacity': 0.5, 'width': 0.3}
+            })
 
     # 添加节点（只保留前50个）
     add_nodes(nodes, SD['Key'].tolist(), category=3, symbol_size=15)  # 辩证
@@ -661,6 +792,7 @@ def plot_circle(SD, SD_formula_links, formula, formula_tcm_links, tcm, tcm_chem_
         .render(path=os.path.join(path, "Circle.html"))
 
 
+@metrics.timed
 def plot_node_category_pie(SD, formula, tcm, chem, pro, path):
     """
     绘制节点类别的交互式饼图（修正配色版）
@@ -671,6 +803,9 @@ def plot_node_category_pie(SD, formula, tcm, chem, pro, path):
     :param pro: 靶点数据集
     :param path: 输出目录
     """
+    from pyecharts import options as opts
+    from pyecharts.charts import Pie
+
     if not os.path.exists(path):
         os.makedirs(path, exist_ok=True)
 
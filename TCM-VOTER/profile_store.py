@@ -0,0 +1,244 @@
+"""
+中药、复方靶点得分的物化存储。
+
+中药、复方对每个靶点的 HerbiV Score（compute.protein_scores 的 1 - ∏(1 - score) 合并）只在 DATA_DIR 中的数据集
+更新时才会变化。本模块离线对整个数据库、若干标准 score 阈值（STANDARD_SCORES）各计算一次，
+以 CSR 的 data / indices / indptr 三个 .npy 文件保存，读取时内存映射（mmap），不必整体读入内存：
+
+    STORE_DIR/<数据版本>/<score>/
+        manifest.json
+        proteins.npy                         列（Ensembl ID）
+        <kind>.data.npy / .indices.npy / .indptr.npy / .ids.npy / .names.npy / .links.npy
+        <kind>_members.data.npy ...          复方 × 中药、中药 × 化合物的组成矩阵（screening 使用）
+
+数据版本由源数据集的文件名、大小与修改时间及 FORMAT_VERSION 计算，数据更新后自动使用新的目录。
+查询时 query_scores 直接切取网络中各实体的行；只有当网络中每个实体的组成（复方的中药、中药的化合物、
+化合物的靶点连接）与全库一致时才使用存储的行，否则返回 None，由 compute.score 重新计算。
+
+离线构建（在 TCM-VOTER 目录下）:
+    python profile_store.py --scores 700 900 990
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+import numpy as np
+import pandas as pd
+
+import compute
+import get
+import metrics
+
+# scipy.sparse 在函数内部导入（与 compute 相同），避免增加 import main 的耗时
+
+# 存储格式版本，修改文件布局时递增
+FORMAT_VERSION = 1
+
+STORE_DIR = 'Data/Cache/profiles'
+
+STANDARD_SCORES = (700, 900, 990)
+
+# 数据版本所依据的数据集
+SOURCES = ('Chemical.xlsx', 'TCM.xlsx', 'Formula.xlsx', 'TCM_Chemical_Links.xlsx', 'Formula_TCM_Links.xlsx',
+           'Chemical_Protein_Links.xlsx')
+
+KINDS = ('chem', 'tcm', 'formula')
+
+# 组成矩阵：上级实体 -> 下级实体
+MEMBERS = {'formula': 'tcm', 'tcm': 'chem'}
+
+# 各实体表中的名称列
+NAME_COLUMNS = {'formula': 'name', 'tcm': 'cn_name', 'chem': 'Name'}
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def data_version() -> str:
+    """DATA_DIR 中源数据集的版本（文件名、大小、修改时间的哈希）。"""
+    h = hashlib.sha1(f'format={FORMAT_VERSION}'.encode())
+    for name in SOURCES:
+        path = os.path.join(get.DATA_DIR, name)
+        stat = os.stat(path) if os.path.exists(path) else None
+        h.update(f'|{name}:{stat and stat.st_size}:{stat and stat.st_mtime_ns}'.encode())
+    return h.hexdigest()[:16]
+
+
+def store_path(score, root=STORE_DIR, version=None) -> str:
+    return os.path.join(root, version or data_version(), str(score))
+
+
+def _save_csr(path, name, m):
+    for part in ('data', 'indices', 'indptr'):
+        np.save(os.path.join(path, f'{name}.{part}.npy'), getattr(m, part))
+
+
+def _load_csr(path, name, shape):
+    from scipy import sparse
+
+    data, indices, indptr = (np.load(os.path.join(path, f'{name}.{part}.npy'), mmap_mode='r')
+                             for part in ('data', 'indices', 'indptr'))
+    return sparse.csr_matrix((data, indices, indptr), shape=shape, copy=False)
+
+
+def _strings(values) -> np.ndarray:
+    # 定长 Unicode 数组可以内存映射（object 数组不能）
+    return np.asarray(pd.Series(values).astype(str).values, dtype=str)
+
+
+@metrics.timed
+def build(scores=STANDARD_SCORES, root=STORE_DIR, dtype=np.float64) -> list:
+    """
+    对 DATA_DIR 中的全部数据，按各 score 阈值计算并保存化合物、中药、复方对每个靶点的得分矩阵。
+
+    Args:
+        scores: Combined_score 阈值（与 main 中各分析函数的 score 相同）。默认为 STANDARD_SCORES。
+        root: 存储目录。默认为 STORE_DIR。
+        dtype: 得分的存储类型。默认为 float64（与 compute.score 的结果完全一致）。
+
+    Returns:
+        各阈值的存储目录。
+    """
+    version = data_version()
+    chem = get.read_data('Chemical.xlsx').drop_duplicates('DNCID')
+    tcm = get.read_data('TCM.xlsx').drop_duplicates('DNHID')
+    formula = get.read_data('Formula.xlsx').drop_duplicates('DNFID')
+    tcm_chem_links = get.read_data('TCM_Chemical_Links.xlsx')
+    formula_tcm_links = get.read_data('Formula_TCM_Links.xlsx')
+    tables = {'chem': chem, 'tcm': tcm, 'formula': formula}
+    members = {
+        'formula': compute._membership(formula, 'DNFID', formula_tcm_links, 'DNFID', 'DNHID', tcm, 'DNHID'),
+        'tcm': compute._membership(tcm, 'DNHID', tcm_chem_links, 'DNHID', 'DNCID', chem, 'DNCID'),
+    }
+
+    paths = []
+    for score in scores:
+        path = store_path(score, root, version)
+        chem_protein_links = get.get_chem_protein_links('DNCID', chem['DNCID'], score)
+        profile = compute.protein_scores(tcm, tcm_chem_links, chem, chem_protein_links, formula, formula_tcm_links,
+                                         dtype)
+        # 各化合物的靶点连接数，用于判断查询网络中的化合物是否包含其全部连接
+        chem_links = (chem_protein_links.drop_duplicates(['DNCID', 'Ensembl_ID']).groupby('DNCID').size()
+                      .reindex(chem['DNCID'].values, fill_value=0).values)
+
+        tmp = f'{path}.tmp-{os.getpid()}'
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        np.save(os.path.join(tmp, 'proteins.npy'), _strings(profile.proteins))
+        manifest = {'format': FORMAT_VERSION, 'version': version, 'score': score, 'dtype': np.dtype(dtype).name,
+                    'proteins': len(profile.proteins), 'shapes': {}}
+        for kind in KINDS:
+            ids, m = profile.matrix(kind)
+            data = tables[kind]
+            _save_csr(tmp, kind, m)
+            np.save(os.path.join(tmp, f'{kind}.ids.npy'), _strings(ids))
+            np.save(os.path.join(tmp, f'{kind}.names.npy'),
+                    _strings(data[NAME_COLUMNS[kind]] if NAME_COLUMNS[kind] in data.columns else ids))
+            links = chem_links if kind == 'chem' else np.diff(members[kind].indptr)
+            np.save(os.path.join(tmp, f'{kind}.links.npy'), np.asarray(links, dtype=np.int64))
+            manifest['shapes'][kind] = list(m.shape)
+        for kind, m in members.items():
+            _save_csr(tmp, f'{kind}_members', m.tocsr())
+            manifest['shapes'][f'{kind}_members'] = list(m.shape)
+        with open(os.path.join(tmp, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp, path)
+        paths.append(path)
+    return paths
+
+
+class Store:
+    """一个阈值下的物化得分矩阵（内存映射）。"""
+
+    def __init__(self, path):
+        with open(os.path.join(path, 'manifest.json')) as f:
+            self.manifest = json.load(f)
+        shapes = self.manifest['shapes']
+        self.path = path
+        self.proteins = pd.Index(np.load(os.path.join(path, 'proteins.npy')), name='Ensembl_ID')
+        self.matrices = {kind: _load_csr(path, kind, tuple(shapes[kind])) for kind in KINDS}
+        self.members = {kind: _load_csr(path, f'{kind}_members', tuple(shapes[f'{kind}_members']))
+                        for kind in MEMBERS}
+        self.ids = {kind: np.load(os.path.join(path, f'{kind}.ids.npy'), mmap_mode='r') for kind in KINDS}
+        self.names = {kind: np.load(os.path.join(path, f'{kind}.names.npy'), mmap_mode='r') for kind in KINDS}
+        self.links = {kind: np.load(os.path.join(path, f'{kind}.links.npy'), mmap_mode='r') for kind in KINDS}
+        self.index = {kind: pd.Index(self.ids[kind]) for kind in KINDS}
+
+    def rows(self, kind, ids) -> np.ndarray:
+        """ids 在存储中的行号，不存在的为 -1。"""
+        return self.index[kind].get_indexer(pd.Index(ids).astype(str))
+
+
+def open_store(score, root=STORE_DIR):
+    """打开当前数据版本下阈值为 score 的存储（同一目录在进程内只打开一次），不存在时返回 None。"""
+    path = store_path(score, root)
+    if not os.path.exists(os.path.join(path, 'manifest.json')):
+        return None
+    key = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = Store(path)
+    return store
+
+
+def _complete(counts, rows, links):
+    # 查询网络中每个实体的组成数与全库一致（且实体在存储中）
+    return bool(np.all(rows >= 0)) and np.array_equal(np.asarray(counts), np.asarray(links)[rows])
+
+
+@metrics.timed
+def query_scores(tcm, tcm_chem_links, chem, chem_protein_links, formula=None, formula_tcm_links=None, score=900,
+                 root=STORE_DIR):
+    """
+    从存储中切取查询网络中各实体的得分行，结果可直接传给 compute.score / compute.score_sparse 的 scores 参数。
+
+    Args:
+        与 compute.score 相同；score 为 chem_protein_links 所用的 Combined_score 阈值。
+
+    Returns:
+        compute.ProteinScores（行与输入表一致，列与 compute.protein_scores 相同），
+        存储不存在或网络中有实体的组成不完整时返回 None。
+    """
+    store = open_store(score, root)
+    if store is None:
+        return None
+
+    links = chem_protein_links.drop_duplicates(['DNCID', 'Ensembl_ID'])
+    tables = {'chem': (chem, links.groupby('DNCID').size().reindex(chem['DNCID'].values, fill_value=0).values),
+              'tcm': (tcm, _member_counts(tcm, 'DNHID', tcm_chem_links, chem, 'DNCID'))}
+    if formula is not None:
+        tables['formula'] = (formula, _member_counts(formula, 'DNFID', formula_tcm_links, tcm, 'DNHID'))
+
+    proteins = pd.Index(chem_protein_links['Ensembl_ID'].unique())
+    columns = store.proteins.get_indexer(proteins.astype(str))
+    if np.any(columns < 0):
+        return None
+    matrices = {}
+    for kind, (data, counts) in tables.items():
+        ids = data[compute.ProteinScores.ID_COLUMNS[kind]].values
+        rows = store.rows(kind, ids)
+        if not _complete(counts, rows, store.links[kind]):
+            return None
+        matrices[kind] = (ids, store.matrices[kind][rows][:, columns].astype(float))
+    return compute.ProteinScores(proteins, matrices)
+
+
+def _member_counts(rows, row_col, links, items, item_col):
+    """rows 中每个实体在 links 中、且下级实体在 items 中的不同下级实体数。"""
+    pairs = links[[row_col, item_col]].drop_duplicates()
+    pairs = pairs.loc[pairs[item_col].isin(items[item_col])]
+    return pairs.groupby(row_col).size().reindex(rows[row_col].values, fill_value=0).values
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Materialise herb/formula protein score matrices')
+    parser.add_argument('--scores', type=int, nargs='+', default=list(STANDARD_SCORES))
+    parser.add_argument('--root', default=STORE_DIR)
+    args = parser.parse_args()
+    for out in build(args.scores, args.root):
+        print(out)
@@ -1,7 +1,22 @@
+import json
+import os
+import threading
+import numpy as np
 import pandas as pd
 from datetime import datetime
+import get
+import metrics
 
+# scipy.sparse 在函数内部导入（与 compute 相同），避免增加 import main 的耗时
 
+# 中药毒性程度对应的严重程度（0~1），方剂、成分、靶点的毒性记录按 1.0 计
+TOXICITY_DEGREE = {'小毒': 1 / 3, '有毒': 2 / 3, '大毒': 1.0}
+
+_index_cache = {}
+_index_lock = threading.Lock()
+
+
+@metrics.timed
 def read_toxicity_data():
     """
     从Excel读取毒性数据
@@ -14,10 +29,10 @@ def read_toxicity_data():
 
     try:
         # 读取各表格数据
-        targets_df = pd.read_excel("Data/Toxicity/靶点.xlsx")
-        chem_df = pd.read_excel("Data/Toxicity/成分.xlsx")
-        formula_df = pd.read_excel("Data/Toxicity/方剂.xlsx")
-        herb_df = pd.read_excel("Data/Toxicity/中药.xlsx")
+        targets_df = get.read_table("Data/Toxicity/靶点.xlsx")
+        chem_df = get.read_table("Data/Toxicity/成分.xlsx")
+        formula_df = get.read_table("Data/Toxicity/方剂.xlsx")
+        herb_df = get.read_table("Data/Toxicity/中药.xlsx")
 
         print("数据读取成功！")
         return targets_df, chem_df, formula_df, herb_df
@@ -27,121 +42,461 @@ def read_toxicity_data():
         return None, None, None, None
 
 
+def _with_ids(df, ids_path, on, id_col):
+    """从带有数据集ID的毒性表（如 TCM_Toxicity.xlsx）中补充ID列，一个名称可能对应多个ID。"""
+    try:
+        ids = get.read_table(ids_path)[[on, id_col]].dropna().drop_duplicates()
+    except FileNotFoundError:
+        return df.assign(**{id_col: np.nan})
+    return df.merge(ids, on=on, how='left')
+
+
+# 毒性索引所依据的数据文件（相对于当前工作目录）
+TOXICITY_SOURCES = ("Data/Toxicity/靶点.xlsx", "Data/Toxicity/成分.xlsx", "Data/Toxicity/方剂.xlsx",
+                    "Data/Toxicity/中药.xlsx", "Data/Toxicity/TCM_Toxicity.xlsx",
+                    "Data/Toxicity/Protein_Toxicity.xlsx")
+
+
+def _sources_key():
+    # 与 get._load 相同，以各数据文件的 (路径, 修改时间) 判断索引是否过期，不存在的文件记为 None
+    return tuple((os.path.abspath(p), os.path.getmtime(p) if os.path.exists(p) else None)
+                 for p in TOXICITY_SOURCES)
+
+
+@metrics.timed
+def load_toxicity_index():
+    """
+    读取毒性数据并建立毒性索引，开启缓存（get.CACHE）且数据文件未修改时重复调用直接返回已建立的索引
+
+    返回:
+        字典 {'formula', 'herb', 'chemical', 'protein'}，值为对应的毒性记录DataFrame，
+        均增加 severity 列（0~1）；herb 增加数据集ID列 DNHID，protein 增加 Ensembl_ID，
+        可分别按ID或名称匹配；'effects' 为 parse_effects() 拆分的方剂、中药毒性效应长表
+    """
+    key = _sources_key()
+    if get.CACHE:
+        with _index_lock:
+            if key in _index_cache:
+                return _index_cache[key]
+
+    targets_df, chem_df, formula_df, herb_df = read_toxicity_data()
+    if targets_df is None:
+        raise FileNotFoundError('Data/Toxicity 中的毒性数据读取失败')
+
+    herb = _with_ids(herb_df, "Data/Toxicity/TCM_Toxicity.xlsx", 'herb_name', 'DNHID')
+    herb['severity'] = herb['toxicity_degree'].map(TOXICITY_DEGREE).fillna(TOXICITY_DEGREE['有毒'])
+    protein = _with_ids(targets_df, "Data/Toxicity/Protein_Toxicity.xlsx", 'target_id', 'Ensembl_ID')
+    index = {
+        'formula': formula_df.assign(severity=1.0),
+        'herb': herb,
+        'chemical': chem_df.assign(severity=1.0),
+        'protein': protein.assign(severity=1.0),
+        # 毒性效应在建立索引时一次拆分为长表，供报告统计使用
+        'effects': pd.concat([parse_effects(formula_df['toxicity_effect'], formula_df['formula_name'], 'formula'),
+                              parse_effects(herb_df['toxic_effect'], herb_df['herb_name'], 'herb')],
+                             ignore_index=True),
+    }
+
+    with _index_lock:
+        if get.CACHE:
+            _index_cache.clear()
+            _index_cache[key] = index
+    return index
+
+
+# 各实体表与毒性索引的匹配方式: (索引键, [(实体表列, 毒性记录列), ...])
+TOXICITY_KEYS = {
+    'formula': ('formula', [('name', 'formula_name')]),
+    'tcm': ('herb', [('DNHID', 'DNHID'), ('cn_name', 'herb_name')]),
+    'chem': ('chemical', [('Name', 'component_name'), ('Name', 'component_name_en')]),
+    'protein': ('protein', [('Ensembl_ID', 'Ensembl_ID'), ('gene_name', 'gene_symbol')]),
+}
+
+
+def direct_toxicity(df, kind, index=None) -> np.ndarray:
+    """
+    计算实体自身的毒性严重程度（按ID或名称匹配毒性索引，取最大值）
+
+    参数:
+        df: 实体DataFrame（formula、tcm、chem 或 protein）
+        kind: 'formula'、'tcm'、'chem' 或 'protein'
+        index: load_toxicity_index() 返回的索引，为 None 时自动读取
+
+    返回:
+        与 df 行对应的严重程度数组，无毒性记录为 0
+    """
+    index = load_toxicity_index() if index is None else index
+    key, pairs = TOXICITY_KEYS[kind]
+    tox = index[key]
+    severity = np.zeros(len(df))
+    for col, tox_col in pairs:
+        if col not in df.columns or tox_col not in tox.columns:
+            continue
+        lookup = tox.dropna(subset=[tox_col]).groupby(tox_col)['severity'].max()
+        severity = np.maximum(severity, df[col].map(lookup).fillna(0).to_numpy(dtype=float))
+    return severity
+
+
+def _incidence(links, src_col, dst_col, src, dst, weight=None):
+    """由连接表构建 len(src) x len(dst) 的稀疏关联矩阵，weight 为边权重列（缺省为1）。"""
+    from scipy import sparse
+
+    rows = pd.Index(src).get_indexer(links[src_col])
+    cols = pd.Index(dst).get_indexer(links[dst_col])
+    keep = (rows >= 0) & (cols >= 0)
+    data = np.ones(keep.sum()) if weight is None else links[weight].to_numpy(dtype=float)[keep]
+    m = sparse.csr_matrix((data, (rows[keep], cols[keep])), shape=(len(src), len(dst)))
+    m.sum_duplicates()
+    if weight is None:
+        m.data[:] = 1.0
+    else:
+        m.data = np.minimum(m.data, 1.0)
+    return m
+
+
+def _binary(m):
+    """将稀疏矩阵的非零元素置为1。"""
+    m = m.tocsr()
+    m.eliminate_zeros()
+    m.data = np.ones_like(m.data)
+    return m
+
+
+def _propagate(direct, m, child, decay):
+    """毒性沿关联矩阵向上传递：e = 1 - (1 - direct) * prod(1 - decay * w * child)（noisy-OR）。"""
+    with np.errstate(divide='ignore'):
+        log_safe = (m.multiply(-decay * child[np.newaxis, :])).tocsr().log1p().sum(axis=1).A1
+    return 1 - (1 - direct) * np.exp(log_safe)
+
+
+@metrics.timed
+def toxicity_exposure(formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins,
+                      index=None, decay=0.5):
+    """
+    沿 复方→中药→成分→靶点 网络传递毒性，计算各实体的毒性暴露得分
+
+    靶点的暴露得分为其自身毒性；成分、中药、复方的暴露得分由自身毒性与下一层实体的暴露得分按 noisy-OR 合并，
+    每经过一层乘以 decay，成分-靶点连接再乘以 Combined_score（get.get_chem_protein_links 已变换为 0~1）。全部计算为稀疏矩阵运算，
+    可一次筛查大量复方。
+
+    参数:
+        formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins: 网络各表
+        index: load_toxicity_index() 返回的索引，为 None 时自动读取
+        decay: 每层的衰减系数
+
+    返回:
+        formula, tcm, chem, proteins: 增加 'Toxicity Severity'（自身毒性）、'Toxicity Exposure'（暴露得分）、
+        'Toxic Targets'（可到达的有毒靶点数）三列的副本
+    """
+    index = load_toxicity_index() if index is None else index
+    if formula is None:
+        formula_tcm_links = pd.DataFrame(columns=['DNFID', 'DNHID'])
+
+    # 实体表中可能有重复ID，传递在去重后的ID上进行，结果再按ID映射回各行
+    def direct(df, kind, id_col):
+        if df is None:
+            return pd.Series(dtype=float)
+        s = pd.Series(direct_toxicity(df, kind, index), index=df[id_col].to_numpy())
+        return s.groupby(level=0, sort=False).max()
+
+    s_f, s_h = direct(formula, 'formula', 'DNFID'), direct(tcm, 'tcm', 'DNHID')
+    s_c, s_p = direct(chem, 'chem', 'DNCID'), direct(proteins, 'protein', 'Ensembl_ID')
+
+    fh = _incidence(formula_tcm_links, 'DNFID', 'DNHID', s_f.index, s_h.index)
+    hc = _incidence(tcm_chem_links, 'DNHID', 'DNCID', s_h.index, s_c.index)
+    cp_weight = 'Combined_score' if 'Combined_score' in chem_protein_links.columns else None
+    cp = _incidence(chem_protein_links, 'DNCID', 'Ensembl_ID', s_c.index, s_p.index, cp_weight)
+
+    e_p = s_p.to_numpy()
+    e_c = _propagate(s_c.to_numpy(), cp, e_p, decay)
+    e_h = _propagate(s_h.to_numpy(), hc, e_c, decay)
+    e_f = _propagate(s_f.to_numpy(), fh, e_h, decay)
+
+    # 可到达的有毒靶点数：只保留有毒靶点所在的列，再做关联矩阵的布尔乘积
+    toxic_p = e_p > 0
+    reach_c = _binary(cp[:, toxic_p])
+    reach_h = _binary(hc @ reach_c)
+    reach_f = _binary(fh @ reach_h)
+    ones = np.ones(toxic_p.sum())
+
+    def assign(df, id_col, s, e, n_toxic):
+        if df is None:
+            return None
+        df = df.copy()
+        ids = df[id_col]
+        df['Toxicity Severity'] = ids.map(s).to_numpy()
+        df['Toxicity Exposure'] = ids.map(pd.Series(e, index=s.index)).to_numpy()
+        df['Toxic Targets'] = ids.map(pd.Series(n_toxic, index=s.index)).to_numpy().astype(int)
+        return df
+
+    proteins = assign(proteins, 'Ensembl_ID', s_p, e_p, toxic_p)
+    chem = assign(chem, 'DNCID', s_c, e_c, reach_c @ ones)
+    tcm = assign(tcm, 'DNHID', s_h, e_h, reach_h @ ones)
+    formula = assign(formula, 'DNFID', s_f, e_f, reach_f @ ones)
+    return formula, tcm, chem, proteins
+
+
+# 报告各部分: (键, 标题, 无记录时的说明, 字段)，字段为 (标签, 列, 括号内的列)
+REPORT_SECTIONS = [
+    ('formula', '有毒方剂汇总', '未发现有毒方剂记录', [
+        ('方剂名称', 'formula_name', 'formula_name_pinyin'),
+        ('剂型', 'dosage_form', None),
+        ('毒性效应', 'toxicity_effect', None),
+        ('英文毒性效应', 'toxicity_effect_en', None)]),
+    ('herb', '有毒中药汇总', '未发现有毒中药记录', [
+        ('中药名称', 'herb_name', 'herb_name_pinyin'),
+        ('拉丁名', 'herb_name_latin', None),
+        ('毒性程度', 'toxicity_degree', 'toxicity_degree_en'),
+        ('功效', 'action', 'action_en'),
+        ('毒性效应', 'toxic_effect', None),
+        ('英文毒性效应', 'toxic_effect_en', None)]),
+    ('chemical', '有毒成分汇总', '未发现有毒成分记录', [
+        ('成分名称', 'component_name', 'component_name_en'),
+        ('分类', 'ingredient_classification', 'ingredient_classification_en'),
+        ('分子量', 'molecular_weight', None),
+        ('分子式', 'molecular_formula', None),
+        ('CAS号', 'CAS', None)]),
+    ('protein', '有毒靶点汇总', '未发现有毒靶点记录', [
+        ('基因符号', 'gene_symbol', None),
+        ('基因全名', 'gene_full_name', None),
+        ('Uniprot ID', 'UniprotID', None),
+        ('毒性类型', 'TCMSTD_Target', 'TCMSTD_Target_cn')]),
+]
+
+# 间接毒性暴露部分: (键, 实体名称, 名称列)
+EXPOSURE_SECTIONS = [('formula', '方剂', 'name'), ('tcm', '中药', 'cn_name'), ('chem', '成分', 'Name')]
+
+# 每次写出的行数，报告按块流式写出，内存占用与报告大小无关
+CHUNK_ROWS = 2000
+
+
+def parse_effects(effects, names, entity) -> pd.DataFrame:
+    """
+    将毒性效应字符串（如 "人: 肝毒性[1-2]||其它毒副反应[3];大鼠: 肾毒性[4]"）拆分为长表
+
+    参数:
+        effects: 毒性效应字符串Series
+        names: 与 effects 对应的实体名称
+        entity: 实体类型，如 'formula'、'herb'
+
+    返回:
+        DataFrame，列为 entity, name, species, effect, refs，每条记录为一次毒性提及
+    """
+    s = pd.Series(np.asarray(effects, dtype=object), index=pd.Index(np.asarray(names, dtype=object), name='name'))
+    s = s.dropna().astype(str).str.replace('：', ':', regex=False)
+    groups = s.str.split(';').explode().str.strip()
+    groups = groups[groups != '']
+    parts = groups.str.partition(':')
+    has_species = parts[1] == ':'
+    species = parts[0].where(has_species, '').str.strip()
+    items = parts[2].where(has_species, parts[0]).str.split(r'\|\|', regex=True)
+    long = pd.DataFrame({'species': species, 'effect': items}).explode('effect')
+    long['effect'] = long['effect'].str.strip()
+    long = long[long['effect'] != '']
+    long['refs'] = long['effect'].str.findall(r'\[([^\]]*)\]').str.join(',')
+    long['effect'] = long['effect'].str.replace(r'\[.*$', '', regex=True).str.strip()
+    long = long.reset_index()
+    long.insert(0, 'entity', entity)
+    return long[['entity', 'name', 'species', 'effect', 'refs']]
+
+
+def toxicity_type_counts(toxic_formula, toxic_herb, toxic_protein, effects=None) -> pd.Series:
+    """
+    统计有毒方剂、中药的毒性效应与有毒靶点的毒性类型的提及次数
+
+    返回:
+        以毒性类型为索引、提及次数为值的Series，按次数降序排列
+    """
+    effects = load_toxicity_index()['effects'] if effects is None else effects
+    mentioned = effects[((effects['entity'] == 'formula') & effects['name'].isin(toxic_formula['formula_name'])) |
+                        ((effects['entity'] == 'herb') & effects['name'].isin(toxic_herb['herb_name']))]
+    types = pd.concat([mentioned['effect'], toxic_protein['TCMSTD_Target_cn'].dropna().astype(str)],
+                      ignore_index=True)
+    return types.value_counts()
+
+
+def _chunks(df):
+    for start in range(0, len(df), CHUNK_ROWS):
+        yield df.iloc[start:start + CHUNK_ROWS]
+
+
+def _text(df, col):
+    """列转为字符串（缺失值为 'nan'，与 f-string 一致）。"""
+    if col not in df.columns:
+        return pd.Series('nan', index=df.index, dtype=object)
+    return pd.Series([str(v) for v in df[col].to_numpy()], index=df.index, dtype=object)
+
+
+class TextRenderer:
+    """纯文本报告。"""
+
+    def __init__(self, f):
+        self.f = f
+
+    def begin(self, title, date):
+        self.f.write(f"{title}\n生成日期: {date}\n\n" + "=" * 50 + "\n")
+
+    def section(self, number, title, df, fields, empty):
+        self.f.write(f"{number}. {title}:\n")
+        if df.empty:
+            self.f.write(f"{empty}\n\n")
+            return
+        for chunk in _chunks(df):
+            lines = None
+            for i, (label, col, paren) in enumerate(fields):
+                line = ('- ' if i == 0 else '  ') + f"{label}: " + _text(chunk, col)
+                if paren is not None:
+                    line = line + ' (' + _text(chunk, paren) + ')'
+                lines = line if lines is None else lines + '\n' + line
+            self.f.writelines(lines + '\n\n')
+
+    def counts(self, number, title, counts, empty):
+        self.f.write(f"{number}. {title}:\n")
+        if counts.empty:
+            self.f.write(f"{empty}\n")
+            return
+        df = counts.rename_axis('type').reset_index(name='count')
+        self.f.writelines('- ' + _text(df, 'type') + ': ' + _text(df, 'count') + '次提及\n')
+
+    def end(self):
+        pass
+
+
+def _escape(s):
+    return (s.str.replace('&', '&amp;', regex=False).str.replace('<', '&lt;', regex=False)
+            .str.replace('>', '&gt;', regex=False))
+
+
+class HTMLRenderer:
+    """HTML报告，每部分为一个表格。"""
+
+    def __init__(self, f):
+        self.f = f
+
+    def begin(self, title, date):
+        self.f.write(f'<!DOCTYPE html>\n<html lang="zh">\n<head><meta charset="utf-8"><title>{title}</title></head>\n'
+                     f'<body>\n<h1>{title}</h1>\n<p>生成日期: {date}</p>\n')
+
+    def _table(self, number, title, df, columns, empty):
+        self.f.write(f'<h2>{number}. {title}</h2>\n')
+        if df.empty:
+            self.f.write(f'<p>{empty}</p>\n')
+            return
+        self.f.write('<table border="1">\n<tr>' + ''.join(f'<th>{label}</th>' for label, _ in columns) + '</tr>\n')
+        for chunk in _chunks(df):
+            rows = '<tr>'
+            for _, cells in columns:
+                rows = rows + '<td>' + _escape(cells(chunk)) + '</td>'
+            self.f.writelines(rows + '</tr>\n')
+        self.f.write('</table>\n')
+
+    def section(self, number, title, df, fields, empty):
+        columns = [(label, lambda c, col=col, paren=paren: _text(c, col) if paren is None
+                    else _text(c, col) + ' (' + _text(c, paren) + ')') for label, col, paren in fields]
+        self._table(number, title, df, columns, empty)
+
+    def counts(self, number, title, counts, empty):
+        df = counts.rename_axis('type').reset_index(name='count')
+        self._table(number, title, df, [('毒性类型', lambda c: _text(c, 'type')),
+                                        ('提及次数', lambda c: _text(c, 'count'))], empty)
+
+    def end(self):
+        self.f.write('</body>\n</html>\n')
+
+
+class JSONRenderer:
+    """JSON报告，{"title", "date", "sections": [{"title", "records"}, ...]}，按块流式写出。"""
+
+    def __init__(self, f):
+        self.f = f
+        self.first = True
+
+    def begin(self, title, date):
+        self.f.write(f'{{"title": {json.dumps(title, ensure_ascii=False)}, "date": "{date}", "sections": [')
+
+    def _records(self, number, title, df):
+        self.f.write(('' if self.first else ', ') + f'{{"number": {number}, '
+                     f'"title": {json.dumps(title, ensure_ascii=False)}, "records": [')
+        self.first = False
+        for i, chunk in enumerate(_chunks(df)):
+            self.f.write(('' if i == 0 else ', ') + chunk.to_json(orient='records', force_ascii=False)[1:-1])
+        self.f.write(']}')
+
+    def section(self, number, title, df, fields, empty):
+        columns = [c for _, col, paren in fields for c in (col, paren) if c is not None and c in df.columns]
+        self._records(number, title, df[columns])
+
+    def counts(self, number, title, counts, empty):
+        self._records(number, title, counts.rename_axis('type').reset_index(name='count'))
+
+    def end(self):
+        self.f.write(']}\n')
+
+
+RENDERERS = {'txt': TextRenderer, 'html': HTMLRenderer, 'json': JSONRenderer}
+
+
+@metrics.timed
 def generate_toxicity_report(toxic_formula, toxic_herb, toxic_chemical, toxic_protein,
-                             output_file="results/toxicity_report.txt"):
+                             output_file="results/toxicity_report.txt", fmt=None, exposure=None, effects=None):
     """
-    生成毒性报告
+    生成毒性报告，各部分按块流式写入文件
 
     参数:
-        toxic_targets_df: 有毒靶点DataFrame
-        toxic_chem_df: 有毒成分DataFrame
-        toxic_formula_df: 有毒方剂DataFrame
-        toxic_herb_df: 有毒中药DataFrame
+        toxic_formula: 有毒方剂DataFrame
+        toxic_herb: 有毒中药DataFrame
+        toxic_chemical: 有毒成分DataFrame
+        toxic_protein: 有毒靶点DataFrame
         output_file: 输出报告文件名
+        fmt: 'txt'、'html' 或 'json'，默认根据 output_file 的后缀判断
+        exposure: 可选，{'formula': df, 'tcm': df, 'chem': df}，为 toxicity_exposure() 的结果，
+                  其中暴露得分大于 0 但本身没有毒性记录的实体列入“间接毒性暴露”部分
+        effects: 毒性效应长表，默认取毒性索引中的 effects
 
     返回:
-        生成文本报告文件
-    """
-    # 获取当前日期
-    current_date = datetime.now().strftime("%Y-%m-%d")
-
-    # 初始化报告内容
-    report_content = f"中药毒性分析报告\n生成日期: {current_date}\n\n"
-    report_content += "=" * 50 + "\n"
-
-    # 1. 有毒方剂汇总
-    report_content += "1. 有毒方剂汇总:\n"
-    if not toxic_formula.empty:
-        for _, row in toxic_formula.iterrows():
-            report_content += f"- 方剂名称: {row['formula_name']} ({row['formula_name_pinyin']})\n"
-            report_content += f"  剂型: {row['dosage_form']}\n"
-            report_content += f"  毒性效应: {row['toxicity_effect']}\n"
-            report_content += f"  英文毒性效应: {row['toxicity_effect_en']}\n\n"
-    else:
-        report_content += "未发现有毒方剂记录\n\n"
-
-    # 2. 有毒中药汇总
-    report_content += "2. 有毒中药汇总:\n"
-    if not toxic_herb.empty:
-        for _, row in toxic_herb.iterrows():
-            report_content += f"- 中药名称: {row['herb_name']} ({row['herb_name_pinyin']})\n"
-            report_content += f"  拉丁名: {row['herb_name_latin']}\n"
-            report_content += f"  毒性程度: {row['toxicity_degree']} ({row['toxicity_degree_en']})\n"
-            report_content += f"  功效: {row['action']} ({row['action_en']})\n"
-            report_content += f"  毒性效应: {row['toxic_effect']}\n"
-            report_content += f"  英文毒性效应: {row['toxic_effect_en']}\n\n"
-    else:
-        report_content += "未发现有毒中药记录\n\n"
-
-    # 3. 有毒成分汇总
-    report_content += "3. 有毒成分汇总:\n"
-    if not toxic_chemical.empty:
-        for _, row in toxic_chemical.iterrows():
-            report_content += f"- 成分名称: {row['component_name']} ({row['component_name_en']})\n"
-            report_content += f"  分类: {row['ingredient_classification']} ({row['ingredient_classification_en']})\n"
-            report_content += f"  分子量: {row['molecular_weight']}\n"
-            report_content += f"  分子式: {row['molecular_formula']}\n"
-            report_content += f"  CAS号: {row['CAS']}\n\n"
-    else:
-        report_content += "未发现有毒成分记录\n\n"
-
-    # 4. 有毒靶点汇总
-    report_content += "4. 有毒靶点汇总:\n"
-    if not toxic_protein.empty:
-        for _, row in toxic_protein.iterrows():
-            report_content += f"- 基因符号: {row['gene_symbol']}\n"
-            report_content += f"  基因全名: {row['gene_full_name']}\n"
-            report_content += f"  Uniprot ID: {row['UniprotID']}\n"
-            report_content += f"  毒性类型: {row['TCMSTD_Target']} ({row['TCMSTD_Target_cn']})\n\n"
-    else:
-        report_content += "未发现有毒靶点记录\n\n"
-
-    # 5. 毒性类型统计
-    report_content += "5. 毒性类型统计:\n"
-
-    # 从方剂中提取毒性类型
-    formula_toxicity = []
-    if not toxic_formula.empty:
-        for effect in toxic_formula['toxicity_effect']:
-            parts = effect.split("||")
-            for part in parts:
-                if ":" in part:
-                    tox_type = part.split(":")[1].strip()
-                    formula_toxicity.append(tox_type.split("[")[0].strip())
-
-    # 从中药中提取毒性类型
-    herb_toxicity = []
-    if not toxic_herb.empty:
-        for effect in toxic_herb['toxic_effect']:
-            parts = effect.split("||")
-            for part in parts:
-                if ":" in part:
-                    tox_type = part.split(":")[1].strip()
-                    herb_toxicity.append(tox_type.split("[")[0].strip())
-
-    # 从靶点中提取毒性类型
-    target_toxicity = []
-    if not toxic_protein.empty:
-        target_toxicity = toxic_protein['TCMSTD_Target_cn'].tolist()
-
-    # 合并所有毒性类型
-    all_toxicity = formula_toxicity + herb_toxicity + target_toxicity
-
-    # 统计毒性类型
-    if all_toxicity:
-        toxicity_counts = pd.Series(all_toxicity).value_counts()
-        for tox_type, count in toxicity_counts.items():
-            report_content += f"- {tox_type}: {count}次提及\n"
-    else:
-        report_content += "未发现毒性类型记录\n"
+        生成报告文件
+    """
+    if fmt is None:
+        fmt = os.path.splitext(output_file)[1].lstrip('.').lower()
+        fmt = fmt if fmt in RENDERERS else 'txt'
+    tables = {'formula': toxic_formula, 'herb': toxic_herb, 'chemical': toxic_chemical, 'protein': toxic_protein}
+
+    directory = os.path.dirname(output_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
 
-    # 写入报告文件
     with open(output_file, "w", encoding="utf-8") as f:
-        f.write(report_content)
+        renderer = RENDERERS[fmt](f)
+        renderer.begin("中药毒性分析报告", datetime.now().strftime("%Y-%m-%d"))
+
+        number = 0
+        for key, title, empty, fields in REPORT_SECTIONS:
+            number += 1
+            renderer.section(number, title, tables[key], fields, empty)
+
+        number += 1
+        renderer.counts(number, "毒性类型统计",
+                        toxicity_type_counts(toxic_formula, toxic_herb, toxic_protein, effects), "未发现毒性类型记录")
+
+        if exposure is not None:
+            for key, label, name_col in EXPOSURE_SECTIONS:
+                df = exposure.get(key)
+                if df is None or 'Toxicity Exposure' not in df.columns:
+                    continue
+                number += 1
+                indirect = df[(df['Toxicity Exposure'] > 0) & (df['Toxicity Severity'] == 0)]
+                indirect = indirect.sort_values('Toxicity Exposure', ascending=False).copy()
+                indirect['Toxicity Exposure'] = indirect['Toxicity Exposure'].round(4)
+                renderer.section(number, f"{label}间接毒性暴露", indirect,
+                                 [(f'{label}名称', name_col, None), ('暴露得分', 'Toxicity Exposure', None),
+                                  ('可到达的有毒靶点数', 'Toxic Targets', None)], f"未发现间接毒性暴露的{label}")
+
+        renderer.end()
 
     print(f"毒性报告已生成: {output_file}")
 
 
+@metrics.timed
 def filter_toxic_data(targets_df, chem_df, formula_df, herb_df):
     """
     筛选有毒数据
@@ -155,19 +510,22 @@ def filter_toxic_data(targets_df, chem_df, formula_df, herb_df):
     返回:
         四个DataFrame: (toxic_targets, toxic_chem, toxic_formula, toxic_herb)
     """
-    targets_toxicity, chem_toxicity, formula_toxicity, herb_toxicity = read_toxicity_data()
-
-    toxic_formula_mask = formula_toxicity['formula_name'].isin(formula_df['name'])
-    toxic_formula_df = formula_toxicity[toxic_formula_mask]
-
-    toxic_herb_mask = herb_toxicity['herb_name'].isin(herb_df['cn_name'])
-    toxic_herb_df = herb_toxicity[toxic_herb_mask]
-
-    toxic_protein_mask = targets_toxicity['gene_symbol'].isin(targets_df['gene_name'])
-    toxic_protein_df = targets_toxicity[toxic_protein_mask]
-
-    toxic_chemical_mask = chem_toxicity['component_name'].isin(chem_df['Name'])
-    toxic_chemical_df = chem_toxicity[toxic_chemical_mask]
+    index = load_toxicity_index()
+
+    def matched(df, kind):
+        key, pairs = TOXICITY_KEYS[kind]
+        tox = index[key]
+        mask = np.zeros(len(tox), dtype=bool)
+        for col, tox_col in pairs:
+            if col in df.columns and tox_col in tox.columns:
+                mask |= tox[tox_col].isin(df[col]).to_numpy()
+        # 毒性记录因补充ID可能重复，按原始记录去重
+        return tox[mask].drop(columns=['severity', 'DNHID', 'Ensembl_ID'], errors='ignore').drop_duplicates()
+
+    toxic_formula_df = matched(formula_df, 'formula')
+    toxic_herb_df = matched(herb_df, 'tcm')
+    toxic_protein_df = matched(targets_df, 'protein')
+    toxic_chemical_df = matched(chem_df, 'chem')
 
     return toxic_formula_df, toxic_herb_df, toxic_chemical_df, toxic_protein_df
 
@@ -0,0 +1,179 @@
+"""
+全库反向筛选：按基因（靶点）特征对数据库中的全部复方或中药排序。
+
+main.from_proteins 从输入靶点出发只取与之相连的化合物、中药、复方构成的子图并计算得分。本模块对整个数据库
+预先计算一次各中药、复方对每个靶点的 HerbiV Score（与 compute.score 相同的 1 - ∏(1 - score) 合并，
+见 compute.protein_scores；已用 profile_store 物化时直接内存映射读取），按 (DATA_DIR, score) 缓存在内存中；
+之后每次筛选只需一次稀疏矩阵-向量乘法：
+
+    Importance Score = 得分矩阵 @ 权重 / 特征中数据库内存在的靶点数
+
+并返回得分最高的 top_k 个实体及对其得分贡献最大的下级实体（复方中的中药、中药中的化合物）。
+
+    screening.screen({'ENSP00000000233': 2, 'ENSP00000001008': 1}, kind='formula', top_k=20, score=900)
+"""
+import threading
+from typing import Union
+
+import numpy as np
+import pandas as pd
+
+import compute
+import get
+import metrics
+import profile_store
+
+# 可筛选的实体 -> 其下级实体
+SCREEN_KINDS = {'formula': 'tcm', 'tcm': 'chem'}
+
+_profiles = {}
+_profiles_lock = threading.Lock()
+
+
+class Profiles:
+    """
+    全库的中药、复方（及化合物）靶点得分矩阵与组成关系。
+
+    Args:
+        scores: compute.ProteinScores。
+        members: {'formula' | 'tcm': 上级实体 × 下级实体的 0/1 稀疏矩阵}。
+        names: {'formula' | 'tcm' | 'chem': 与矩阵的行对应的名称数组}。
+    """
+
+    def __init__(self, scores, members, names):
+        self.scores = scores
+        self.members = members
+        self.names = names
+
+
+def build_profiles(score=900) -> Profiles:
+    """读取 DATA_DIR 中的全部数据集，计算各实体对每个靶点的 HerbiV Score（Combined_score 不低于 score 的连接）。"""
+    chem = get.read_data('Chemical.xlsx').drop_duplicates('DNCID')
+    tcm = get.read_data('TCM.xlsx').drop_duplicates('DNHID')
+    formula = get.read_data('Formula.xlsx').drop_duplicates('DNFID')
+    tcm_chem_links = get.read_data('TCM_Chemical_Links.xlsx')
+    formula_tcm_links = get.read_data('Formula_TCM_Links.xlsx')
+    chem_protein_links = get.get_chem_protein_links('DNCID', chem['DNCID'], score)
+
+    scores = compute.protein_scores(tcm, tcm_chem_links, chem, chem_protein_links, formula, formula_tcm_links,
+                                    np.float64)
+    members = {
+        'formula': compute._membership(formula, 'DNFID', formula_tcm_links, 'DNFID', 'DNHID', tcm, 'DNHID'),
+        'tcm': compute._membership(tcm, 'DNHID', tcm_chem_links, 'DNHID', 'DNCID', chem, 'DNCID'),
+    }
+    names = {}
+    for kind, data in (('formula', formula), ('tcm', tcm), ('chem', chem)):
+        col = profile_store.NAME_COLUMNS[kind]
+        names[kind] = (data[col] if col in data.columns else data[compute.ProteinScores.ID_COLUMNS[kind]]).values
+    return Profiles(scores, members, names)
+
+
+def load_profiles(store: profile_store.Store) -> Profiles:
+    """由 profile_store 的存储（内存映射）构造 Profiles。"""
+    scores = compute.ProteinScores(store.proteins, {kind: (store.ids[kind], store.matrices[kind])
+                                                    for kind in profile_store.KINDS})
+    return Profiles(scores, store.members, store.names)
+
+
+def profiles(score=900) -> Profiles:
+    """
+    全库的 Profiles，按 (DATA_DIR, score) 缓存，同一组数据只计算一次。
+    当前数据版本已物化时读取 profile_store 的存储，否则调用 build_profiles。
+    """
+    key = (get.DATA_DIR, score)
+    with _profiles_lock:
+        hit = _profiles.get(key)
+    if hit is None:
+        store = profile_store.open_store(score)
+        hit = load_profiles(store) if store is not None else build_profiles(score)
+        with _profiles_lock:
+            _profiles[key] = hit
+    return hit
+
+
+def clear_profiles():
+    """清空已缓存的得分矩阵（数据集更新后调用）。"""
+    with _profiles_lock:
+        _profiles.clear()
+
+
+def signature_vector(proteins: pd.Index, signature) -> tuple[np.ndarray, int]:
+    """
+    将基因特征转换为与 proteins 对应的权重向量。
+
+    Args:
+        proteins: 得分矩阵的列（Ensembl ID）。
+        signature: Ensembl ID 的列表（权重均为 1），或 {Ensembl ID: 权重} 的字典 / 数值型 pandas.Series；
+            键也可以是 compute.score 的权重格式 '{protein} HerbiV Score'。
+
+    Returns:
+        权重向量及特征中数据库内存在的靶点数。数据库中没有的靶点被忽略（与 compute.score 相同）。
+    """
+    weighted = isinstance(signature, dict) or (
+        isinstance(signature, pd.Series) and pd.api.types.is_numeric_dtype(signature))
+    if not weighted:
+        signature = dict.fromkeys(signature, 1.0)
+    signature = pd.Series(signature, dtype=float)
+    signature.index = [p[:-len(compute.SCORE_SUFFIX)] if p.endswith(compute.SCORE_SUFFIX) else p
+                       for p in signature.index.astype(str)]
+    signature = signature.groupby(level=0).sum()
+    index = proteins.get_indexer(signature.index)
+    found = index >= 0
+    w = np.zeros(len(proteins))
+    w[index[found]] = signature.values[found]
+    return w, int(found.sum())
+
+
+@metrics.timed
+def screen(signature, kind: str = 'formula', top_k: int = 20, score: int = 900, contributors: int = 5,
+           profile: Union[Profiles, None] = None) -> pd.DataFrame:
+    """
+    按基因特征对数据库中的全部复方（或中药）排序。
+
+    Args:
+        signature: 基因特征（见 signature_vector）。
+        kind: 'formula' 或 'tcm'。默认为 'formula'。
+        top_k: 返回的实体数。默认为 20。
+        score: 化合物-靶点连接的 Combined_score 阈值（与 main.from_proteins 相同）。默认为 900。
+        contributors: 每个实体列出的贡献最大的下级实体数。默认为 5。
+        profile: 预先计算的 Profiles。默认为 None，即 profiles(score)。
+
+    Returns:
+        按 Importance Score 降序的 DataFrame：ID 列、name、Importance Score、contributors（下级实体 ID，
+        按其对特征的 Importance Score 降序，以 ; 连接）、contributor names、contributor scores。
+    """
+    if kind not in SCREEN_KINDS:
+        raise ValueError(f"kind must be one of {', '.join(SCREEN_KINDS)}")
+    profile = profiles(score) if profile is None else profile
+    ids, m = profile.scores.matrix(kind)
+    w, n = signature_vector(profile.scores.proteins, signature)
+    id_col = compute.ProteinScores.ID_COLUMNS[kind]
+    columns = [id_col, 'name', 'Importance Score', 'contributors', 'contributor names', 'contributor scores']
+    if n == 0 or top_k <= 0:
+        return pd.DataFrame(columns=columns)
+
+    # 一次稀疏矩阵-向量乘法得到全部实体的得分
+    total = (m @ w) / n
+    k = min(top_k, len(total))
+    top = np.argpartition(-total, k - 1)[:k]
+    top = top[np.lexsort((top, -total[top]))]
+
+    # 只计算前 top_k 个实体所含下级实体的得分
+    sub = SCREEN_KINDS[kind]
+    sub_ids, sub_m = profile.scores.matrix(sub)
+    member = profile.members[kind][top].tocsr()
+    sub_score = np.zeros(len(sub_ids))
+    used = np.unique(member.indices)
+    sub_score[used] = (sub_m[used] @ w) / n
+
+    sub_names = profile.names[sub]
+    rows = []
+    for i, row in enumerate(top):
+        items = member.indices[member.indptr[i]:member.indptr[i + 1]]
+        items = items[np.lexsort((items, -sub_score[items]))][:contributors]
+        items = items[sub_score[items] > 0]
+        rows.append((ids[row], profile.names[kind][row], total[row],
+                     ';'.join(map(str, sub_ids[items])),
+                     ';'.join(map(str, sub_names[items])),
+                     ';'.join(f'{s:.4g}' for s in sub_score[items])))
+    return pd.DataFrame(rows, columns=columns)
@@ -0,0 +1,528 @@
+"""
+常驻查询服务：数据集、PPI 网络与 ID 映射常驻内存，通过本地 HTTP/JSON 接口提供五种搜索。
+
+启动（在 TCM-VOTER 目录下）:
+    python service.py --port 8765 --workers 2 --max-queue 16
+
+接口:
+    GET  /health                 服务状态（数据是否已预热、排队与运行中的任务数）
+    POST /search                 提交任务，返回 job_id；请求体中 "stream": true 时直接以 NDJSON 流式返回事件
+    POST /screen                 按基因特征对全库复方/中药排序，直接返回结果（见 screening.screen）
+    GET  /jobs                   最近任务列表
+    GET  /jobs/<job_id>          任务状态与已产生的事件
+    GET  /jobs/<job_id>/events   以 NDJSON 流式返回任务事件，直到任务结束
+
+POST /search 请求体与 main.TCM_VOTER 的参数对应:
+    {"search_type": 1, "search_name": ["定喘汤"], "disease_name": "cough", "score": 990,
+     "target_max_number": 70, "report_number": 0, "interaction_number": 0, "top_n": 20,
+     "out_graph": false, "out_for_cytoscape": false, "out_for_excel": false,
+     "research_status_test": false, "safety_research": false, "report_format": "txt",
+     "literature_engine": "es", "chart_mode": "pages"}
+
+disease_name 也可以是疾病名称列表，此时研究现状测试对多种疾病共享与疾病无关的检索，
+research_status 事件给出各疾病的结果目录（paths）。
+
+POST /screen 请求体:
+    {"signature": {"ENSP00000000233": 2, "ENSP00000001008": 1}, "kind": "formula", "top_k": 20, "score": 900,
+     "contributors": 5}
+signature 也可以是 Ensembl ID 列表（权重均为 1）。筛选在工作线程中执行，与任务共用排队上限（排满时返回 503），
+计算出错时返回 500 及错误信息。
+
+任务依次产生 resolved、network、scores、outputs、research_status、safety 事件，最后以 done 或 error 结束，
+因此客户端可以在绘图等耗时输出完成前先拿到 Importance Score。
+
+本地客户端:
+    >>> client = Client('http://127.0.0.1:8765')
+    >>> for event in client.search(1, ['定喘汤'], score=900):
+    ...     print(event['event'])
+"""
+import argparse
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+from urllib.request import Request, urlopen
+
+import Assist
+import compute
+import get
+import literature
+import main
+import output
+import profile_store
+import report
+import screening
+
+# 请求参数及其默认值、类型
+PARAMS = {
+    'disease_name': ('cough', str),
+    'score': (990, int),
+    'target_max_number': (70, int),
+    'report_number': (0, int),
+    'interaction_number': (0, int),
+    'top_n': (20, int),
+    'out_graph': (False, bool),
+    'out_for_cytoscape': (False, bool),
+    'out_for_excel': (False, bool),
+    'research_status_test': (False, bool),
+    'safety_research': (False, bool),
+    'report_format': ('txt', str),
+    'literature_engine': ('es', str),
+    'chart_mode': ('pages', str),
+}
+
+# /screen 的请求参数及其默认值、类型
+SCREEN_PARAMS = {
+    'kind': ('formula', str),
+    'top_k': (20, int),
+    'score': (900, int),
+    'contributors': (5, int),
+}
+
+# 各实体表中用于展示的ID列与名称列
+NAME_COLUMNS = {'formula': ('DNFID', 'name'), 'tcm': ('DNHID', 'cn_name'), 'chem': ('DNCID', 'Name')}
+
+
+class QueueFull(Exception):
+    pass
+
+
+def _convert(key, kind, value):
+    # JSON 的 null、列表等值转换时抛出 TypeError，统一为 ValueError（返回 400）；true / false 只用于布尔参数
+    if isinstance(value, bool) and kind is not bool:
+        raise ValueError(f'{key} must be {kind.__name__}')
+    try:
+        return kind(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{key} must be {kind.__name__}') from None
+
+
+def parse_params(body) -> dict:
+    """校验并补全 /search 的请求参数，参数不合法时抛出 ValueError。"""
+    if not isinstance(body, dict):
+        raise ValueError('request body must be a JSON object')
+    # JSON 的 true / false 在 Python 中等于 1 / 0，需先排除
+    search_type = body.get('search_type')
+    if not isinstance(search_type, int) or isinstance(search_type, bool) or search_type not in main.SEARCH_TYPES:
+        raise ValueError('search_type must be one of 0-4')
+    name = body.get('search_name')
+    if isinstance(name, str):
+        name = [name]
+    if not name or not all(isinstance(n, str) for n in name):
+        raise ValueError('search_name must be a string or a list of strings')
+
+    params = {'search_type': body['search_type'], 'search_name': name}
+    for key, (default, kind) in PARAMS.items():
+        value = body.get(key, default)
+        if kind is bool and not isinstance(value, bool):
+            raise ValueError(f'{key} must be a boolean')
+        if key == 'disease_name' and isinstance(value, list):
+            # 多种疾病时在一次研究现状测试中分别输出各疾病的结果
+            if not value or not all(isinstance(d, str) for d in value):
+                raise ValueError('disease_name must be a string or a list of strings')
+            params[key] = value
+            continue
+        params[key] = _convert(key, kind, value)
+    if params['report_format'] not in report.RENDERERS:
+        raise ValueError(f"report_format must be one of {', '.join(report.RENDERERS)}")
+    if params['literature_engine'] not in literature.ENGINES:
+        raise ValueError(f"literature_engine must be one of {', '.join(literature.ENGINES)}")
+    if params['chart_mode'] not in output.CHART_MODES:
+        raise ValueError(f"chart_mode must be one of {', '.join(output.CHART_MODES)}")
+    return params
+
+
+def parse_screen_params(body) -> dict:
+    """校验并补全 /screen 的请求参数，参数不合法时抛出 ValueError。"""
+    if not isinstance(body, dict):
+        raise ValueError('request body must be a JSON object')
+    signature = body.get('signature')
+    if isinstance(signature, dict):
+        if not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in signature.values()):
+            raise ValueError('signature weights must be numbers')
+    elif not isinstance(signature, list) or not all(isinstance(p, str) for p in signature):
+        raise ValueError('signature must be a list of Ensembl IDs or an object of weights')
+    if not signature:
+        raise ValueError('signature must not be empty')
+
+    params = {'signature': signature}
+    for key, (default, kind) in SCREEN_PARAMS.items():
+        params[key] = _convert(key, kind, body.get(key, default))
+    if params['kind'] not in screening.SCREEN_KINDS:
+        raise ValueError(f"kind must be one of {', '.join(screening.SCREEN_KINDS)}")
+    return params
+
+
+def _top(df, kind, top_n):
+    """返回实体表中 Importance Score 最高的 top_n 行（ID、名称、得分，以及已计算的毒性暴露得分）。"""
+    if df is None or df.empty or 'Importance Score' not in df.columns:
+        return []
+    id_col, name_col = NAME_COLUMNS[kind]
+    columns = [id_col, name_col, 'Importance Score'] + [c for c in ('Toxicity Exposure',) if c in df.columns]
+    top = df.nlargest(top_n, 'Importance Score')[columns]
+    return json.loads(top.to_json(orient='records', force_ascii=False))
+
+
+class Job:
+    """一次查询任务，记录状态与按顺序产生的事件。"""
+
+    def __init__(self, params, path):
+        self.id = uuid.uuid4().hex[:12]
+        self.params = params
+        self.path = path
+        self.status = 'queued'
+        self.events = []
+        self.created = time.time()
+        self._cond = threading.Condition()
+
+    def emit(self, event, data=None):
+        with self._cond:
+            self.events.append({'job_id': self.id, 'event': event, 't': round(time.time() - self.created, 3),
+                                'data': data or {}})
+            if event in ('done', 'error'):
+                self.status = event
+            self._cond.notify_all()
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'error')
+
+    def iter_events(self):
+        """依次返回事件，任务未结束时阻塞等待新事件。"""
+        i = 0
+        while True:
+            with self._cond:
+                while i >= len(self.events) and not self.finished:
+                    self._cond.wait()
+                pending = self.events[i:]
+                finished = self.finished
+            for event in pending:
+                yield event
+            i += len(pending)
+            if finished and i >= len(self.events):
+                return
+
+    def summary(self):
+        with self._cond:
+            return {'job_id': self.id, 'status': self.status, 'params': self.params, 'path': self.path,
+                    'events': list(self.events)}
+
+
+def run_job(job):
+    """执行任务：先构建网络并计算得分，再按需生成图形、文件、研究现状与安全性报告。"""
+    p = job.params
+    job.status = 'running'
+    os.makedirs(job.path, exist_ok=True)
+
+    search_id, analyze = main.resolve_search(p['search_type'], p['search_name'])
+    if len(search_id) == 0:
+        raise ValueError(f"no match for {p['search_name']} (search_type={p['search_type']})")
+    job.emit('resolved', {'ids': [str(i) for i in search_id]})
+
+    (SD_df, SD_Formula_Links_df, formula_df, formula_tcm_links_df, tcm_df, tcm_chem_links_df,
+     chem_df, chem_protein_links_df, protein_df) = analyze(
+        search_id, score=p['score'], DiseaseName=p['disease_name'], out_graph=False, out_for_cytoscape=False,
+        out_for_excel=False, research_status_test=False, safety_research=False, re=True, path=job.path)[:9]
+    job.emit('network', {'sd': len(SD_df), 'formula': len(formula_df), 'tcm': len(tcm_df), 'chem': len(chem_df),
+                         'protein': len(protein_df), 'chem_protein_links': len(chem_protein_links_df)})
+
+    if 'Importance Score' not in tcm_df.columns and not chem_protein_links_df.empty:
+        # 已物化的得分矩阵（profile_store）中有完整的网络时直接切取各实体的行
+        scores = profile_store.query_scores(tcm_df, tcm_chem_links_df, chem_df, chem_protein_links_df,
+                                            formula_df, formula_tcm_links_df, p['score'])
+        tcm_df, chem_df, formula_df = compute.score(tcm_df, tcm_chem_links_df, chem_df, chem_protein_links_df,
+                                                    formula_df, formula_tcm_links_df, per_protein='auto',
+                                                    scores=scores)
+    if p['safety_research']:
+        formula_df, tcm_df, chem_df, protein_df = report.toxicity_exposure(
+            formula_df, formula_tcm_links_df, tcm_df, tcm_chem_links_df, chem_df, chem_protein_links_df, protein_df)
+    job.emit('scores', {'formula': _top(formula_df, 'formula', p['top_n']),
+                        'tcm': _top(tcm_df, 'tcm', p['top_n']),
+                        'chem': _top(chem_df, 'chem', p['top_n'])})
+
+    if p['out_graph'] or p['out_for_cytoscape'] or p['out_for_excel']:
+        if p['out_graph']:
+            output.vis(SD_df, SD_Formula_Links_df, formula_df, formula_tcm_links_df, tcm_df, tcm_chem_links_df,
+                       chem_df, chem_protein_links_df, protein_df, job.path)
+        if p['out_for_cytoscape']:
+            output.out_for_cyto(SD_df, SD_Formula_Links_df, formula_df, formula_tcm_links_df, tcm_df,
+                                tcm_chem_links_df, chem_df, chem_protein_links_df, protein_df, job.path)
+        if p['out_for_excel']:
+            Assist.save_results_to_excel(job.path, SD_df, SD_Formula_Links_df, formula_df, formula_tcm_links_df,
+                                         tcm_df, tcm_chem_links_df, chem_df, chem_protein_links_df, protein_df)
+        job.emit('outputs', {'path': job.path, 'files': sorted(os.listdir(job.path))})
+
+    if p['research_status_test']:
+        ctx = Assist.analyze_proteins(p['disease_name'], p['target_max_number'], p['report_number'],
+                                      p['interaction_number'], protein_df, path=job.path,
+                                      literature_engine=p['literature_engine'], chart_mode=p['chart_mode'])
+        if isinstance(ctx, list):
+            job.emit('research_status', {'paths': [c.output_dir for c in ctx]})
+        else:
+            job.emit('research_status', {'path': ctx.output_dir})
+
+    if p['safety_research']:
+        # 毒性暴露得分已在上面计算，报告写入任务目录
+        report_file = Assist.generate_toxicity_report(protein_df, chem_df, formula_df, tcm_df, path=job.path,
+                                                      fmt=p['report_format'])
+        job.emit('safety', {'path': report_file})
+
+
+class Service:
+    """
+    任务队列与工作线程池。
+
+    Args:
+        workers: 同时执行的任务数。
+        max_queue: 最多排队的任务数，超过时拒绝新任务。
+        results_dir: 各任务输出目录的上级目录。
+        keep_jobs: 内存中保留的最近任务数。
+    """
+
+    def __init__(self, workers=2, max_queue=16, results_dir=os.path.join('results', 'service'), keep_jobs=200):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.results_dir = results_dir
+        self.keep_jobs = keep_jobs
+        self.warm = False
+        self.jobs = OrderedDict()
+        self._active = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='tcm-voter-job')
+
+    def warm_up(self):
+        """开启数据缓存并预读全部数据集。"""
+        get.enable_cache()
+        get.preload()
+        if os.path.isdir('Data/Toxicity'):
+            report.load_toxicity_index()
+        # 全库筛选的得分矩阵（默认阈值），之后每次 /screen 只做一次矩阵-向量乘法
+        if os.path.exists(os.path.join(get.DATA_DIR, 'Formula.xlsx')):
+            screening.profiles(SCREEN_PARAMS['score'][0])
+        self.warm = True
+
+    def submit(self, params) -> Job:
+        with self._lock:
+            if self._active >= self.workers + self.max_queue:
+                raise QueueFull(f'{self._active} jobs queued or running')
+            self._active += 1
+            job = Job(params, None)
+            job.path = os.path.join(self.results_dir, job.id)
+            self.jobs[job.id] = job
+            while len(self.jobs) > self.keep_jobs:
+                self.jobs.popitem(last=False)
+        self._executor.submit(self._run, job)
+        return job
+
+    def screen(self, params) -> Future:
+        """
+        在工作线程中执行全库筛选（screening.screen），与查询任务共用工作线程与排队上限。
+        尚未预热时第一次筛选在工作线程中计算全库得分矩阵，不占用 HTTP 线程。
+        """
+        with self._lock:
+            if self._active >= self.workers + self.max_queue:
+                raise QueueFull(f'{self._active} jobs queued or running')
+            self._active += 1
+        try:
+            future = self._executor.submit(screening.screen, **params)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, _=None):
+        with self._lock:
+            self._active -= 1
+
+    def _run(self, job):
+        try:
+            run_job(job)
+            job.emit('done')
+        except Exception as e:
+            job.emit('error', {'type': type(e).__name__, 'message': str(e)})
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    def health(self):
+        with self._lock:
+            running = sum(1 for j in self.jobs.values() if j.status == 'running')
+            return {'status': 'ok', 'warm': self.warm, 'active': self._active, 'running': running,
+                    'workers': self.workers, 'max_queue': self.max_queue}
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _send(self, payload, status=200):
+            data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _stream(self, job):
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson; charset=utf-8')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for event in job.iter_events():
+                data = (json.dumps(event, ensure_ascii=False) + '\n').encode('utf-8')
+                self.wfile.write(f'{len(data):X}\r\n'.encode('ascii') + data + b'\r\n')
+                self.wfile.flush()
+            self.wfile.write(b'0\r\n\r\n')
+
+        def _job(self, job_id):
+            job = service.jobs.get(job_id)
+            if job is None:
+                self._send({'error': f'unknown job {job_id}'}, 404)
+            return job
+
+        def do_GET(self):
+            parts = [p for p in urlparse(self.path).path.split('/') if p]
+            if parts == ['health']:
+                return self._send(service.health())
+            if parts == ['jobs']:
+                return self._send([{'job_id': j.id, 'status': j.status, 'params': j.params}
+                                   for j in list(service.jobs.values())])
+            if len(parts) == 2 and parts[0] == 'jobs':
+                job = self._job(parts[1])
+                return job and self._send(job.summary())
+            if len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'events':
+                job = self._job(parts[1])
+                return job and self._stream(job)
+            return self._send({'error': 'not found'}, 404)
+
+        def do_POST(self):
+            path = urlparse(self.path).path.rstrip('/')
+            if path == '/screen':
+                return self._screen()
+            if path != '/search':
+                return self._send({'error': 'not found'}, 404)
+            length = int(self.headers.get('Content-Length') or 0)
+            try:
+                body = json.loads(self.rfile.read(length).decode('utf-8') or '{}')
+                params = parse_params(body)
+            except ValueError as e:
+                return self._send({'error': str(e)}, 400)
+            try:
+                job = service.submit(params)
+            except QueueFull as e:
+                return self._send({'error': str(e)}, 503)
+            if body.get('stream'):
+                return self._stream(job)
+            return self._send({'job_id': job.id, 'status_url': f'/jobs/{job.id}',
+                               'events_url': f'/jobs/{job.id}/events'}, 202)
+
+        def _screen(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            try:
+                params = parse_screen_params(json.loads(self.rfile.read(length).decode('utf-8') or '{}'))
+            except ValueError as e:
+                return self._send({'error': str(e)}, 400)
+            try:
+                results = service.screen(params).result()
+            except QueueFull as e:
+                return self._send({'error': str(e)}, 503)
+            except Exception as e:
+                main.logger.error(f'screen failed: {e}', exc_info=True)
+                return self._send({'error': str(e), 'type': type(e).__name__}, 500)
+            return self._send({'results': results.to_dict('records')})
+
+        def log_message(self, format, *args):
+            main.logger.info('%s - %s', self.address_string(), format % args)
+
+    return Handler
+
+
+def serve(host='127.0.0.1', port=8765, workers=2, max_queue=16, results_dir=os.path.join('results', 'service'),
+          warm=True):
+    """
+    创建查询服务，调用 server.serve_forever() 开始服务。
+
+    Returns:
+        (server, service)
+    """
+    service = Service(workers, max_queue, results_dir)
+    if warm:
+        threading.Thread(target=service.warm_up, name='tcm-voter-warm-up', daemon=True).start()
+    server = ThreadingHTTPServer((host, port), _handler(service))
+    server.daemon_threads = True
+    return server, service
+
+
+class Client:
+    """查询服务的本地客户端。"""
+
+    def __init__(self, url='http://127.0.0.1:8765', timeout=None):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def _request(self, path, body=None):
+        data = None if body is None else json.dumps(body, ensure_ascii=False).encode('utf-8')
+        req = Request(self.url + path, data=data, headers={'Content-Type': 'application/json'})
+        return urlopen(req, timeout=self.timeout)
+
+    def health(self):
+        with self._request('/health') as res:
+            return json.load(res)
+
+    def job(self, job_id):
+        with self._request(f'/jobs/{job_id}') as res:
+            return json.load(res)
+
+    def submit(self, search_type, search_name, **params):
+        """提交任务并返回 job_id。"""
+        with self._request('/search', dict(params, search_type=search_type, search_name=search_name)) as res:
+            return json.load(res)['job_id']
+
+    def events(self, job_id):
+        """逐个返回任务事件，直到任务结束。"""
+        with self._request(f'/jobs/{job_id}/events') as res:
+            for line in res:
+                if line.strip():
+                    yield json.loads(line)
+
+    def screen(self, signature, **params):
+        """按基因特征对全库复方/中药排序，返回结果列表。"""
+        with self._request('/screen', dict(params, signature=signature)) as res:
+            return json.load(res)['results']
+
+    def search(self, search_type, search_name, **params):
+        """提交任务并逐个返回其事件。"""
+        with self._request('/search', dict(params, search_type=search_type, search_name=search_name,
+                                           stream=True)) as res:
+            for line in res:
+                if line.strip():
+                    yield json.loads(line)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='TCM-VOTER query service')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--max-queue', type=int, default=16)
+    parser.add_argument('--results-dir', default=os.path.join('results', 'service'))
+    parser.add_argument('--no-warm', action='store_true', help='do not preload datasets at start-up')
+    args = parser.parse_args()
+
+    server, service = serve(args.host, args.port, args.workers, args.max_queue, args.results_dir, not args.no_warm)
+    main.logger.info(f'TCM-VOTER service listening on http://{args.host}:{args.port}/')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.shutdown()
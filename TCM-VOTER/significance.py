@@ -0,0 +1,185 @@
+"""
+Importance Score 的置换检验。
+
+compute.score 的 Importance Score 是实体（化合物、中药、复方）对输入靶点的得分的平均，没有零模型：
+化合物多、靶点多的中药对任意一组靶点的得分都高，按分数排序接近按度数排序。本模块：
+    1. 在全部靶点（universe，默认为 chem_protein_links 中出现的靶点）中抽取 n_perm 组随机靶点，
+       每组的大小与输入靶点相同；bins > 1 时按靶点的度数（连接的化合物数）分位分箱，
+       每个输入靶点由同一箱中的靶点替换，随机靶点继承被替换靶点的权重；
+    2. 每 chunk 组随机靶点构成一个 (靶点数, chunk) 的稀疏指示矩阵，与实体-靶点得分矩阵相乘一次得到全部随机得分；
+    3. 经验 p 值为 (1 + 随机得分 >= 观测得分的次数) / (1 + n_perm)，FDR 为 Benjamini-Hochberg 校正后的 q 值。
+
+输入的复方、中药必须带有完整的组成：formula_tcm_links、tcm_chem_links、chem 与 chem_protein_links 应为这些
+复方、中药在数据库中的全部中药、化合物及化合物与全部靶点的连接，不能是从输入靶点出发筛选得到的子图
+（main.from_proteins 中的 tcm_chem_links、chem 只包含与输入靶点相连的化合物）。否则各实体的零分布以输入靶点为条件，
+随机靶点的得分偏低，检验偏向显著。观测的 Importance Score 不受影响。
+
+    formula_tcm_links = get.get_formula_tcm_links('DNFID', formula['DNFID'])
+    tcm = get.get_tcm('DNHID', formula_tcm_links['DNHID'])
+    tcm_chem_links = get.get_tcm_chem_links('DNHID', tcm['DNHID'])
+    chem = get.get_chemicals('DNCID', tcm_chem_links['DNCID'])
+    links = get.get_chem_protein_links('DNCID', chem['DNCID'], score)   # 这些化合物与全部靶点的连接
+    result = significance.permutation_test(tcm, tcm_chem_links, chem, links, proteins['Ensembl_ID'],
+                                           formula, formula_tcm_links, n_perm=10000)
+    tcm = significance.annotate(tcm, result['tcm'])
+"""
+from typing import Union
+
+import numpy as np
+import pandas as pd
+
+import compute
+import metrics
+
+# scipy.sparse 在函数内部导入（与 compute 相同），避免增加 import main 的耗时
+
+# 默认的度数分箱数，1 或 0 为只按大小匹配
+DEGREE_BINS = 10
+
+# 每次稀疏矩阵乘法处理的随机靶点组数，结果矩阵为 (实体数, CHUNK)
+CHUNK = 500
+
+RESULT_COLUMNS = ['Importance Score', 'p-value', 'FDR']
+
+
+def protein_degrees(chem_protein_links: pd.DataFrame, universe=None) -> pd.Series:
+    """各靶点连接的化合物数（universe 中没有连接的靶点为 0）。"""
+    degrees = chem_protein_links.drop_duplicates(['DNCID', 'Ensembl_ID']).groupby('Ensembl_ID').size()
+    if universe is not None:
+        degrees = degrees.reindex(pd.Index(universe).unique(), fill_value=0)
+    return degrees
+
+
+def degree_bins(degrees: pd.Series, bins=DEGREE_BINS) -> np.ndarray:
+    """按度数的分位数分箱，返回每个靶点的箱编号。度数相同的靶点按出现顺序分入相邻的箱。"""
+    if bins is None or bins <= 1 or len(degrees) == 0:
+        return np.zeros(len(degrees), dtype=np.int64)
+    bins = min(bins, len(degrees))
+    return pd.qcut(degrees.rank(method='first'), bins, labels=False).values.astype(np.int64)
+
+
+def bh_fdr(p: np.ndarray) -> np.ndarray:
+    """Benjamini-Hochberg 校正后的 q 值。"""
+    p = np.asarray(p, dtype=float)
+    if len(p) == 0:
+        return p
+    order = np.argsort(p, kind='stable')
+    ranked = p[order] * len(p) / np.arange(1, len(p) + 1)
+    q = np.minimum.accumulate(ranked[::-1])[::-1]
+    out = np.empty_like(q)
+    out[order] = np.minimum(q, 1.0)
+    return out
+
+
+def random_sets(query, bin_of, size, rng) -> np.ndarray:
+    """
+    抽取 size 组随机靶点。
+
+    Args:
+        query: 输入靶点在 universe 中的下标。
+        bin_of: universe 中每个靶点的箱编号。
+        size: 组数。
+        rng: numpy.random.Generator。
+
+    Returns:
+        (size, len(query)) 的靶点下标矩阵，第 j 列与 query[j] 在同一箱中，同一组内不重复。
+    """
+    out = np.empty((size, len(query)), dtype=np.int64)
+    for b in np.unique(bin_of[query]):
+        slots = np.nonzero(bin_of[query] == b)[0]
+        pool = np.nonzero(bin_of == b)[0]
+        # 每组对箱内靶点取随机键，最小的 len(slots) 个即无放回抽样
+        keys = rng.random((size, len(pool)), dtype=np.float32)
+        pick = np.argpartition(keys, len(slots) - 1, axis=1)[:, :len(slots)]
+        out[:, slots] = pool[pick]
+    return out
+
+
+@metrics.timed
+def permutation_test(
+        tcm: pd.DataFrame,
+        tcm_chem_links: pd.DataFrame,
+        chem: pd.DataFrame,
+        chem_protein_links: pd.DataFrame,
+        proteins,
+        formula: Union[pd.DataFrame, None] = None,
+        formula_tcm_links: Union[pd.DataFrame, None] = None,
+        weights: Union[dict, None] = None,
+        n_perm: int = 10000,
+        bins: int = DEGREE_BINS,
+        universe=None,
+        random_state=None,
+        chunk: int = CHUNK
+) -> dict:
+    """
+    对化合物、中药、复方的 Importance Score 做置换检验。
+
+    Args:
+        tcm, tcm_chem_links, chem, formula, formula_tcm_links: 与 compute.score 相同，但须包含各复方、中药的
+            完整组成（见模块说明），不能按输入靶点筛选。
+        chem_protein_links: chem 中化合物与 universe 中全部靶点的连接（而不只是与输入靶点的连接）。
+        proteins: 输入靶点的 Ensembl ID，没有连接的靶点不计入（与 compute.score 相同）。
+        weights: 各靶点的权重（与 compute.score 相同）。默认为 None。
+        n_perm: 随机靶点组数。默认为 10000。
+        bins: 度数分箱数，1 或 0 为只按大小匹配。默认为 DEGREE_BINS。
+        universe: 抽取随机靶点的范围（如全部蛋白），chem_protein_links 中出现的靶点总在其中。
+            默认为 None，即只有 chem_protein_links 中出现的靶点。
+        random_state: 随机种子。
+        chunk: 每次矩阵乘法处理的随机靶点组数。默认为 CHUNK。
+
+    Returns:
+        {'chem' | 'tcm' | 'formula': DataFrame}，各表的行与输入表的行一致，包含 ID 列及 RESULT_COLUMNS。
+    """
+    from scipy import sparse
+
+    scores = compute.protein_scores(tcm, tcm_chem_links, chem, chem_protein_links, formula, formula_tcm_links,
+                                    np.float64)
+    universe = scores.proteins if universe is None else scores.proteins.append(
+        pd.Index(universe).difference(scores.proteins))
+    degrees = protein_degrees(chem_protein_links, universe)
+    bin_of = degree_bins(degrees.reindex(universe), bins)
+
+    query = pd.Index(pd.Index(proteins).unique()).intersection(scores.proteins, sort=False)
+    query = universe.get_indexer(query)
+    if weights is None:
+        slot_w = np.full(len(query), 1 / max(len(query), 1))
+    else:
+        w, n_keys = compute._weight_vector(universe, weights)
+        slot_w = w[query] / n_keys
+
+    # universe 中没有连接的靶点得分为 0，补齐为全部 universe 的列
+    matrices = {kind: sparse.hstack([m, sparse.csr_matrix((m.shape[0], len(universe) - m.shape[1]))]).tocsr()
+                for kind, (_, m) in scores.matrices.items()}
+    observed = {kind: m[:, query] @ slot_w for kind, m in matrices.items()}
+    counts = {kind: np.zeros(m.shape[0], dtype=np.int64) for kind, m in matrices.items()}
+
+    rng = np.random.default_rng(random_state)
+    for start in range(0, n_perm if len(query) else 0, chunk):
+        size = min(chunk, n_perm - start)
+        sets = random_sets(query, bin_of, size, rng)
+        indicator = sparse.csr_matrix(
+            (np.tile(slot_w, size), (sets.ravel(), np.repeat(np.arange(size), len(query)))),
+            shape=(len(universe), size))
+        for kind, m in matrices.items():
+            null = (m @ indicator).toarray()
+            # 浮点求和顺序不同引起的误差视为相等
+            counts[kind] += (null >= observed[kind][:, None] - 1e-12).sum(axis=1)
+
+    results = {}
+    for kind, (ids, _) in scores.matrices.items():
+        p = (1 + counts[kind]) / (1 + n_perm)
+        results[kind] = pd.DataFrame({compute.ProteinScores.ID_COLUMNS[kind]: ids,
+                                      'Importance Score': observed[kind],
+                                      'p-value': p,
+                                      'FDR': bh_fdr(p)})
+    return results
+
+
+def annotate(frame: pd.DataFrame, result: pd.DataFrame) -> pd.DataFrame:
+    """将 permutation_test 的 p-value 与 FDR 按 ID 列加入 frame（如 compute.score 的结果）。"""
+    id_col = result.columns[0]
+    table = result.drop_duplicates(id_col).set_index(id_col)
+    frame = frame.copy()
+    for col in ('p-value', 'FDR'):
+        frame[col] = frame[id_col].map(table[col]).values
+    return frame
@@ -0,0 +1,117 @@
+"""
+生成与 Data/ 中数据集结构一致的合成数据，用于基准测试。
+
+各连接表的度分布近似真实数据：每个复方的中药数、每味中药的成分数服从对数正态分布，
+成分与靶点的连接按 Zipf 权重抽取（少数靶点被大量成分命中），Combined_score 偏向低分。
+"""
+import os
+import numpy as np
+import pandas as pd
+
+# 各规模下的节点数
+SCALES = {
+    'tiny': {'n_sd': 10, 'n_formula': 100, 'n_tcm': 150, 'n_chem': 1000, 'n_protein': 800},
+    'small': {'n_sd': 50, 'n_formula': 1000, 'n_tcm': 600, 'n_chem': 6000, 'n_protein': 3000},
+    'medium': {'n_sd': 200, 'n_formula': 10000, 'n_tcm': 2000, 'n_chem': 20000, 'n_protein': 10000},
+    'large': {'n_sd': 450, 'n_formula': 50000, 'n_tcm': 4600, 'n_chem': 30000, 'n_protein': 20000},
+}
+
+
+def _degrees(rng, n, mean, sigma=0.8, low=1, high=None):
+    """生成 n 个对数正态分布的度，均值约为 mean。"""
+    mu = np.log(mean) - sigma ** 2 / 2
+    deg = np.round(rng.lognormal(mu, sigma, n)).astype(int)
+    return np.clip(deg, low, high)
+
+
+def _links(rng, degrees, n_targets, zipf_a=None):
+    """按每个源节点的度抽取目标节点（去除重复连接），zipf_a 不为 None 时目标按 Zipf 权重抽取。"""
+    if zipf_a is None:
+        p = None
+    else:
+        p = 1.0 / np.arange(1, n_targets + 1) ** zipf_a
+        p = p[rng.permutation(n_targets)]
+        p /= p.sum()
+    degrees = np.minimum(degrees, n_targets)
+    sources = np.repeat(np.arange(len(degrees)), degrees)
+    targets = rng.choice(n_targets, size=len(sources), p=p)
+    pairs = np.unique(sources.astype(np.int64) * n_targets + targets)
+    return pairs // n_targets, pairs % n_targets
+
+
+def generate(scale='small', seed=0, **sizes) -> dict:
+    """
+    生成一套合成数据集。
+
+    Args:
+        scale: SCALES 中的规模名称。
+        seed: 随机种子。
+        **sizes: 覆盖规模中的节点数，如 n_formula=500。
+
+    Returns:
+        以 Data/ 中文件名为键、pd.DataFrame 为值的字典。
+    """
+    params = dict(SCALES[scale], **sizes)
+    rng = np.random.default_rng(seed)
+
+    sd_id = np.array([f'DNS{i:03d}' for i in range(params['n_sd'])])
+    formula_id = np.array([f'DNF{i:06d}' for i in range(params['n_formula'])])
+    tcm_id = np.array([f'DNH{i:04d}' for i in range(params['n_tcm'])])
+    chem_id = np.array([f'DNC{i:04d}' for i in range(params['n_chem'])])
+    protein_id = np.array([f'ENSP{i:011d}' for i in range(params['n_protein'])])
+    gene_name = np.array([f'GENE{i}' for i in range(params['n_protein'])])
+
+    sd = pd.DataFrame({'证候': [f'证候{i}' for i in range(params['n_sd'])], 'DNSID': sd_id})
+    formula = pd.DataFrame({'DNFID': formula_id, 'name': [f'方剂{i}' for i in range(params['n_formula'])]})
+    tcm = pd.DataFrame({'DNHID': tcm_id,
+                        'cn_name': [f'中药{i}' for i in range(params['n_tcm'])],
+                        'en_name': [f'Herb {i}' for i in range(params['n_tcm'])]})
+    chem = pd.DataFrame({'DNCID': chem_id, 'Name': [f'chemical-{i}' for i in range(params['n_chem'])]})
+    protein = pd.DataFrame({'Ensembl_ID': protein_id,
+                            'protein_name': [f'Protein {i}' for i in range(params['n_protein'])],
+                            'gene_name': gene_name})
+
+    # 辨证-复方：每个证候约 3 个复方
+    s, t = _links(rng, _degrees(rng, params['n_sd'], 3, high=50), params['n_formula'], zipf_a=0.6)
+    sd_formula_links = pd.DataFrame({'DNSID': sd_id[s], 'DNFID': formula_id[t]})
+
+    # 复方-中药：每个复方约 8 味中药，常用中药出现频率更高
+    s, t = _links(rng, _degrees(rng, params['n_formula'], 8, sigma=0.5, high=40), params['n_tcm'], zipf_a=1.0)
+    formula_tcm_links = pd.DataFrame({'DNFID': formula_id[s], 'DNHID': tcm_id[t]})
+
+    # 中药-成分：每味中药约 13 个成分，长尾分布
+    s, t = _links(rng, _degrees(rng, params['n_tcm'], 13, sigma=1.1, high=500), params['n_chem'], zipf_a=0.5)
+    tcm_chem_links = pd.DataFrame({'DNHID': tcm_id[s], 'DNCID': chem_id[t]})
+
+    # 成分-靶点：每个成分约 20 个靶点，靶点度服从幂律
+    s, t = _links(rng, _degrees(rng, params['n_chem'], 20, sigma=1.2, high=2000), params['n_protein'], zipf_a=0.9)
+    combined_score = np.clip(np.round(1000 - rng.gamma(2.0, 200.0, len(s))), 150, 999).astype(int)
+    chem_protein_links = pd.DataFrame({'DNCID': chem_id[s], 'Ensembl_ID': protein_id[t],
+                                       'Combined_score': combined_score})
+
+    return {
+        'SD.xlsx': sd,
+        'SD_Formula_Links.xlsx': sd_formula_links,
+        'Formula.xlsx': formula,
+        'Formula_TCM_Links.xlsx': formula_tcm_links,
+        'TCM.xlsx': tcm,
+        'TCM_Chemical_Links.xlsx': tcm_chem_links,
+        'Chemical.xlsx': chem,
+        'Chemical_Protein_Links.xlsx': chem_protein_links,
+        'Protein.xlsx': protein,
+    }
+
+
+def write(tables, path):
+    """将 generate() 生成的数据集写入 path 目录，文件名与 Data/ 中一致。"""
+    os.makedirs(path, exist_ok=True)
+    for file_name, df in tables.items():
+        df.to_excel(os.path.join(path, file_name), index=False)
+
+
+def ensure(scale='small', seed=0, root='benchmark_data'):
+    """生成（若尚不存在）并返回某规模合成数据集所在目录。"""
+    path = os.path.join(root, f'{scale}-{seed}')
+    if not os.path.exists(os.path.join(path, 'Protein.xlsx')):
+        write(generate(scale, seed), path)
+    return path
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 模块位于 TCM-VOTER 目录下（平铺），测试从该目录导入
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import compute
+
+
+def _network(seed=0, n_formula=8, n_tcm=12, n_chem=40, n_protein=15):
+    rng = np.random.default_rng(seed)
+    formula = pd.DataFrame({'DNFID': [f'DNF{i:03d}' for i in range(n_formula)]})
+    tcm = pd.DataFrame({'DNHID': [f'DNH{i:03d}' for i in range(n_tcm)]})
+    chem = pd.DataFrame({'DNCID': [f'DNC{i:03d}' for i in range(n_chem)]})
+    formula_tcm_links = pd.DataFrame({'DNFID': rng.choice(formula['DNFID'], 30),
+                                      'DNHID': rng.choice(tcm['DNHID'], 30)})
+    tcm_chem_links = pd.DataFrame({'DNHID': rng.choice(tcm['DNHID'], 80),
+                                   'DNCID': rng.choice(chem['DNCID'], 80)})
+    # 包含同一化合物-靶点的重复连接（取最后一条）
+    chem_protein_links = pd.DataFrame({'DNCID': rng.choice(chem['DNCID'], 120),
+                                       'Ensembl_ID': rng.choice([f'ENSP{i:011d}' for i in range(n_protein)], 120),
+                                       'Combined_score': rng.uniform(0.1, 0.99, 120)})
+    return tcm, tcm_chem_links, chem, chem_protein_links, formula, formula_tcm_links
+
+
+def _reference_score(tcm, tcm_chem_links, chem, chem_protein_links, formula, formula_tcm_links):
+    """逐个靶点计算每个靶点的 HerbiV Score 与 Importance Score（原先 compute.score 的实现）。"""
+    formula_and_score, tcm_and_score, chem_and_score = formula.copy(), tcm.copy(), chem.copy()
+    proteins_id = chem_protein_links['Ensembl_ID'].unique()
+    chem_protein_dict = chem_protein_links.groupby('Ensembl_ID').apply(
+        lambda x: x.set_index('DNCID')['Combined_score'].to_dict()).to_dict()
+    tcm_chem_dict = tcm_chem_links.groupby('DNHID')['DNCID'].apply(list).to_dict()
+    formula_tcm_dict = formula_tcm_links.groupby('DNFID')['DNHID'].apply(list).to_dict()
+    for protein in proteins_id:
+        col = f'{protein} HerbiV Score'
+        chem_and_score[col] = chem['DNCID'].map(chem_protein_dict.get(protein, {})).fillna(0)
+        tcm_and_score[col] = tcm['DNHID'].apply(
+            lambda x: 1 - (1 - chem_and_score.loc[chem_and_score['DNCID'].isin(tcm_chem_dict.get(x, [])), col]).prod())
+        formula_and_score[col] = formula['DNFID'].apply(
+            lambda x: 1 - (1 - tcm_and_score.loc[tcm_and_score['DNHID'].isin(formula_tcm_dict.get(x, [])),
+                                                 col]).prod())
+    columns = [f'{p} HerbiV Score' for p in proteins_id]
+    for frame in (formula_and_score, tcm_and_score, chem_and_score):
+        frame['Importance Score'] = frame[columns].mean(axis=1)
+    return tcm_and_score, chem_and_score, formula_and_score, columns
+
+
+ID_COLUMNS = ('DNHID', 'DNCID', 'DNFID')
+
+
+def test_sparse_importance_scores_match_reference():
+    network = _network()
+    expected = _reference_score(*network)
+    result = compute.score(*network, per_protein='sparse')
+    for frame, reference, id_col in zip(result, expected, ID_COLUMNS):
+        assert not any(col.endswith(compute.SCORE_SUFFIX) for col in frame.columns)
+        got = frame.set_index(id_col)['Importance Score']
+        want = reference.set_index(id_col)['Importance Score']
+        np.testing.assert_allclose(got.reindex(want.index).values, want.values, rtol=0, atol=1e-12)
+        # 结果按 Importance Score 降序排列
+        assert frame['Importance Score'].is_monotonic_decreasing
+
+
+def test_wide_columns_match_reference():
+    network = _network(seed=1)
+    *expected, columns = _reference_score(*network)
+    result = compute.score(*network, per_protein='wide')
+    for frame, reference, id_col in zip(result, expected, ID_COLUMNS):
+        assert set(columns) <= set(frame.columns)
+        got = frame.set_index(id_col)[columns + ['Importance Score']]
+        want = reference.set_index(id_col)[columns + ['Importance Score']]
+        np.testing.assert_allclose(got.reindex(want.index).values, want.values, rtol=0, atol=1e-12)
+
+
+def test_score_sparse_matrices_match_wide_columns():
+    network = _network(seed=2)
+    *_, scores = compute.score_sparse(*network, dtype=np.float64)
+    wide = compute.score(*network, per_protein='wide')
+    for kind, frame in zip(('tcm', 'chem', 'formula'), wide):
+        ids, _ = scores.matrix(kind)
+        id_col = compute.ProteinScores.ID_COLUMNS[kind]
+        expected = scores.wide(kind).set_axis(ids).reindex(frame[id_col]).values
+        columns = [f'{p}{compute.SCORE_SUFFIX}' for p in scores.proteins]
+        np.testing.assert_allclose(frame[columns].values, expected, rtol=0, atol=1e-12)
+        long = scores.long(kind)
+        assert (long['HerbiV Score'] > 0).all()
+        assert len(long) == scores.matrix(kind)[1].nnz
+
+
+@pytest.mark.parametrize('per_protein', ['sparse', 'wide'])
+def test_weighted_importance_score(per_protein):
+    network = _network(seed=3)
+    proteins = network[3]['Ensembl_ID'].unique()[:4]
+    weights = {f'{p} HerbiV Score': w for p, w in zip(proteins, (0.4, 0.3, 0.2, 0.1))}
+    tcm, _, _, columns = _reference_score(*network)
+    want = (tcm[list(weights)] * pd.Series(weights)).mean(axis=1).set_axis(tcm['DNHID'])
+    got = compute.score(*network, weights=weights, per_protein=per_protein)[0].set_index('DNHID')['Importance Score']
+    np.testing.assert_allclose(got.reindex(want.index).values, want.values, rtol=0, atol=1e-12)
+
+
+@pytest.mark.parametrize('n, c', [(1, 10), (3, 10), (6, 10), (10, 10), (25, 10)])
+def test_topk_component_matches_knapsack(n, c):
+    # 物品少于容量时组合大小也应与 knapsack 相同
+    values = np.random.default_rng(n).uniform(0.05, 0.95, n)
+    names = np.arange(n)
+    expected, items = compute.knapsack(np.ones(n, dtype=int), n, [], names, values, c)
+    value, top = compute.topk_component(values, c)
+    assert value == pytest.approx(expected, abs=1e-12)
+    assert sorted(names[top].tolist()) == sorted(items)
@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import report
+
+
+def _index():
+    """只有一个有毒靶点（ENSP1，严重程度 1）的毒性索引。"""
+    return {
+        'formula': pd.DataFrame({'formula_name': pd.Series(dtype=str), 'severity': pd.Series(dtype=float)}),
+        'herb': pd.DataFrame({'DNHID': pd.Series(dtype=str), 'severity': pd.Series(dtype=float)}),
+        'chemical': pd.DataFrame({'component_name': pd.Series(dtype=str), 'severity': pd.Series(dtype=float)}),
+        'protein': pd.DataFrame({'Ensembl_ID': ['ENSP1'], 'severity': [1.0]}),
+    }
+
+
+def test_toxicity_exposure_uses_combined_score_scale():
+    # Combined_score 为 get.get_chem_protein_links 的 0~1 取值
+    formula = pd.DataFrame({'DNFID': ['F1'], 'name': ['f1']})
+    tcm = pd.DataFrame({'DNHID': ['H1']})
+    chem = pd.DataFrame({'DNCID': ['C1', 'C2'], 'Name': ['c1', 'c2']})
+    proteins = pd.DataFrame({'Ensembl_ID': ['ENSP1', 'ENSP2']})
+    formula_tcm_links = pd.DataFrame({'DNFID': ['F1'], 'DNHID': ['H1']})
+    tcm_chem_links = pd.DataFrame({'DNHID': ['H1', 'H1'], 'DNCID': ['C1', 'C2']})
+    chem_protein_links = pd.DataFrame({'DNCID': ['C1', 'C2'], 'Ensembl_ID': ['ENSP1', 'ENSP2'],
+                                       'Combined_score': [0.9, 0.95]})
+
+    formula, tcm, chem, proteins = report.toxicity_exposure(formula, formula_tcm_links, tcm, tcm_chem_links, chem,
+                                                            chem_protein_links, proteins, index=_index(), decay=0.5)
+
+    np.testing.assert_allclose(proteins['Toxicity Exposure'], [1.0, 0.0])
+    np.testing.assert_allclose(chem['Toxicity Exposure'], [0.5 * 0.9, 0.0])
+    assert tcm['Toxicity Exposure'].iloc[0] == pytest.approx(0.5 * 0.5 * 0.9)
+    assert formula['Toxicity Exposure'].iloc[0] == pytest.approx(0.5 * 0.5 * 0.5 * 0.9)
+    assert chem['Toxic Targets'].tolist() == [1, 0]
+    assert tcm['Toxic Targets'].iloc[0] == 1